@@ -4,119 +4,162 @@
 
 from os import environ
 import logging
+from time import perf_counter
 from dotenv import load_dotenv
-from pymssql import connect, Connection, exceptions
+import pandas as pd
+from pymssql import Connection
+
+from parquet_store import ParquetStore, READING_COLUMNS
+from rollup import rollup_readings
+from summary import read_table_totals, update_archive_summary
+from incremental import archive_incrementally
+from purge import (get_last_metric_id, purge_archived_metrics,
+                   DEFAULT_CHUNK_ROWS, DEFAULT_PAUSE_SECONDS)
+from plantdb import get_backend, pooled_connection, bump_data_version, ARCHIVE_VERSION
 
 logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(levelname)s - %(message)s')
 
 
-def get_connection() -> Connection:
-    """Connects to Microsoft SQL Server Database"""
-    logging.info("Attempting to connect to the database.")
+METRIC_TABLE = "epsilon.plant_metric"
+STAGING_TABLE = "epsilon.plant_metric_staging"
+ARCHIVE_MODES = ("batch", "swap", "incremental")
+
+ARCHIVE_QUERY = """INSERT INTO epsilon.plants_archive (avg_temperature,
+                    avg_soil_moisture, watered_count, last_recorded, plant_id,
+                    reading_count)
+                SELECT
+                    readings.avg_temperature,
+                    readings.avg_soil_moisture,
+                    (SELECT COUNT(*) FROM epsilon.watering_event AS watering
+                     WHERE watering.plant_id = readings.plant_id
+                       AND watering.detected_at >= readings.first_recorded
+                       AND watering.detected_at <= readings.last_recorded),
+                    readings.last_recorded,
+                    readings.plant_id,
+                    readings.reading_count
+                FROM (SELECT
+                        plant_id,
+                        COUNT(*) AS reading_count,
+                        AVG(temperature) AS avg_temperature,
+                        AVG(soil_moisture) AS avg_soil_moisture,
+                        MIN(recording_taken) AS first_recorded,
+                        MAX(recording_taken) AS last_recorded
+                      FROM {table}{condition}
+                      GROUP BY plant_id) AS readings;"""
+
+
+def up_to_condition(up_to_id: int) -> tuple[str, tuple]:
+    """WHERE clause and parameters limiting a query to ids up to up_to_id."""
+    if up_to_id is None:
+        return "", ()
+    return "\n                WHERE plant_metric_id <= %s", (up_to_id,)
+
+
+def archive_plant_metrics(conn: Connection, table: str = METRIC_TABLE,
+                          up_to_id: int = None, clear: bool = False,
+                          readings: pd.DataFrame = None) -> int:
+    """Aggregates the readings of every plant in the table, up to up_to_id if
+    given, into the archive table with a single statement and adds them to the
+    archive summary in the same commit. If readings are given, they are merged
+    into the rollups in that commit too, so a failed run leaves no partial
+    buckets behind. If clear is set, the table is emptied in the same
+    transaction. Returns the number of plants archived."""
+    logging.info("Attempting to insert into archive table from %s", table)
+    started = perf_counter()
+    condition, params = up_to_condition(up_to_id)
     try:
-        conn = connect(
-            server=environ["DB_HOST"],
-            port=environ["DB_PORT"],
-            user=environ["DB_USER"],
-            password=environ["DB_PASSWORD"],
-            database=environ["DB_NAME"],
-            as_dict=True
-        )
-        logging.info("Database connection successful.")
-        return conn
-    except KeyError as e:
-        logging.error("%s missing from environment variables.", e)
-        raise
-    except exceptions.OperationalError as e:
-        logging.error("Error connecting to database: %s", e)
-        raise
-    except Exception as e:
-        logging.error(
-            "Unexpected error while connecting to database: %s", e)
-        raise
-
-
-def get_all_plant_ids(conn: Connection) -> list:
-    """Retrieves all plant ids from the database"""
-    query = "SELECT plant_id FROM plant;"
-    with conn.cursor() as cur:
-        cur.execute(query)
-        plant_ids = cur.fetchall()
-        ids = [id['plant_id'] for id in plant_ids]
-
-    return ids
-
-
-def get_plants_data(conn: Connection, plant_ids) -> None:
-    """Combines the plant ids and plant metrics"""
-    for id in plant_ids:
-        metrics = calculate_archive_metrics(conn, id)[0]
-        latest_recording = get_latest_recording(conn, id)['recording_taken']
-        metrics['last_recorded'] = latest_recording
-        metrics['plant_id'] = id
-        upload_plant_metric_data(conn, metrics)
-
-
-def upload_plant_metric_data(conn: Connection, plant_details: dict) -> None:
-    """Uploads the past 24 hour data from plant metrics table into archive table"""
-
-    query = """INSERT INTO epsilon.plants_archive (avg_temperature, 
-                    avg_soil_moisture, watered_count, last_recorded, plant_id)
-                VALUES (%s, %s, %s, %s, %s);"""
-
-    avg_temp = plant_details.get("avg_temp")
-    avg_soil_moist = plant_details.get("avg_moisture")
-    watered_count = plant_details.get("watered_count")
-    last_recorded = plant_details.get("last_recorded")
-    plant_id = plant_details.get("plant_id")
-
-    with conn.cursor() as cur:
-        logging.info("Attempting to insert into archive table - plant: %s",
-                     plant_details.get("plant_id"))
-        cur.execute(query, (avg_temp, avg_soil_moist,
-                    watered_count, last_recorded, plant_id))
+        if readings is not None:
+            rollup_readings(conn, readings)
+        with conn.cursor() as cur:
+            cur.execute(ARCHIVE_QUERY.format(table=table, condition=condition), params)
+            archived = cur.rowcount
+            update_archive_summary(cur, read_table_totals(cur, table, condition, params))
+            bump_data_version(cur, ARCHIVE_VERSION, archived)
+            if clear:
+                cur.execute(f"TRUNCATE TABLE {table};")
         conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
 
-    logging.info("Completed inserting to archive")
-
+    logging.info("Archived %s plants in %.3fs", archived, perf_counter() - started)
+    return archived
 
-def calculate_archive_metrics(conn: Connection, plant_id: int) -> int:
-    """Calculates the number of times a given plant was watered in the last 24 hours"""
 
-    query = """SELECT
-                    AVG(soil_moisture) as avg_moisture,
-                    COUNT(DISTINCT(last_watered)) as watered_count,
-                    AVG(temperature) as avg_temp
-                FROM plant_metric
-                WHERE plant_id = %s"""
+def switch_out_plant_metrics(conn: Connection) -> bool:
+    """Swaps the live readings into the empty staging table. This is a metadata
+    change rather than a copy, so ETL inserts only wait for an instant and none
+    are lost. Returns False, without swapping, if the staging table still holds
+    readings from an unfinished run."""
     with conn.cursor() as cur:
-        cur.execute(query, (plant_id,))
-        archive_metrics = cur.fetchall()
-
-    return archive_metrics
-
-
-def get_latest_recording(conn: Connection, plant_id: int) -> int:
-    """Finds the latest time a recording was made for a given plant."""
+        cur.execute(f"SELECT TOP 1 plant_metric_id FROM {STAGING_TABLE};")
+        if cur.fetchone():
+            return False
+    conn.commit()
 
-    query = """SELECT TOP 1 recording_taken
-                FROM plant_metric
-                WHERE plant_id = %s
-                ORDER BY recording_taken DESC;"""
-    with conn.cursor() as cur:
-        cur.execute(query, (plant_id,))
-        latest_recording = cur.fetchone()
+    started = perf_counter()
+    try:
+        with conn.cursor() as cur:
+            for statement in get_backend().swap_statements(METRIC_TABLE, STAGING_TABLE):
+                cur.execute(statement)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
 
-    return latest_recording
+    logging.info("Switched plant metrics out in %.3fs", perf_counter() - started)
+    return True
 
 
-def clear_plant_metrics(conn: Connection) -> None:
-    """ Clears all recordings from the plant metrics table."""
-    query = "TRUNCATE TABLE epsilon.plant_metric;"
+def get_readings(conn: Connection, table: str, up_to_id: int = None) -> pd.DataFrame:
+    """Reads the raw readings in the table, up to up_to_id if given."""
+    condition, params = up_to_condition(up_to_id)
     with conn.cursor() as cur:
-        cur.execute(query)
-        conn.commit()
+        cur.execute(f"SELECT {', '.join(READING_COLUMNS)} FROM {table}{condition};", params)
+        return pd.DataFrame(cur.fetchall(), columns=READING_COLUMNS)
+
+
+def process_readings(conn: Connection, table: str, store: ParquetStore = None,
+                     up_to_id: int = None) -> pd.DataFrame:
+    """Reads the table's readings once and exports them if a store is given.
+    Returns the readings for the rollups."""
+    readings = get_readings(conn, table, up_to_id)
+    if store:
+        written = store.write(readings)
+        logging.info("Exported %s readings to %s in %s files",
+                     len(readings), store.path, len(written))
+    return readings
+
+
+def archive_staged_metrics(conn: Connection, store: ParquetStore = None) -> None:
+    """Exports the staged readings, then rolls them up, archives them and
+    empties the staging table in one transaction."""
+    readings = process_readings(conn, STAGING_TABLE, store)
+    archive_plant_metrics(conn, STAGING_TABLE, clear=True, readings=readings)
+
+
+def swap_and_archive(conn: Connection, store: ParquetStore = None) -> None:
+    """Switches the live readings out, then archives and empties the staging table."""
+    if not switch_out_plant_metrics(conn):
+        logging.warning("Archiving readings left in staging by an unfinished run")
+        archive_staged_metrics(conn, store)
+        switch_out_plant_metrics(conn)
+    archive_staged_metrics(conn, store)
+
+
+def archive_batch(conn: Connection, store: ParquetStore = None,
+                  chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                  pause_seconds: float = DEFAULT_PAUSE_SECONDS) -> None:
+    """Archives every reading loaded so far, then purges exactly those readings.
+    Readings loaded while the archive runs are left for the next run."""
+    up_to_id = get_last_metric_id(conn)
+    if up_to_id is None:
+        logging.info("No readings to archive")
+        return
+    readings = process_readings(conn, METRIC_TABLE, store, up_to_id)
+    archive_plant_metrics(conn, up_to_id=up_to_id, readings=readings)
+    purge_archived_metrics(conn, up_to_id, chunk_rows, pause_seconds)
 
 
 def lambda_handler(event, context) -> None:
@@ -125,13 +168,23 @@ def lambda_handler(event, context) -> None:
     try:
         load_dotenv()
         logging.info("Connecting to database")
-        conn = get_connection()
-
-        plant_ids = get_all_plant_ids(conn)
-        get_plants_data(conn, plant_ids)
-
-        clear_plant_metrics(conn)
-        logging.info("Plant metric table has been cleared")
+        with pooled_connection() as conn:
+            mode = environ.get("ARCHIVE_MODE", "batch").lower()
+            if mode not in ARCHIVE_MODES:
+                raise ValueError(
+                    f"Unknown ARCHIVE_MODE '{mode}', expected one of {ARCHIVE_MODES}")
+
+            store = ParquetStore.from_environ()
+            chunk_rows = int(environ.get("PURGE_CHUNK_ROWS", DEFAULT_CHUNK_ROWS))
+            pause_seconds = float(environ.get("PURGE_PAUSE_SECONDS", DEFAULT_PAUSE_SECONDS))
+            started = perf_counter()
+            if mode == "swap":
+                swap_and_archive(conn, store)
+            elif mode == "incremental":
+                archive_incrementally(conn, store, chunk_rows, pause_seconds)
+            else:
+                archive_batch(conn, store, chunk_rows, pause_seconds)
+            logging.info("Archive completed in %.3fs", perf_counter() - started)
 
         return {
             "statuscode": 200,
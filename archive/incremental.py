@@ -0,0 +1,162 @@
+"""Incremental archiving: runs every few minutes and folds only the readings past
+a persisted watermark into the current day's archive rows and the rollups, then
+purges them from plant_metric in small key-range chunks.
+
+The watermark row is locked for the whole run, so overlapping runs queue up
+rather than archiving the same readings twice. The archive rows, the rollups,
+the archive summary and the watermark are committed together, so each reading
+is archived once."""
+
+import logging
+from time import perf_counter
+
+import pandas as pd
+
+from parquet_store import ParquetStore, READING_COLUMNS
+from purge import purge_archived_metrics, DEFAULT_CHUNK_ROWS, DEFAULT_PAUSE_SECONDS
+from rollup import rollup_readings
+from summary import summarise_readings, update_archive_summary
+from plantdb import bump_data_version, ARCHIVE_VERSION
+
+WATERMARK_NAME = "plant_metric"
+
+
+def lock_watermark(cur) -> dict:
+    """Locks the watermark row until the transaction ends and returns it."""
+    cur.execute("""UPDATE epsilon.archive_watermark SET name = name
+                   WHERE name = %s;""", (WATERMARK_NAME,))
+    cur.execute("""SELECT plant_metric_id, recording_taken
+                   FROM epsilon.archive_watermark
+                   WHERE name = %s;""", (WATERMARK_NAME,))
+    watermark = cur.fetchone()
+    if watermark is None:
+        raise RuntimeError(
+            "epsilon.archive_watermark is missing, run python -m plantdb.migrations")
+    return watermark
+
+
+def get_new_readings(cur, after_id: int) -> pd.DataFrame:
+    """Reads the readings inserted since the watermark."""
+    cur.execute(f"""SELECT {", ".join(READING_COLUMNS)}
+                    FROM epsilon.plant_metric
+                    WHERE plant_metric_id > %s
+                    ORDER BY plant_metric_id;""", (after_id,))
+    readings = pd.DataFrame(cur.fetchall(), columns=READING_COLUMNS)
+    for column in ("recording_taken", "last_watered"):
+        readings[column] = pd.to_datetime(readings[column])
+    return readings
+
+
+def summarise_by_day(readings: pd.DataFrame) -> pd.DataFrame:
+    """Partial archive figures for each plant and day in the readings."""
+    readings = readings.assign(archive_date=readings["recording_taken"].dt.date)
+    return readings.groupby(["plant_id", "archive_date"]).agg(
+        reading_count=("temperature", "size"),
+        temperature_sum=("temperature", "sum"),
+        soil_moisture_sum=("soil_moisture", "sum"),
+        last_watered=("last_watered", "max"),
+        first_recorded=("recording_taken", "min"),
+        last_recorded=("recording_taken", "max")).reset_index()
+
+
+def count_waterings(cur, days: pd.DataFrame) -> pd.Series:
+    """Counts the watering events the load detected in each plant's new readings
+    on each day, indexed by plant_id and archive_date."""
+    plant_ids = [int(plant_id) for plant_id in days["plant_id"].unique()]
+    cur.execute(f"""SELECT plant_id, detected_at FROM epsilon.watering_event
+                    WHERE plant_id IN ({", ".join(["%s"] * len(plant_ids))})
+                      AND detected_at >= %s AND detected_at <= %s;""",
+                (*plant_ids, days["first_recorded"].min(), days["last_recorded"].max()))
+    events = pd.DataFrame(cur.fetchall(), columns=["plant_id", "detected_at"])
+    events["detected_at"] = pd.to_datetime(events["detected_at"])
+    events = events.assign(archive_date=events["detected_at"].dt.date).merge(
+        days[["plant_id", "archive_date", "first_recorded", "last_recorded"]])
+    events = events[(events["detected_at"] >= events["first_recorded"])
+                    & (events["detected_at"] <= events["last_recorded"])]
+    return events.groupby(["plant_id", "archive_date"]).size()
+
+
+def merge_daily_archive(cur, readings: pd.DataFrame) -> int:
+    """Adds the readings to each plant's archive row for their day, creating
+    the row on a plant's first readings of the day. Returns the rows written."""
+    days = summarise_by_day(readings)
+    waterings = count_waterings(cur, days)
+    cur.execute("""SELECT plant_archive_id, plant_id, archive_date, avg_temperature,
+                       avg_soil_moisture, watered_count, reading_count,
+                       last_watered, last_recorded
+                   FROM epsilon.plants_archive
+                   WHERE archive_date >= %s AND archive_date <= %s;""",
+                (days["archive_date"].min(), days["archive_date"].max()))
+    stored = {(row["plant_id"], pd.Timestamp(row["archive_date"]).date()): row
+              for row in cur.fetchall()}
+
+    inserts, updates = [], []
+    for day in days.itertuples(index=False):
+        row = stored.get((day.plant_id, day.archive_date))
+        watered = int(waterings.get((day.plant_id, day.archive_date), 0))
+        if row is None:
+            inserts.append((day.temperature_sum / day.reading_count,
+                            day.soil_moisture_sum / day.reading_count,
+                            watered, day.last_recorded, int(day.plant_id),
+                            day.archive_date, int(day.reading_count), day.last_watered))
+            continue
+
+        count = row["reading_count"] + day.reading_count
+        updates.append((
+            (row["avg_temperature"] * row["reading_count"] + day.temperature_sum) / count,
+            (row["avg_soil_moisture"] * row["reading_count"] + day.soil_moisture_sum) / count,
+            row["watered_count"] + watered,
+            max(pd.Timestamp(row["last_recorded"]), day.last_recorded),
+            int(count),
+            max(pd.Timestamp(row["last_watered"]), day.last_watered),
+            row["plant_archive_id"]))
+
+    if inserts:
+        cur.executemany("""INSERT INTO epsilon.plants_archive (avg_temperature,
+                               avg_soil_moisture, watered_count, last_recorded, plant_id,
+                               archive_date, reading_count, last_watered)
+                           VALUES (%s, %s, %s, %s, %s, %s, %s, %s);""", inserts)
+    if updates:
+        cur.executemany("""UPDATE epsilon.plants_archive
+                           SET avg_temperature = %s, avg_soil_moisture = %s,
+                               watered_count = %s, last_recorded = %s,
+                               reading_count = %s, last_watered = %s
+                           WHERE plant_archive_id = %s;""", updates)
+    return len(inserts) + len(updates)
+
+
+def archive_incrementally(conn, store: ParquetStore = None,
+                          chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                          pause_seconds: float = DEFAULT_PAUSE_SECONDS) -> int:
+    """Archives the readings past the watermark, advances it and purges the
+    archived readings. Returns the number of readings archived."""
+    started = perf_counter()
+    try:
+        with conn.cursor() as cur:
+            watermark = lock_watermark(cur)
+            readings = get_new_readings(cur, watermark["plant_metric_id"])
+            last_id = watermark["plant_metric_id"]
+            if not readings.empty:
+                if store:
+                    store.write(readings)
+                rollup_readings(conn, readings)
+                archived_rows = merge_daily_archive(cur, readings)
+                update_archive_summary(cur, summarise_readings(readings))
+                last_id = int(readings["plant_metric_id"].max())
+                cur.execute("""UPDATE epsilon.archive_watermark
+                               SET plant_metric_id = %s, recording_taken = %s,
+                                   updated_at = CURRENT_TIMESTAMP
+                               WHERE name = %s;""",
+                            (last_id, readings["recording_taken"].max(), WATERMARK_NAME))
+                bump_data_version(cur, ARCHIVE_VERSION, archived_rows)
+                logging.info("Merged %s readings into %s archive rows",
+                             len(readings), archived_rows)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    purge_archived_metrics(conn, last_id, chunk_rows, pause_seconds)
+    logging.info("Incremental archive up to plant_metric_id %s took %.3fs",
+                 last_id, perf_counter() - started)
+    return len(readings)
@@ -0,0 +1,139 @@
+"""Columnar store for the raw plant readings the archive would otherwise discard.
+
+Readings are written as zstd-compressed Parquet files partitioned by day
+(`dt=YYYY-MM-DD`), sorted by plant and time so the row-group min/max statistics
+let historical reads skip whole days and row groups. The store is a local
+directory or an S3 bucket (or an S3-compatible stand-in such as MinIO)."""
+
+from datetime import datetime
+from os import environ
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from pyarrow import fs
+
+DEFAULT_ROWS_PER_GROUP = 16384
+COMPRESSION = "zstd"
+READING_COLUMNS = ["plant_metric_id", "plant_id", "botanist_id", "recording_taken",
+                   "last_watered", "temperature", "soil_moisture"]
+READING_SCHEMA = pa.schema([
+    ("plant_metric_id", pa.int64()),
+    ("plant_id", pa.int16()),
+    ("botanist_id", pa.int16()),
+    ("recording_taken", pa.timestamp("ms")),
+    ("last_watered", pa.timestamp("ms")),
+    ("temperature", pa.float64()),
+    ("soil_moisture", pa.float64()),
+])
+PARTITIONING = ds.partitioning(pa.schema([("dt", pa.string())]), flavor="hive")
+DATASET_SCHEMA = READING_SCHEMA.append(pa.field("dt", pa.string()))
+
+
+def get_filesystem(path: str) -> tuple[fs.FileSystem, str]:
+    """Returns the filesystem and root directory for a local path or s3:// URI.
+    On AWS the default credentials are used, which in the Lambda are its
+    execution role's. S3_ENDPOINT_URL points S3 paths at an S3-compatible server
+    instead, authenticated with ACCESS_KEY_ID and SECRET_ACCESS_KEY."""
+    if not path.startswith("s3://"):
+        return fs.LocalFileSystem(), path
+    endpoint = environ.get("S3_ENDPOINT_URL")
+    keys = {"access_key": environ.get("ACCESS_KEY_ID"),
+            "secret_key": environ.get("SECRET_ACCESS_KEY")} if endpoint else {}
+    filesystem = fs.S3FileSystem(endpoint_override=endpoint,
+                                 region=environ.get("AWS_REGION", "eu-west-2"), **keys)
+    return filesystem, path.removeprefix("s3://")
+
+
+class ParquetStore:
+    """Day-partitioned Parquet files holding raw plant_metric readings."""
+
+    def __init__(self, path: str, rows_per_group: int = DEFAULT_ROWS_PER_GROUP) -> None:
+        self.path = path
+        self.filesystem, self.root = get_filesystem(path)
+        self.rows_per_group = rows_per_group
+
+    @classmethod
+    def from_environ(cls) -> "ParquetStore":
+        """Creates a store from PARQUET_ARCHIVE_PATH, or None if the export is off."""
+        path = environ.get("PARQUET_ARCHIVE_PATH")
+        if not path:
+            return None
+        return cls(path, rows_per_group=int(environ.get(
+            "PARQUET_ROWS_PER_GROUP", DEFAULT_ROWS_PER_GROUP)))
+
+    def write(self, readings: pd.DataFrame) -> list[str]:
+        """Writes readings into their day partitions and returns the files written.
+
+        Files are named after the run's first plant_metric_id, which a retried
+        run shares with the failed one even when it has since seen more
+        readings. The earlier run's files are removed first, so the partitions
+        never hold the same reading twice."""
+        if readings.empty:
+            return []
+        readings = readings[READING_COLUMNS].copy()
+        for column in ("recording_taken", "last_watered"):
+            readings[column] = pd.to_datetime(readings[column])
+        readings = readings.sort_values(["plant_id", "recording_taken"])
+
+        table = pa.Table.from_pandas(readings, schema=READING_SCHEMA,
+                                     preserve_index=False)
+        days = readings["recording_taken"].dt.strftime("%Y-%m-%d")
+        table = table.append_column("dt", pa.array(days))
+
+        batch_key = readings["plant_metric_id"].min()
+        self.remove_batch(batch_key, days.unique())
+        written = []
+        ds.write_dataset(
+            table, self.root, filesystem=self.filesystem, format="parquet",
+            partitioning=PARTITIONING,
+            basename_template=f"readings-{batch_key}-{{i}}.parquet",
+            file_options=ds.ParquetFileFormat().make_write_options(
+                compression=COMPRESSION),
+            max_rows_per_group=self.rows_per_group,
+            min_rows_per_group=min(self.rows_per_group, len(readings)),
+            existing_data_behavior="overwrite_or_ignore",
+            file_visitor=lambda file: written.append(file.path))
+        return written
+
+    def remove_batch(self, batch_key: int, days: list[str]) -> None:
+        """Deletes the files an earlier export of the batch left in the given
+        day partitions. A retry reads every reading the failed run read, so
+        its days cover the failed run's."""
+        prefix = f"readings-{batch_key}-"
+        for day in days:
+            selector = fs.FileSelector(f"{self.root}/dt={day}", allow_not_found=True)
+            for info in self.filesystem.get_file_info(selector):
+                if info.base_name.startswith(prefix):
+                    self.filesystem.delete_file(info.path)
+
+    def read(self, columns: list[str] = None, plant_ids: list[int] = None,
+             start: datetime = None, end: datetime = None) -> pd.DataFrame:
+        """Reads readings taken between start (inclusive) and end (exclusive).
+
+        Day partitions outside the range are never opened, and row groups are
+        skipped using their plant_id and recording_taken statistics. Only the
+        requested columns are read."""
+        try:
+            dataset = ds.dataset(self.root, filesystem=self.filesystem, format="parquet",
+                                 schema=DATASET_SCHEMA, partitioning=PARTITIONING)
+        except FileNotFoundError:
+            return pd.DataFrame(columns=columns or READING_COLUMNS)
+
+        conditions = []
+        if start is not None:
+            conditions.append(ds.field("dt") >= start.strftime("%Y-%m-%d"))
+            conditions.append(ds.field("recording_taken") >= pa.scalar(
+                pd.Timestamp(start), pa.timestamp("ms")))
+        if end is not None:
+            conditions.append(ds.field("dt") <= end.strftime("%Y-%m-%d"))
+            conditions.append(ds.field("recording_taken") < pa.scalar(
+                pd.Timestamp(end), pa.timestamp("ms")))
+        if plant_ids is not None:
+            conditions.append(ds.field("plant_id").isin(plant_ids))
+
+        row_filter = None
+        for condition in conditions:
+            row_filter = condition if row_filter is None else row_filter & condition
+        return dataset.to_table(columns=columns or READING_COLUMNS,
+                                filter=row_filter).to_pandas()
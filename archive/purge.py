@@ -0,0 +1,62 @@
+"""Deletes archived readings from plant_metric without blocking the ETL.
+
+Rather than a TRUNCATE, which needs a schema-modification lock and also drops
+readings loaded after the archive read the table, only readings up to the last
+archived plant_metric_id are deleted. They go in key ranges of a bounded number
+of ids, each in its own short transaction with a pause in between. Each chunk
+stays well below SQL Server's lock escalation threshold of 5000 locks, so ETL
+inserts and dashboard reads can run between chunks."""
+
+import logging
+import time
+
+METRIC_TABLE = "epsilon.plant_metric"
+DEFAULT_CHUNK_ROWS = 500
+DEFAULT_PAUSE_SECONDS = 0.1
+
+
+def get_last_metric_id(conn, table: str = METRIC_TABLE) -> int:
+    """Returns the newest plant_metric_id in the table, or None if it is empty."""
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT MAX(plant_metric_id) AS last_id FROM {table};")
+        last_id = cur.fetchone()["last_id"]
+    conn.commit()
+    return last_id
+
+
+def purge_archived_metrics(conn, up_to_id: int, chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                           pause_seconds: float = DEFAULT_PAUSE_SECONDS,
+                           table: str = METRIC_TABLE) -> int:
+    """Deletes the readings with ids up to and including up_to_id, chunk_rows
+    ids at a time. Returns the number of readings deleted."""
+    started = time.perf_counter()
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT MIN(plant_metric_id) AS first_id FROM {table};")
+        first_id = cur.fetchone()["first_id"]
+    conn.commit()
+    if first_id is None or up_to_id is None:
+        return 0
+
+    deleted = 0
+    chunks = 0
+    lower = first_id - 1
+    while lower < up_to_id:
+        if chunks and pause_seconds:
+            time.sleep(pause_seconds)
+        upper = min(lower + chunk_rows, up_to_id)
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"""DELETE FROM {table}
+                                WHERE plant_metric_id > %s AND plant_metric_id <= %s;""",
+                            (lower, upper))
+                deleted += cur.rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        chunks += 1
+        lower = upper
+
+    logging.info("Purged %s archived readings in %s chunks in %.3fs",
+                 deleted, chunks, time.perf_counter() - started)
+    return deleted
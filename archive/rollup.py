@@ -0,0 +1,130 @@
+"""Hourly and daily rollups of the plant readings, kept for long-term trend charts.
+
+Both tiers are computed from one read of the readings. Each bucket holds the
+reading count and the min, max, mean, standard deviation, median and 95th
+percentile of the temperature and soil moisture. Each run's buckets are merged
+into the stored ones, because readings of the same hour or day can be archived
+by different runs. Merged percentiles are approximate."""
+
+import logging
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+from plantdb import get_backend
+
+METRICS = ["temperature", "soil_moisture"]
+STATISTICS = ["min", "max", "mean", "stddev", "p50", "p95"]
+ROLLUP_COLUMNS = ["plant_id", "bucket_start", "reading_count"] + \
+    [f"{metric}_{statistic}" for metric in METRICS for statistic in STATISTICS]
+TIERS = {
+    "hourly": ("epsilon.plant_metric_hourly", "h"),
+    "daily": ("epsilon.plant_metric_daily", "D"),
+}
+
+
+def compute_rollups(readings: pd.DataFrame, frequency: str) -> pd.DataFrame:
+    """Aggregates readings into per-plant buckets of the given pandas frequency."""
+    if readings.empty:
+        return pd.DataFrame(columns=ROLLUP_COLUMNS)
+
+    readings = readings.assign(
+        bucket_start=pd.to_datetime(readings["recording_taken"]).dt.floor(frequency))
+    groups = readings.groupby(["plant_id", "bucket_start"])
+
+    rollups = groups.agg(reading_count=("temperature", "size"), **{
+        f"{metric}_{name}": (metric, function)
+        for metric in METRICS
+        for name, function in (("min", "min"), ("max", "max"), ("mean", "mean"))
+    })
+    for metric in METRICS:
+        # Population deviation, so single-reading buckets are 0 rather than null.
+        rollups[f"{metric}_stddev"] = groups[metric].std(ddof=0)
+        percentiles = groups[metric].quantile([0.5, 0.95]).unstack()
+        rollups[f"{metric}_p50"] = percentiles[0.5]
+        rollups[f"{metric}_p95"] = percentiles[0.95]
+
+    return rollups.reset_index()[ROLLUP_COLUMNS]
+
+
+def get_stored_rollups(conn, rollups: pd.DataFrame, table: str) -> pd.DataFrame:
+    """Reads the stored buckets in the time range of the new rollups."""
+    query = f"""SELECT {", ".join(ROLLUP_COLUMNS)} FROM {table}
+                WHERE bucket_start >= %s AND bucket_start <= %s;"""
+    with conn.cursor() as cur:
+        cur.execute(query, (rollups["bucket_start"].min(), rollups["bucket_start"].max()))
+        stored = pd.DataFrame(cur.fetchall(), columns=ROLLUP_COLUMNS)
+    stored["bucket_start"] = pd.to_datetime(stored["bucket_start"])
+    return stored
+
+
+def merge_metric(merged: pd.DataFrame, metric: str) -> dict[str, pd.Series]:
+    """Combines one metric's new and stored statistics of the merged buckets."""
+    new_count = merged["reading_count"]
+    stored_count = merged["reading_count_stored"].fillna(0)
+    count = new_count + stored_count
+
+    def stored_or_new(statistic: str) -> pd.Series:
+        column = f"{metric}_{statistic}"
+        return merged[f"{column}_stored"].fillna(merged[column])
+
+    def weighted(statistic: str) -> pd.Series:
+        return (merged[f"{metric}_{statistic}"] * new_count
+                + stored_or_new(statistic) * stored_count) / count
+
+    mean = weighted("mean")
+    square_mean = ((merged[f"{metric}_stddev"] ** 2 + merged[f"{metric}_mean"] ** 2)
+                   * new_count
+                   + (stored_or_new("stddev") ** 2 + stored_or_new("mean") ** 2)
+                   * stored_count) / count
+    return {
+        f"{metric}_min": np.minimum(merged[f"{metric}_min"], stored_or_new("min")),
+        f"{metric}_max": np.maximum(merged[f"{metric}_max"], stored_or_new("max")),
+        f"{metric}_mean": mean,
+        f"{metric}_stddev": np.sqrt((square_mean - mean ** 2).clip(lower=0)),
+        f"{metric}_p50": weighted("p50"),
+        f"{metric}_p95": weighted("p95")
+    }
+
+
+def merge_rollups(stored: pd.DataFrame, rollups: pd.DataFrame) -> pd.DataFrame:
+    """Combines new buckets with the stored buckets of the same plant and start.
+    Counts, extremes, means and deviations combine exactly; percentiles are
+    weighted by count, so they are approximate."""
+    stored = stored.astype({column: "float64" for column in ROLLUP_COLUMNS[2:]})
+    merged = rollups.merge(stored.astype({"plant_id": rollups["plant_id"].dtype}),
+                           on=["plant_id", "bucket_start"], how="left",
+                           suffixes=("", "_stored"))
+    count = merged["reading_count"] + merged["reading_count_stored"].fillna(0)
+
+    result = merged[["plant_id", "bucket_start"]].assign(reading_count=count.astype("int64"))
+    for metric in METRICS:
+        result = result.assign(**merge_metric(merged, metric))
+    return result[ROLLUP_COLUMNS]
+
+
+def write_rollups(conn, rollups: pd.DataFrame, table: str) -> None:
+    """Upserts merged rollup rows over the stored buckets with the same key."""
+    query = get_backend().upsert_query(table, ["plant_id", "bucket_start"], ROLLUP_COLUMNS)
+    with conn.cursor() as cur:
+        cur.executemany(query, list(rollups.astype(object).itertuples(index=False, name=None)))
+
+
+def rollup_readings(conn, readings: pd.DataFrame) -> dict[str, int]:
+    """Merges the readings into every rollup tier in the connection's current
+    transaction, which the caller commits along with the rest of the archive
+    run. Returns the buckets written per tier."""
+    started = perf_counter()
+    buckets = {}
+    for tier, (table, frequency) in TIERS.items():
+        rollups = compute_rollups(readings, frequency)
+        if rollups.empty:
+            buckets[tier] = 0
+            continue
+        rollups = merge_rollups(get_stored_rollups(conn, rollups, table), rollups)
+        write_rollups(conn, rollups, table)
+        buckets[tier] = len(rollups)
+
+    logging.info("Wrote rollups %s in %.3fs", buckets, perf_counter() - started)
+    return buckets
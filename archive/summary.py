@@ -0,0 +1,84 @@
+"""Running per-plant totals of every archived reading, for the dashboard's
+all-time average lines.
+
+Each archive run adds the count, sums and extremes of the readings it archives
+to one row per plant, in the same transaction as the archive rows. The
+dashboard then reads the averages from about 50 rows by primary key, instead
+of averaging the whole, ever-growing archive table."""
+
+import numpy as np
+import pandas as pd
+
+from plantdb import get_backend
+
+SUMMARY_TABLE = "epsilon.plant_archive_summary"
+METRICS = ["temperature", "soil_moisture"]
+SUMMARY_COLUMNS = ["plant_id", "reading_count"] + \
+    [f"{metric}_{statistic}" for metric in METRICS for statistic in ("sum", "min", "max")] + \
+    ["last_recorded"]
+
+
+def summarise_readings(readings: pd.DataFrame) -> pd.DataFrame:
+    """Totals of each plant's readings."""
+    if readings.empty:
+        return pd.DataFrame(columns=SUMMARY_COLUMNS)
+    totals = readings.groupby("plant_id").agg(
+        reading_count=("temperature", "size"), **{
+            f"{metric}_{statistic}": (metric, statistic)
+            for metric in METRICS for statistic in ("sum", "min", "max")},
+        last_recorded=("recording_taken", "max"))
+    return totals.reset_index()[SUMMARY_COLUMNS]
+
+
+def read_table_totals(cur, table: str, condition: str = "", params: tuple = ()) -> pd.DataFrame:
+    """Totals of each plant's readings in a table, aggregated by the database."""
+    statistics = ", ".join(f"{statistic.upper()}({metric}) AS {metric}_{statistic}"
+                           for metric in METRICS for statistic in ("sum", "min", "max"))
+    cur.execute(f"""SELECT plant_id, COUNT(*) AS reading_count, {statistics},
+                        MAX(recording_taken) AS last_recorded
+                    FROM {table}{condition}
+                    GROUP BY plant_id;""", params)
+    return pd.DataFrame(cur.fetchall(), columns=SUMMARY_COLUMNS)
+
+
+def get_stored_summary(cur, plant_ids: list[int]) -> pd.DataFrame:
+    """Reads the summary rows of the given plants."""
+    cur.execute(f"""SELECT {", ".join(SUMMARY_COLUMNS)} FROM {SUMMARY_TABLE}
+                    WHERE plant_id IN ({", ".join(["%s"] * len(plant_ids))});""",
+                tuple(plant_ids))
+    return pd.DataFrame(cur.fetchall(), columns=SUMMARY_COLUMNS)
+
+
+def merge_summary(stored: pd.DataFrame, totals: pd.DataFrame) -> pd.DataFrame:
+    """Adds new totals to the stored summary rows of the same plants. Counts
+    and sums add up, and the extremes and last reading widen."""
+    stored = stored.astype({column: "float64" for column in SUMMARY_COLUMNS[1:-1]})
+    merged = totals.merge(stored.astype({"plant_id": totals["plant_id"].dtype}),
+                          on="plant_id", how="left", suffixes=("", "_stored"))
+
+    result = merged[["plant_id"]].assign(
+        reading_count=(merged["reading_count"]
+                       + merged["reading_count_stored"].fillna(0)).astype("int64"))
+    for metric in METRICS:
+        result[f"{metric}_sum"] = merged[f"{metric}_sum"] \
+            + merged[f"{metric}_sum_stored"].fillna(0)
+        result[f"{metric}_min"] = np.fmin(merged[f"{metric}_min"],
+                                          merged[f"{metric}_min_stored"])
+        result[f"{metric}_max"] = np.fmax(merged[f"{metric}_max"],
+                                          merged[f"{metric}_max_stored"])
+    result["last_recorded"] = np.fmax(pd.to_datetime(merged["last_recorded"]),
+                                      pd.to_datetime(merged["last_recorded_stored"]))
+    return result[SUMMARY_COLUMNS]
+
+
+def update_archive_summary(cur, totals: pd.DataFrame) -> int:
+    """Folds the totals of newly archived readings into the summary, on the
+    archive's cursor so both land in the same transaction. Returns the number
+    of plants updated."""
+    if totals.empty:
+        return 0
+    plant_ids = [int(plant_id) for plant_id in totals["plant_id"]]
+    summary = merge_summary(get_stored_summary(cur, plant_ids), totals)
+    query = get_backend().upsert_query(SUMMARY_TABLE, ["plant_id"], SUMMARY_COLUMNS)
+    cur.executemany(query, list(summary.astype(object).itertuples(index=False, name=None)))
+    return len(summary)
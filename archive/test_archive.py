@@ -3,161 +3,204 @@
 
 import os
 import unittest
-from unittest.mock import MagicMock, patch, call
-from pymssql import exceptions
+from unittest.mock import MagicMock, patch
+import pytest
 from archive import (
-    get_connection,
-    get_all_plant_ids,
-    get_plants_data,
-    upload_plant_metric_data,
-    calculate_archive_metrics,
-    get_latest_recording,
-    clear_plant_metrics,
+    archive_plant_metrics,
+    switch_out_plant_metrics,
+    swap_and_archive,
+    archive_staged_metrics,
+    process_readings,
+    archive_batch,
+    ARCHIVE_QUERY,
+    STAGING_TABLE,
     lambda_handler
 )
 
 
 class TestArchive(unittest.TestCase):
     """ Test class containing archive tests """
-    @patch.dict(
-        os.environ,
-        {
-            "DB_HOST": "mock_value",
-            "DB_NAME": "mock_value",
-            "DB_USER": "mock_value",
-            "DB_PASSWORD": "mock_value",
-            "DB_PORT": "mock_value",
-            "SERVER": "mock_value"
-        },
-    )
-    @patch('archive.connect')
-    def test_get_connection_success(self, mock_connect):
-        """Test successful database connection."""
-        mock_connection = MagicMock()
-        mock_connect.return_value = mock_connection
-
-        connection = get_connection()
-        mock_connect.assert_called_once_with(
-            server='mock_value',
-            port='mock_value',
-            user='mock_value',
-            password='mock_value',
-            database='mock_value',
-            as_dict=True
-        )
-        assert connection == mock_connect.return_value
-
-    @patch("archive.connect")
-    def test_get_connection_missing_env_var(self, mock_connect):
-        """"""
-        with self.assertRaises(KeyError):
-            get_connection()
-
-    @patch.dict(
-        os.environ,
-        {
-            "DB_HOST": "mock_value",
-            "DB_NAME": "mock_value",
-            "DB_USER": "mock_value",
-            "DB_PASSWORD": "mock_value",
-            "DB_PORT": "mock_value",
-        },
-    )
-    @patch("archive.connect")
-    def test_get_connection_operational_error(self, mock_connect):
-        """Tests that operational error raised """
-        mock_connect.side_effect = exceptions.OperationalError(
-            "OperationalError")
-
-        with self.assertRaises(exceptions.OperationalError):
-            get_connection()
-
-    @patch("archive.connect")
-    def test_get_connection_unexpected_error(self, mock_connect):
-        """Tests that unexpected error raised """
-        mock_connect.side_effect = Exception("UnexpectedError")
-        with self.assertRaises(Exception):
-            get_connection()
+    @pytest.fixture
+    def local_db(self, migrated_conn):
+        """Hands the shared local database to the tests that use it."""
+        self.conn = migrated_conn
+
+    def test_archive_plant_metrics(self):
+        """Tests every plant is archived with one statement and one commit, which
+        also bumps the archive's data version."""
+        mock_conn = MagicMock()
+        mock_cursor = mock_conn.cursor.return_value.__enter__.return_value
+        mock_cursor.rowcount = 49
+        mock_cursor.fetchall.return_value = []
+
+        archived = archive_plant_metrics(mock_conn)
+
+        self.assertEqual(archived, 49)
+        archive_call, totals_call, version_call = mock_cursor.execute.call_args_list
+        self.assertEqual(archive_call.args, (
+            ARCHIVE_QUERY.format(table="epsilon.plant_metric", condition=""), ()))
+        self.assertIn("FROM epsilon.plant_metric\n", totals_call.args[0])
+        self.assertIn("epsilon.etl_batch", version_call.args[0])
+        self.assertEqual(version_call.args[1], (49, "plants_archive"))
+        mock_conn.commit.assert_called_once()
+        self.assertIn("GROUP BY plant_id", ARCHIVE_QUERY)
+
+    def test_archive_plant_metrics_clears_in_same_transaction(self):
+        """Tests the archived table is emptied before the single commit."""
+        mock_conn = MagicMock()
+        mock_cursor = mock_conn.cursor.return_value.__enter__.return_value
 
-    @patch("archive.get_connection")
-    def test_get_all_plant_ids(self, mock_get_connection):
-        """Tests that connection gets all the plant ids successfully """
+        archive_plant_metrics(mock_conn, STAGING_TABLE, clear=True)
+
+        self.assertEqual(mock_cursor.execute.call_args_list[-1].args,
+                         (f"TRUNCATE TABLE {STAGING_TABLE};",))
+        mock_conn.commit.assert_called_once()
+
+    @patch("archive.get_backend")
+    def test_switch_out_skipped_when_staging_has_rows(self, mock_get_backend):
+        """Tests readings left in staging are never overwritten by a swap."""
         mock_conn = MagicMock()
-        mock_cursor = MagicMock()
-        mock_cursor.fetchall.return_value = [{"plant_id": 1}, {"plant_id": 2}]
-        mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
-        mock_get_connection.return_value = mock_conn
-
-        plant_ids = get_all_plant_ids(mock_conn)
-        self.assertEqual(plant_ids, [1, 2])
-        mock_cursor.execute.assert_called_once_with(
-            "SELECT plant_id FROM plant;")
-
-    @patch("archive.upload_plant_metric_data")
-    @patch("archive.get_latest_recording")
-    @patch("archive.calculate_archive_metrics")
-    def test_get_plants_data(self, mock_calculate_metrics, mock_get_latest_recording, mock_upload_data):
-        """ Tests that query retrieves all plant data successfully"""
+        mock_cursor = mock_conn.cursor.return_value.__enter__.return_value
+        mock_cursor.fetchone.return_value = {"plant_metric_id": 7}
+
+        self.assertFalse(switch_out_plant_metrics(mock_conn))
+        mock_get_backend.return_value.swap_statements.assert_not_called()
+
+    @patch("archive.process_readings")
+    @patch("archive.archive_plant_metrics")
+    @patch("archive.switch_out_plant_metrics")
+    def test_swap_and_archive_finishes_unfinished_run(self, mock_switch, mock_archive,
+                                                       mock_process):
+        """Tests leftover staged readings are archived before the next swap."""
         mock_conn = MagicMock()
-        plant_ids = [1, 2]
-
-        mock_calculate_metrics.side_effect = [
-            [{"avg_moisture": 0.5, "watered_count": 2, "avg_temp": 25}],
-            [{"avg_moisture": 0.6, "watered_count": 3, "avg_temp": 22}]
-        ]
-
-        mock_get_latest_recording.side_effect = [
-            {"recording_taken": "2024-11-27 10:00:00"},
-            {"recording_taken": "2024-11-27 11:00:00"}
-        ]
-
-        get_plants_data(mock_conn, plant_ids)
-
-        mock_upload_data.assert_has_calls([
-            call(mock_conn, {
-                "avg_moisture": 0.5,
-                "watered_count": 2,
-                "avg_temp": 25,
-                "last_recorded": "2024-11-27 10:00:00",
-                "plant_id": 1
-            }),
-            call(mock_conn, {
-                "avg_moisture": 0.6,
-                "watered_count": 3,
-                "avg_temp": 22,
-                "last_recorded": "2024-11-27 11:00:00",
-                "plant_id": 2
-            })
-        ])
-
-    @patch("archive.get_connection")
-    def test_clear_plant_metrics(self, mock_get_connection):
-        """" Tests that truncate is called on plant metric table  """
+        mock_switch.side_effect = [False, True]
+
+        swap_and_archive(mock_conn)
+
+        self.assertEqual(mock_switch.call_count, 2)
+        self.assertEqual(mock_archive.call_count, 2)
+        mock_archive.assert_called_with(mock_conn, STAGING_TABLE, clear=True,
+                                        readings=mock_process.return_value)
+
+    @patch("archive.process_readings")
+    @patch("archive.archive_plant_metrics")
+    def test_staged_metrics_processed_before_archive(self, mock_archive, mock_process):
+        """Tests staged readings are exported and rolled up before the staging
+        table is emptied."""
         mock_conn = MagicMock()
-        mock_cursor = MagicMock()
-        mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
-        clear_plant_metrics(mock_conn)
+        mock_store = MagicMock()
+        calls = MagicMock()
+        calls.attach_mock(mock_process, "process")
+        calls.attach_mock(mock_archive, "archive")
+
+        archive_staged_metrics(mock_conn, mock_store)
+
+        self.assertEqual([name for name, _, _ in calls.mock_calls], ["process", "archive"])
+        mock_process.assert_called_once_with(mock_conn, STAGING_TABLE, mock_store)
+        mock_archive.assert_called_once_with(mock_conn, STAGING_TABLE, clear=True,
+                                             readings=mock_process.return_value)
+
+    def test_process_readings_reads_once(self):
+        """Tests one read of the table feeds both the export and the rollups."""
+        mock_conn = MagicMock()
+        mock_cursor = mock_conn.cursor.return_value.__enter__.return_value
+        mock_cursor.fetchall.return_value = [{
+            "plant_metric_id": 1, "plant_id": 1, "botanist_id": 1,
+            "recording_taken": "2024-11-27 10:00:00", "last_watered": "2024-11-27 08:00:00",
+            "temperature": 20.0, "soil_moisture": 30.0}]
+        mock_store = MagicMock()
+
+        readings = process_readings(mock_conn, STAGING_TABLE, mock_store)
+
+        mock_cursor.execute.assert_called_once()
+        self.assertIn(f"FROM {STAGING_TABLE}", mock_cursor.execute.call_args.args[0])
+        self.assertIs(mock_store.write.call_args.args[0], readings)
+        self.assertEqual(len(readings), 1)
+        mock_conn.commit.assert_not_called()
+
+    def test_archive_plant_metrics_rolls_back(self):
+        """Tests a failed archive is rolled back and re-raised."""
+        mock_conn = MagicMock()
+        mock_cursor = mock_conn.cursor.return_value.__enter__.return_value
+        mock_cursor.execute.side_effect = Exception("Deadlock")
+
+        with self.assertRaises(Exception):
+            archive_plant_metrics(mock_conn)
+        mock_conn.rollback.assert_called_once()
+        mock_conn.commit.assert_not_called()
+
+    @patch("archive.purge_archived_metrics")
+    @patch("archive.archive_plant_metrics")
+    @patch("archive.process_readings")
+    @patch("archive.get_last_metric_id")
+    def test_archive_batch_purges_only_archived(self, mock_last_id, mock_process,
+                                                mock_archive, mock_purge):
+        """Tests the batch is capped at the last id seen before archiving, and
+        only readings up to it are purged."""
+        mock_conn = MagicMock()
+        mock_last_id.return_value = 4200
+
+        archive_batch(mock_conn, None, chunk_rows=100, pause_seconds=0.5)
 
-        expected_query = "TRUNCATE TABLE epsilon.plant_metric;"
+        mock_process.assert_called_once_with(mock_conn, "epsilon.plant_metric", None, 4200)
+        mock_archive.assert_called_once_with(mock_conn, up_to_id=4200,
+                                             readings=mock_process.return_value)
+        mock_purge.assert_called_once_with(mock_conn, 4200, 100, 0.5)
 
-        mock_cursor.execute.assert_called_once_with(expected_query)
+    @patch("archive.purge_archived_metrics")
+    @patch("archive.get_last_metric_id")
+    def test_archive_batch_empty_table(self, mock_last_id, mock_purge):
+        """Tests nothing is archived or purged when there are no readings."""
+        mock_last_id.return_value = None
 
-    @patch("archive.get_connection")
-    @patch("archive.get_all_plant_ids")
-    @patch("archive.get_plants_data")
-    @patch("archive.clear_plant_metrics")
-    def test_lambda_handler_success(self, mock_clear, mock_get_data, mock_get_ids, mock_get_conn):
+        archive_batch(MagicMock())
+
+        mock_purge.assert_not_called()
+
+    @patch.dict(os.environ, {"PURGE_CHUNK_ROWS": "250", "PURGE_PAUSE_SECONDS": "0.2"})
+    @patch("archive.pooled_connection")
+    @patch("archive.archive_batch")
+    def test_lambda_handler_success(self, mock_batch, mock_get_conn):
         """ Tests lambda handler successfully archives. """
-        mock_get_conn.return_value = MagicMock()
-        mock_get_ids.return_value = [1, 2]
+        
+        response = lambda_handler(None, None)
+        self.assertEqual(response["statuscode"], 200)
+        mock_batch.assert_called_once_with(mock_get_conn.return_value.__enter__.return_value, None, 250, 0.2)
 
+    @patch.dict(os.environ, {"ARCHIVE_MODE": "swap"})
+    @patch("archive.pooled_connection")
+    @patch("archive.swap_and_archive")
+    @patch("archive.archive_batch")
+    def test_lambda_handler_swap_mode(self, mock_batch, mock_swap, mock_get_conn):
+        """Tests swap mode archives from staging and never truncates the live table."""
         response = lambda_handler(None, None)
+
         self.assertEqual(response["statuscode"], 200)
-        mock_get_ids.assert_called_once()
-        mock_get_data.assert_called_once()
-        mock_clear.assert_called_once()
+        mock_swap.assert_called_once_with(mock_get_conn.return_value.__enter__.return_value, None)
+        mock_batch.assert_not_called()
+
+    @patch.dict(os.environ, {"ARCHIVE_MODE": "incremental", "PURGE_CHUNK_ROWS": "200",
+                             "PURGE_PAUSE_SECONDS": "0"})
+    @patch("archive.pooled_connection")
+    @patch("archive.archive_incrementally")
+    @patch("archive.archive_plant_metrics")
+    def test_lambda_handler_incremental_mode(self, mock_archive, mock_incremental,
+                                             mock_get_conn):
+        """Tests incremental mode only archives past the watermark."""
+        response = lambda_handler(None, None)
 
-    @patch("archive.get_connection")
+        self.assertEqual(response["statuscode"], 200)
+        mock_incremental.assert_called_once_with(mock_get_conn.return_value.__enter__.return_value, None, 200, 0.0)
+        mock_archive.assert_not_called()
+
+    @patch.dict(os.environ, {"ARCHIVE_MODE": "copy"})
+    @patch("archive.pooled_connection")
+    def test_lambda_handler_unknown_mode(self, mock_get_conn):
+        """Tests an unknown archive mode fails the run."""
+        response = lambda_handler(None, None)
+        self.assertEqual(response["statusCode"], 500)
+
+    @patch("archive.pooled_connection")
     def test_lambda_handler_failure(self, mock_get_conn):
         """ tests that lambda handler raises error if status code 500. """
         mock_get_conn.side_effect = Exception("Connection Error")
@@ -165,61 +208,117 @@ class TestArchive(unittest.TestCase):
         self.assertEqual(response["statusCode"], 500)
         self.assertIn("An unexpected error occurred", response["body"])
 
-    @patch("archive.get_connection")
-    def test_upload_plant_metric_data_valid(self, mock_get_conn):
-        """Test successful execution with valid plant details."""
-        mock_get_conn.return_value = MagicMock()
-        mock_cursor = mock_get_conn.cursor.return_value.__enter__.return_value
-
-        plant_details = {
-            "avg_temp": 25.3,
-            "avg_moisture": 70.5,
-            "watered_count": 3,
-            "last_recorded": "2024-11-27 15:00:00",
-            "plant_id": 101
-        }
-
-        upload_plant_metric_data(mock_get_conn, plant_details)
-
-        mock_cursor.execute.assert_called_once_with(
-            """INSERT INTO epsilon.plants_archive (avg_temperature, 
-                    avg_soil_moisture, watered_count, last_recorded, plant_id)
-                VALUES (%s, %s, %s, %s, %s);""", (25.3, 70.5, 3, "2024-11-27 15:00:00", 101))
-
-    @ patch("archive.get_connection")
-    def test_calculate_archive_metrics(self, mock_get_connection):
-        """ tests calculate archive runs correct query """
-        mock_conn = MagicMock()
-        mock_cursor = MagicMock()
-        mock_cursor.fetchall.return_value = [
-            {"avg_moisture": 1}, {"watered_count": 2}, {"avg_temp": 2}]
-        mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
-        mock_get_connection.return_value = mock_conn
-
-        expected_query = """SELECT
-                    AVG(soil_moisture) as avg_moisture,
-                    COUNT(DISTINCT(last_watered)) as watered_count,
-                    AVG(temperature) as avg_temp
-                FROM plant_metric
-                WHERE plant_id = %s"""
-
-        calculate_archive_metrics(mock_conn, 1)
-        mock_cursor.execute.assert_called_once_with(expected_query, (1,))
-
-    @ patch("archive.get_connection")
-    def test_get_latest_recording(self, mock_get_connection):
-        """ tests calculate latest recording runs correct query """
-        mock_conn = MagicMock()
-        mock_cursor = MagicMock()
-        mock_cursor.fetchall.return_value = [
-            {"recording_taken": "1"}]
-        mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
-        mock_get_connection.return_value = mock_conn
-
-        expected_query = """SELECT TOP 1 recording_taken
-                FROM plant_metric
-                WHERE plant_id = %s
-                ORDER BY recording_taken DESC;"""
-
-        get_latest_recording(mock_conn, 1)
-        mock_cursor.execute.assert_called_once_with(expected_query, (1,))
+    @pytest.mark.usefixtures("local_db")
+    @patch.dict(os.environ, {"DB_BACKEND": "sqlite"})
+    def test_archive_query_aggregates_per_plant(self):
+        """Tests the archive query on a local database matches the per-plant figures,
+        counting only the waterings detected by the archived readings, and adds
+        the readings to the archive summary."""
+        rows = [(20.0, 30.0, "2024-11-27 10:00:00", "2024-11-27 08:00:00", 1, 1),
+                (22.0, 34.0, "2024-11-27 10:01:00", "2024-11-27 09:00:00", 1, 1),
+                (18.0, 50.0, "2024-11-27 10:00:00", "2024-11-27 07:00:00", 1, 2)]
+        events = [(1, "2024-11-27 06:00:00", "2024-11-27 06:30:00"),
+                  (1, "2024-11-27 08:00:00", "2024-11-27 10:00:00"),
+                  (1, "2024-11-27 09:00:00", "2024-11-27 10:01:00"),
+                  (2, "2024-11-27 07:00:00", "2024-11-27 10:00:00")]
+        with self.conn.cursor() as cur:
+            cur.executemany("""INSERT INTO epsilon.plant_metric (temperature,
+                soil_moisture, recording_taken, last_watered, botanist_id, plant_id)
+                VALUES (%s, %s, %s, %s, %s, %s)""", rows)
+            cur.executemany("""INSERT INTO epsilon.watering_event (plant_id,
+                watered_at, detected_at) VALUES (%s, %s, %s)""", events)
+        self.conn.commit()
+
+        self.assertEqual(archive_plant_metrics(self.conn), 2)
+        with self.conn.cursor() as cur:
+            cur.execute("""SELECT plant_id, avg_temperature, avg_soil_moisture,
+                           watered_count, last_recorded
+                           FROM epsilon.plants_archive ORDER BY plant_id;""")
+            archived = cur.fetchall()
+            cur.execute("""SELECT plant_id, reading_count, temperature_sum,
+                           temperature_min, temperature_max
+                           FROM epsilon.plant_archive_summary ORDER BY plant_id;""")
+            summary = cur.fetchall()
+
+        self.assertEqual(archived, [
+            {"plant_id": 1, "avg_temperature": 21.0, "avg_soil_moisture": 32.0,
+             "watered_count": 2, "last_recorded": "2024-11-27 10:01:00"},
+            {"plant_id": 2, "avg_temperature": 18.0, "avg_soil_moisture": 50.0,
+             "watered_count": 1, "last_recorded": "2024-11-27 10:00:00"}])
+        self.assertEqual(summary, [
+            {"plant_id": 1, "reading_count": 2, "temperature_sum": 42.0,
+             "temperature_min": 20.0, "temperature_max": 22.0},
+            {"plant_id": 2, "reading_count": 1, "temperature_sum": 18.0,
+             "temperature_min": 18.0, "temperature_max": 18.0}])
+
+    @pytest.mark.usefixtures("local_db")
+    @patch.dict(os.environ, {"DB_BACKEND": "sqlite"})
+    def test_swap_and_archive_on_local_database(self):
+        """Tests readings inserted after the swap stay live while the swapped
+        readings are archived."""
+        row = "(20.0, 30.0, %s, '2024-11-27 08:00:00', 1, 1)"
+        insert = f"""INSERT INTO epsilon.plant_metric (temperature, soil_moisture,
+                     recording_taken, last_watered, botanist_id, plant_id) VALUES {row}"""
+        with self.conn.cursor() as cur:
+            cur.execute(insert, ("2024-11-27 10:00:00",))
+        self.conn.commit()
+
+        self.assertTrue(switch_out_plant_metrics(self.conn))
+        with self.conn.cursor() as cur:
+            cur.execute(insert, ("2024-11-27 10:01:00",))
+        self.conn.commit()
+        archive_plant_metrics(self.conn, STAGING_TABLE, clear=True)
+
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT recording_taken FROM epsilon.plant_metric;")
+            live = cur.fetchall()
+            cur.execute(f"SELECT COUNT(*) AS staged FROM {STAGING_TABLE};")
+            staged = cur.fetchone()["staged"]
+            cur.execute("SELECT last_recorded FROM epsilon.plants_archive;")
+            archived = cur.fetchall()
+
+        self.assertEqual(live, [{"recording_taken": "2024-11-27 10:01:00"}])
+        self.assertEqual(staged, 0)
+        self.assertEqual(archived, [{"last_recorded": "2024-11-27 10:00:00"}])
+
+    @pytest.mark.usefixtures("local_db")
+    @patch.dict(os.environ, {"DB_BACKEND": "sqlite"})
+    def test_batch_runs_merge_shared_hour(self):
+        """Tests a reading archived by a later batch run adds to the hour and
+        day already rolled up, and a failed run leaves the rollups untouched."""
+        insert = """INSERT INTO epsilon.plant_metric (temperature, soil_moisture,
+                    recording_taken, last_watered, botanist_id, plant_id)
+                    VALUES (%s, 30.0, %s, '2024-11-27 08:00:00', 1, 1)"""
+
+        def rollup_counts(conn):
+            with conn.cursor() as cur:
+                cur.execute("SELECT reading_count FROM epsilon.plant_metric_hourly;")
+                hourly = [row["reading_count"] for row in cur.fetchall()]
+                cur.execute("SELECT reading_count FROM epsilon.plant_metric_daily;")
+                daily = [row["reading_count"] for row in cur.fetchall()]
+            return hourly, daily
+
+        with self.conn.cursor() as cur:
+            cur.executemany(insert, [(20.0, "2024-11-27 23:10:00"),
+                                     (22.0, "2024-11-27 23:20:00")])
+        self.conn.commit()
+        archive_batch(self.conn, pause_seconds=0)
+
+        with self.conn.cursor() as cur:
+            cur.execute(insert, (24.0, "2024-11-27 23:59:00"))
+        self.conn.commit()
+        with patch("archive.bump_data_version", side_effect=Exception("Deadlock")), \
+                self.assertRaises(Exception):
+            archive_batch(self.conn, pause_seconds=0)
+        self.assertEqual(rollup_counts(self.conn), ([2], [2]))
+
+        archive_batch(self.conn, pause_seconds=0)
+        hourly, daily = rollup_counts(self.conn)
+        with self.conn.cursor() as cur:
+            cur.execute("""SELECT temperature_mean FROM epsilon.plant_metric_hourly;""")
+            mean = cur.fetchone()["temperature_mean"]
+            cur.execute("""SELECT reading_count FROM epsilon.plant_archive_summary;""")
+            summary = cur.fetchone()["reading_count"]
+
+        self.assertEqual((hourly, daily, summary), ([3], [3], 3))
+        self.assertAlmostEqual(mean, 22.0)
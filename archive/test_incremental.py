@@ -0,0 +1,137 @@
+"""Test file for the incremental archive"""
+# pylint: skip-file
+
+from unittest.mock import MagicMock
+
+import pandas as pd
+import pytest
+
+from incremental import archive_incrementally, summarise_by_day, lock_watermark
+
+INSERT = """INSERT INTO epsilon.plant_metric (temperature, soil_moisture,
+            recording_taken, last_watered, botanist_id, plant_id)
+            VALUES (%s, %s, %s, %s, 1, %s)"""
+INSERT_EVENT = """INSERT INTO epsilon.watering_event (plant_id, watered_at, detected_at)
+                  VALUES (%s, %s, %s)"""
+
+
+@pytest.fixture
+def conn(migrated_conn, monkeypatch):
+    monkeypatch.setenv("DB_BACKEND", "sqlite")
+    return migrated_conn
+
+
+def insert(conn, rows: list[tuple], events: list[tuple] = ()) -> None:
+    with conn.cursor() as cur:
+        cur.executemany(INSERT, rows)
+        if events:
+            cur.executemany(INSERT_EVENT, events)
+    conn.commit()
+
+
+def query(conn, statement: str) -> list[dict]:
+    with conn.cursor() as cur:
+        cur.execute(statement)
+        return cur.fetchall()
+
+
+class TestIncrementalArchive:
+    """Test class for watermark-based archiving on a local database."""
+
+    def test_first_run_archives_and_purges(self, conn):
+        """Tests new readings are archived, the watermark advances and the
+        archived readings are purged."""
+        insert(conn, [(20.0, 30.0, "2024-11-27 10:00:00", "2024-11-27 08:00:00", 1),
+                      (22.0, 34.0, "2024-11-27 10:01:00", "2024-11-27 08:00:00", 1),
+                      (18.0, 50.0, "2024-11-27 10:00:00", "2024-11-27 07:00:00", 2)],
+               [(1, "2024-11-27 08:00:00", "2024-11-27 10:00:00"),
+                (2, "2024-11-27 07:00:00", "2024-11-27 10:00:00")])
+
+        assert archive_incrementally(conn, chunk_rows=2, pause_seconds=0) == 3
+
+        assert query(conn, """SELECT plant_id, archive_date, avg_temperature,
+                              watered_count, reading_count
+                              FROM epsilon.plants_archive ORDER BY plant_id;""") == [
+            {"plant_id": 1, "archive_date": "2024-11-27", "avg_temperature": 21.0,
+             "watered_count": 1, "reading_count": 2},
+            {"plant_id": 2, "archive_date": "2024-11-27", "avg_temperature": 18.0,
+             "watered_count": 1, "reading_count": 1}]
+        assert query(conn, "SELECT plant_metric_id FROM epsilon.archive_watermark;") == \
+            [{"plant_metric_id": 3}]
+        assert query(conn, """SELECT batch_version, row_count FROM epsilon.etl_batch
+                              WHERE name = 'plants_archive';""") == \
+            [{"batch_version": 1, "row_count": 2}]
+        assert query(conn, "SELECT COUNT(*) AS live FROM epsilon.plant_metric;") == \
+            [{"live": 0}]
+
+    def test_later_runs_merge_into_the_day(self, conn):
+        """Tests later readings update the day's row instead of adding one."""
+        insert(conn, [(20.0, 30.0, "2024-11-27 10:00:00", "2024-11-27 08:00:00", 1)],
+               [(1, "2024-11-27 08:00:00", "2024-11-27 10:00:00")])
+        archive_incrementally(conn)
+        insert(conn, [(22.0, 30.0, "2024-11-27 10:01:00", "2024-11-27 08:00:00", 1),
+                      (24.0, 30.0, "2024-11-27 14:00:00", "2024-11-27 13:00:00", 1)],
+               [(1, "2024-11-27 13:00:00", "2024-11-27 14:00:00")])
+
+        assert archive_incrementally(conn) == 2
+
+        assert query(conn, """SELECT avg_temperature, watered_count, reading_count,
+                              last_recorded, last_watered
+                              FROM epsilon.plants_archive;""") == [
+            {"avg_temperature": 22.0, "watered_count": 2, "reading_count": 3,
+             "last_recorded": "2024-11-27 14:00:00", "last_watered": "2024-11-27 13:00:00"}]
+        assert query(conn, """SELECT reading_count, temperature_mean
+                              FROM epsilon.plant_metric_daily;""") == \
+            [{"reading_count": 3, "temperature_mean": 22.0}]
+        assert query(conn, """SELECT reading_count, temperature_sum, temperature_max
+                              FROM epsilon.plant_archive_summary;""") == \
+            [{"reading_count": 3, "temperature_sum": 66.0, "temperature_max": 24.0}]
+
+    def test_readings_across_midnight(self, conn):
+        """Tests readings either side of midnight go to their own days."""
+        insert(conn, [(20.0, 30.0, "2024-11-27 23:59:00", "2024-11-27 08:00:00", 1),
+                      (21.0, 30.0, "2024-11-28 00:00:00", "2024-11-27 08:00:00", 1)])
+
+        archive_incrementally(conn)
+
+        assert query(conn, """SELECT archive_date FROM epsilon.plants_archive
+                              ORDER BY archive_date;""") == \
+            [{"archive_date": "2024-11-27"}, {"archive_date": "2024-11-28"}]
+
+    def test_nothing_new(self, conn):
+        """Tests a run with no new readings archives nothing and keeps the version."""
+        assert archive_incrementally(conn) == 0
+        assert query(conn, """SELECT batch_version FROM epsilon.etl_batch
+                              WHERE name = 'plants_archive';""") == [{"batch_version": 0}]
+        assert query(conn, "SELECT COUNT(*) AS rows FROM epsilon.plants_archive;") == \
+            [{"rows": 0}]
+
+
+class TestIncrementalHelpers:
+    """Test class for the incremental archive helpers."""
+
+    def test_summarise_by_day(self):
+        """Tests partial figures are grouped per plant and day."""
+        readings = pd.DataFrame({
+            "plant_id": [1, 1, 1],
+            "recording_taken": pd.to_datetime(["2024-11-27 10:00", "2024-11-27 11:00",
+                                               "2024-11-27 12:00"]),
+            "last_watered": pd.to_datetime(["2024-11-27 08:00", "2024-11-27 08:00",
+                                            "2024-11-27 11:30"]),
+            "temperature": [1.0, 2.0, 3.0],
+            "soil_moisture": [4.0, 5.0, 6.0]})
+
+        day = summarise_by_day(readings).iloc[0]
+
+        assert day["reading_count"] == 3
+        assert day["temperature_sum"] == 6.0
+        assert day["first_recorded"] == pd.Timestamp("2024-11-27 10:00")
+        assert day["last_recorded"] == pd.Timestamp("2024-11-27 12:00")
+
+    def test_missing_watermark(self):
+        """Tests a database without the watermark migration is reported."""
+        mock_cursor = MagicMock()
+        mock_cursor.fetchone.return_value = None
+
+        with pytest.raises(RuntimeError):
+            lock_watermark(mock_cursor)
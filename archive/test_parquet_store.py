@@ -0,0 +1,108 @@
+"""Test file for the Parquet archive store"""
+# pylint: skip-file
+
+import os
+from datetime import datetime
+from unittest.mock import patch
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from parquet_store import ParquetStore, READING_COLUMNS
+
+
+def make_readings(days: list[str], plants: int = 3, minutes: int = 4) -> pd.DataFrame:
+    rows = []
+    for day in days:
+        for plant_id in range(1, plants + 1):
+            for minute in range(minutes):
+                rows.append({
+                    "plant_metric_id": len(rows) + 1,
+                    "plant_id": plant_id,
+                    "botanist_id": 1,
+                    "recording_taken": f"{day} 10:0{minute}:00",
+                    "last_watered": f"{day} 08:00:00",
+                    "temperature": 20.0 + minute,
+                    "soil_moisture": 30.0 + plant_id
+                })
+    return pd.DataFrame(rows)
+
+
+class TestParquetStore:
+    """Test class for writing and reading day-partitioned Parquet files."""
+
+    @pytest.fixture
+    def store(self, tmp_path):
+        return ParquetStore(str(tmp_path / "archive"), rows_per_group=4)
+
+    def test_write_partitions_by_day(self, store, tmp_path):
+        """Tests each day of readings lands in its own partition directory."""
+        written = store.write(make_readings(["2024-11-26", "2024-11-27"]))
+
+        assert sorted(os.listdir(tmp_path / "archive")) == \
+            ["dt=2024-11-26", "dt=2024-11-27"]
+        assert len(written) == 2
+
+    def test_files_are_compressed_with_statistics(self, store):
+        """Tests row groups are zstd compressed and carry min/max statistics."""
+        written = store.write(make_readings(["2024-11-27"]))
+        metadata = pq.ParquetFile(written[0]).metadata
+
+        assert metadata.num_row_groups == 3
+        column = metadata.row_group(0).column(READING_COLUMNS.index("plant_id"))
+        assert column.compression == "ZSTD"
+        assert column.statistics.min == 1
+        assert column.statistics.max == 1
+
+    def test_read_round_trip(self, store):
+        """Tests readings read back with their types."""
+        store.write(make_readings(["2024-11-27"]))
+
+        readings = store.read()
+
+        assert len(readings) == 12
+        assert list(readings.columns) == READING_COLUMNS
+        assert readings["recording_taken"].iloc[0] == pd.Timestamp("2024-11-27 10:00:00")
+
+    def test_read_filters_columns_plants_and_time(self, store):
+        """Tests reads return only the requested columns, plants and times."""
+        store.write(make_readings(["2024-11-26", "2024-11-27", "2024-11-28"]))
+
+        readings = store.read(columns=["plant_id", "temperature"], plant_ids=[2],
+                              start=datetime(2024, 11, 27),
+                              end=datetime(2024, 11, 27, 10, 2))
+
+        assert list(readings.columns) == ["plant_id", "temperature"]
+        assert readings["plant_id"].tolist() == [2, 2]
+        assert readings["temperature"].tolist() == [20.0, 21.0]
+
+    def test_rewrite_replaces_files(self, store):
+        """Tests exporting the same readings twice does not duplicate them."""
+        readings = make_readings(["2024-11-27"])
+        store.write(readings)
+        store.write(readings)
+
+        assert len(store.read()) == 12
+
+    def test_retry_with_more_readings_replaces_files(self, store):
+        """Tests a retried run that has seen more readings, on more days,
+        leaves each reading in the store once."""
+        readings = make_readings(["2024-11-27", "2024-11-26"])
+        store.write(readings[readings["plant_metric_id"] <= 12])
+        store.write(readings)
+
+        stored = store.read()
+        assert len(stored) == 24
+        assert stored["plant_metric_id"].is_unique
+
+    def test_read_empty_store(self, store):
+        """Tests reading before anything is exported returns no rows."""
+        assert store.read().empty
+
+    def test_from_environ(self):
+        """Tests the store is only created when PARQUET_ARCHIVE_PATH is set."""
+        with patch.dict(os.environ, {}, clear=True):
+            assert ParquetStore.from_environ() is None
+        with patch.dict(os.environ, {"PARQUET_ARCHIVE_PATH": "archive"}):
+            assert ParquetStore.from_environ().root == "archive"
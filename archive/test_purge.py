@@ -0,0 +1,81 @@
+"""Test file for purging archived readings"""
+# pylint: skip-file
+
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from purge import purge_archived_metrics, get_last_metric_id
+
+
+@pytest.fixture
+def conn(sqlite_conn):
+    with sqlite_conn.cursor() as cur:
+        cur.executemany("""INSERT INTO epsilon.plant_metric (temperature, soil_moisture,
+            recording_taken, last_watered, botanist_id, plant_id)
+            VALUES (20.0, 30.0, %s, '2024-11-27 08:00:00', 1, 1)""",
+                        [(f"2024-11-27 10:{minute:02}:00",) for minute in range(10)])
+    sqlite_conn.commit()
+    return sqlite_conn
+
+
+def remaining_ids(conn) -> list[int]:
+    with conn.cursor() as cur:
+        cur.execute("SELECT plant_metric_id FROM epsilon.plant_metric ORDER BY plant_metric_id;")
+        return [row["plant_metric_id"] for row in cur.fetchall()]
+
+
+class TestPurge:
+    """Test class for the chunked purge."""
+
+    @patch("purge.time.sleep")
+    def test_purges_in_chunks_with_pauses(self, mock_sleep, conn):
+        """Tests readings are deleted chunk by chunk, pausing in between."""
+        deleted = purge_archived_metrics(conn, up_to_id=7, chunk_rows=3, pause_seconds=0.5)
+
+        assert deleted == 7
+        assert [call.args[0] for call in mock_sleep.call_args_list] == [0.5, 0.5]
+        assert remaining_ids(conn) == [8, 9, 10]
+
+    @patch("purge.time.sleep")
+    def test_no_pause_for_a_single_chunk(self, mock_sleep, conn):
+        """Tests a purge that fits in one chunk never pauses."""
+        purge_archived_metrics(conn, up_to_id=10, chunk_rows=500)
+
+        mock_sleep.assert_not_called()
+        assert remaining_ids(conn) == []
+
+    def test_each_chunk_is_committed(self):
+        """Tests every chunk runs in its own transaction."""
+        mock_conn = MagicMock()
+        mock_cursor = mock_conn.cursor.return_value.__enter__.return_value
+        mock_cursor.fetchone.return_value = {"first_id": 1}
+        mock_cursor.rowcount = 2
+
+        purge_archived_metrics(mock_conn, up_to_id=6, chunk_rows=2, pause_seconds=0)
+
+        assert mock_cursor.execute.call_count == 4
+        assert mock_cursor.execute.call_args.args[1] == (4, 6)
+        assert mock_conn.commit.call_count == 4
+
+    def test_failed_chunk_rolls_back(self):
+        """Tests a failing chunk is rolled back and stops the purge."""
+        mock_conn = MagicMock()
+        mock_cursor = mock_conn.cursor.return_value.__enter__.return_value
+        mock_cursor.fetchone.return_value = {"first_id": 1}
+        mock_cursor.execute.side_effect = [None, Exception("Lock timeout")]
+
+        with pytest.raises(Exception):
+            purge_archived_metrics(mock_conn, up_to_id=6, chunk_rows=2, pause_seconds=0)
+        mock_conn.rollback.assert_called_once()
+
+    def test_empty_table(self, conn):
+        """Tests purging an empty table deletes nothing."""
+        purge_archived_metrics(conn, up_to_id=10, pause_seconds=0)
+
+        assert get_last_metric_id(conn) is None
+        assert purge_archived_metrics(conn, up_to_id=10, pause_seconds=0) == 0
+
+    def test_get_last_metric_id(self, conn):
+        """Tests the newest id is found."""
+        assert get_last_metric_id(conn) == 10
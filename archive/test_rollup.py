@@ -0,0 +1,118 @@
+"""Test file for the hourly and daily rollups"""
+# pylint: skip-file
+
+import os
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+from rollup import compute_rollups, merge_rollups, rollup_readings, ROLLUP_COLUMNS
+
+
+@pytest.fixture
+def readings():
+    return pd.DataFrame({
+        "plant_id": [1, 1, 1, 2],
+        "recording_taken": ["2024-11-27 10:00:00", "2024-11-27 10:30:00",
+                            "2024-11-27 11:00:00", "2024-11-27 10:15:00"],
+        "temperature": [10.0, 20.0, 30.0, 15.0],
+        "soil_moisture": [40.0, 50.0, 60.0, 70.0]
+    })
+
+
+class TestComputeRollups:
+    """Test class for aggregating readings into buckets."""
+
+    def test_hourly_buckets(self, readings):
+        """Tests readings are grouped per plant and hour with every statistic."""
+        hourly = compute_rollups(readings, "h")
+
+        assert list(hourly.columns) == ROLLUP_COLUMNS
+        assert len(hourly) == 3
+        first = hourly.iloc[0]
+        assert first["bucket_start"] == pd.Timestamp("2024-11-27 10:00:00")
+        assert first["reading_count"] == 2
+        assert first["temperature_min"] == 10.0
+        assert first["temperature_max"] == 20.0
+        assert first["temperature_mean"] == 15.0
+        assert first["temperature_stddev"] == 5.0
+        assert first["temperature_p50"] == 15.0
+        assert first["temperature_p95"] == pytest.approx(19.5)
+
+    def test_daily_buckets(self, readings):
+        """Tests a day of readings collapses to one bucket per plant."""
+        daily = compute_rollups(readings, "D")
+
+        assert daily["plant_id"].tolist() == [1, 2]
+        assert daily["reading_count"].tolist() == [3, 1]
+        assert daily["soil_moisture_mean"].tolist() == [50.0, 70.0]
+        assert daily["soil_moisture_stddev"].tolist()[1] == 0.0
+
+    def test_no_readings(self):
+        """Tests an empty day produces no buckets."""
+        assert compute_rollups(pd.DataFrame(), "h").empty
+
+
+class TestMergeRollups:
+    """Test class for combining partial buckets."""
+
+    def test_merged_halves_match_whole(self, readings):
+        """Tests merging two partial days gives the exact whole-day statistics."""
+        whole = compute_rollups(readings, "D")
+        first = compute_rollups(readings.iloc[[0, 3]], "D")
+        second = compute_rollups(readings.iloc[[1, 2]], "D")
+
+        merged = merge_rollups(first, second)
+
+        assert list(merged.columns) == ROLLUP_COLUMNS
+        plant = merged[merged["plant_id"] == 1].iloc[0]
+        assert plant["reading_count"] == 3
+        expected = whole[whole["plant_id"] == 1].iloc[0]
+        for column in ["temperature_min", "temperature_max", "temperature_mean",
+                       "temperature_stddev", "soil_moisture_stddev"]:
+            assert plant[column] == pytest.approx(expected[column])
+
+    def test_new_bucket_unchanged(self, readings):
+        """Tests buckets with nothing stored are written as computed."""
+        rollups = compute_rollups(readings, "h")
+
+        merged = merge_rollups(pd.DataFrame(columns=ROLLUP_COLUMNS), rollups)
+
+        pd.testing.assert_frame_equal(merged, rollups, check_dtype=False)
+
+
+class TestRollupReadings:
+    """Test class for writing the rollup tiers."""
+
+    @patch.dict(os.environ, {"DB_BACKEND": "sqlite"})
+    def test_tiers_written(self, readings, migrated_conn):
+        """Tests both tiers are written, one bucket per plant and period."""
+        assert rollup_readings(migrated_conn, readings) == {"hourly": 3, "daily": 2}
+        migrated_conn.commit()
+
+        with migrated_conn.cursor() as cur:
+            cur.execute("""SELECT plant_id, bucket_start, reading_count
+                           FROM epsilon.plant_metric_daily ORDER BY plant_id;""")
+            daily = cur.fetchall()
+            cur.execute("SELECT COUNT(*) AS buckets FROM epsilon.plant_metric_hourly;")
+            hourly = cur.fetchone()
+
+        assert daily == [
+            {"plant_id": 1, "bucket_start": "2024-11-27 00:00:00", "reading_count": 3},
+            {"plant_id": 2, "bucket_start": "2024-11-27 00:00:00", "reading_count": 1}]
+        assert hourly == {"buckets": 3}
+
+    @patch.dict(os.environ, {"DB_BACKEND": "sqlite"})
+    def test_merge_adds_to_stored_buckets(self, readings, migrated_conn):
+        """Tests later runs accumulate into the stored buckets."""
+        rollup_readings(migrated_conn, readings.iloc[:2])
+        rollup_readings(migrated_conn, readings.iloc[2:])
+        migrated_conn.commit()
+
+        with migrated_conn.cursor() as cur:
+            cur.execute("""SELECT reading_count, temperature_mean
+                           FROM epsilon.plant_metric_daily WHERE plant_id = 1;""")
+            daily = cur.fetchone()
+
+        assert daily == {"reading_count": 3, "temperature_mean": 20.0}
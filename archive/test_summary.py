@@ -0,0 +1,125 @@
+"""Test file for the running archive summary"""
+# pylint: skip-file
+
+import os
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+from plantdb import migrate
+from summary import (summarise_readings, merge_summary, read_table_totals,
+                     update_archive_summary, SUMMARY_COLUMNS)
+
+
+@pytest.fixture
+def readings():
+    return pd.DataFrame({
+        "plant_id": [1, 1, 1, 2],
+        "recording_taken": pd.to_datetime(["2024-11-27 10:00:00", "2024-11-27 10:30:00",
+                                           "2024-11-27 11:00:00", "2024-11-27 10:15:00"]),
+        "temperature": [10.0, 20.0, 30.0, 15.0],
+        "soil_moisture": [40.0, 50.0, 60.0, 70.0]
+    })
+
+
+def read_summary(conn) -> list[dict]:
+    with conn.cursor() as cur:
+        cur.execute("""SELECT plant_id, reading_count, temperature_sum, temperature_min,
+                           temperature_max, last_recorded
+                       FROM epsilon.plant_archive_summary ORDER BY plant_id;""")
+        return cur.fetchall()
+
+
+class TestMergeSummary:
+    """Test class for combining running totals."""
+
+    def test_summarise_readings(self, readings):
+        """Tests each plant's readings collapse to one row of totals."""
+        totals = summarise_readings(readings)
+
+        assert list(totals.columns) == SUMMARY_COLUMNS
+        first = totals.iloc[0]
+        assert first["reading_count"] == 3
+        assert first["temperature_sum"] == 60.0
+        assert first["soil_moisture_max"] == 60.0
+        assert first["last_recorded"] == pd.Timestamp("2024-11-27 11:00:00")
+
+    def test_merged_halves_match_whole(self, readings):
+        """Tests merging two halves gives the totals of all the readings, for
+        the plants with new readings only."""
+        whole = summarise_readings(readings)
+
+        merged = merge_summary(summarise_readings(readings.iloc[[0, 3]]),
+                               summarise_readings(readings.iloc[[1, 2]]))
+
+        pd.testing.assert_frame_equal(merged, whole[whole["plant_id"] == 1],
+                                      check_dtype=False)
+
+    def test_new_plant_unchanged(self, readings):
+        """Tests plants with nothing stored are written as summarised."""
+        totals = summarise_readings(readings)
+
+        merged = merge_summary(pd.DataFrame(columns=SUMMARY_COLUMNS), totals)
+
+        pd.testing.assert_frame_equal(merged, totals, check_dtype=False)
+
+
+class TestUpdateArchiveSummary:
+    """Test class for writing the running totals."""
+
+    @patch.dict(os.environ, {"DB_BACKEND": "sqlite"})
+    def test_runs_accumulate(self, readings, migrated_conn):
+        """Tests later archive runs add to the stored totals."""
+        with migrated_conn.cursor() as cur:
+            assert update_archive_summary(cur, summarise_readings(readings.iloc[:2])) == 1
+            assert update_archive_summary(cur, summarise_readings(readings.iloc[2:])) == 2
+        migrated_conn.commit()
+
+        assert read_summary(migrated_conn) == [
+            {"plant_id": 1, "reading_count": 3, "temperature_sum": 60.0,
+             "temperature_min": 10.0, "temperature_max": 30.0,
+             "last_recorded": "2024-11-27 11:00:00"},
+            {"plant_id": 2, "reading_count": 1, "temperature_sum": 15.0,
+             "temperature_min": 15.0, "temperature_max": 15.0,
+             "last_recorded": "2024-11-27 10:15:00"}]
+
+    def test_nothing_archived(self, migrated_conn):
+        """Tests an empty run writes nothing."""
+        with migrated_conn.cursor() as cur:
+            assert update_archive_summary(cur, summarise_readings(pd.DataFrame())) == 0
+
+        assert read_summary(migrated_conn) == []
+
+    def test_table_totals_match_readings(self, readings, migrated_conn):
+        """Tests totals aggregated by the database match the pandas totals."""
+        with migrated_conn.cursor() as cur:
+            cur.executemany("""INSERT INTO epsilon.plant_metric (temperature, soil_moisture,
+                                   recording_taken, last_watered, botanist_id, plant_id)
+                               VALUES (%s, %s, %s, %s, 1, %s);""",
+                            [(row.temperature, row.soil_moisture, row.recording_taken,
+                              row.recording_taken, row.plant_id)
+                             for row in readings.itertuples()])
+            totals = read_table_totals(cur, "epsilon.plant_metric")
+
+        totals["last_recorded"] = pd.to_datetime(totals["last_recorded"])
+        pd.testing.assert_frame_equal(totals, summarise_readings(readings), check_dtype=False)
+
+    def test_backfilled_from_archive(self, sqlite_backend, sqlite_conn):
+        """Tests the migration seeds the totals from existing archive rows,
+        counting rows without a reading count as a day of minute readings."""
+        migrate(sqlite_conn, sqlite_backend, target=7)
+        with sqlite_conn.cursor() as cur:
+            cur.execute("""INSERT INTO epsilon.plants_archive (avg_temperature,
+                               avg_soil_moisture, watered_count, last_recorded,
+                               plant_id, reading_count)
+                           VALUES (10.0, 30.0, 1, '2024-11-26 23:59:00', 1, NULL),
+                                  (20.0, 40.0, 1, '2024-11-27 12:00:00', 1, 720);""")
+        sqlite_conn.commit()
+        migrate(sqlite_conn, sqlite_backend)
+
+        assert read_summary(sqlite_conn) == [
+            {"plant_id": 1, "reading_count": 2160,
+             "temperature_sum": 10.0 * 1440 + 20.0 * 720,
+             "temperature_min": 10.0, "temperature_max": 20.0,
+             "last_recorded": "2024-11-27 12:00:00"}]
@@ -0,0 +1,233 @@
+"""Load-tests the dashboard with simulated viewers: each session reruns the page
+on the dashboard's auto-refresh cadence, with its own random offset, while an
+ETL batch lands every interval. Runs against the local SQLite storage backend
+through Streamlit's AppTest.
+
+Sessions share one process, as they do on the real Streamlit server, so the
+cached data, connection pool and reading window are shared between them.
+Reports render latency percentiles, database statements per minute and memory
+per session. Image downloads are replaced with a local placeholder, so the
+figures measure the dashboard rather than the third-party image hosts.
+
+Usage: python benchmarks/bench_dashboard.py [--sessions 30] [--refreshes 3]
+       [--interval 60] [--history 120]"""
+
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import argparse
+import logging
+import os
+import tempfile
+import threading
+import resource
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+from local_db import use_local_db, get_plant_ids, make_batch, ROOT
+from bench_storage import report
+
+# pylint: disable=wrong-import-order
+import load
+from image_cache import ImageCache
+from plantdb.sqlite import SQLiteCursor
+from PIL import Image
+from streamlit.testing.v1 import AppTest
+
+DASHBOARD = ROOT / "dashboard" / "dashboard.py"
+RENDER_TIMEOUT_SECONDS = 120
+PLACEHOLDER_IMAGE_SIZE = (1600, 1200)
+
+
+def stub_image_downloads() -> None:
+    """Serves every plant image from an in-memory JPEG the size of a typical
+    original, so thumbnails are still resized but no request leaves the machine."""
+    image = BytesIO()
+    Image.new("RGB", PLACEHOLDER_IMAGE_SIZE, "#84b067").save(image, format="JPEG")
+    content = image.getvalue()
+    ImageCache.download = staticmethod(lambda url: content)
+
+
+class StatementCounter:
+    """Counts the statements the dashboard runs on the local backend, leaving
+    out the ones run by threads marked as the pipeline."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self._lock = threading.Lock()
+        self._pipeline = threading.local()
+        self._execute = SQLiteCursor.execute
+
+    def mark_pipeline(self) -> None:
+        """Stops counting the statements run by the calling thread."""
+        self._pipeline.active = True
+
+    def add_statement(self) -> None:
+        """Counts one statement unless the calling thread is the pipeline."""
+        if not getattr(self._pipeline, "active", False):
+            with self._lock:
+                self.count += 1
+
+    def install(self) -> None:
+        """Wraps the SQLite cursor so every statement is counted."""
+        counter, execute = self, self._execute
+
+        def counting_execute(cursor, query, params=None):
+            counter.add_statement()
+            return execute(cursor, query, params)
+
+        SQLiteCursor.execute = counting_execute
+
+    def uninstall(self) -> None:
+        """Restores the SQLite cursor."""
+        SQLiteCursor.execute = self._execute
+
+
+def render(session: AppTest) -> float:
+    """Reruns a session's page, returning the render time in milliseconds."""
+    started = time.perf_counter()
+    session.run()
+    elapsed = (time.perf_counter() - started) * 1000
+    if session.exception:
+        raise RuntimeError(session.exception[0].value)
+    return elapsed
+
+
+def peak_memory() -> int:
+    """Peak resident memory of the process so far, in bytes. macOS reports it
+    in bytes and Linux in kibibytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def open_session() -> tuple[AppTest, float]:
+    """Opens a session with its first render, returning it and the render time."""
+    session = AppTest.from_file(str(DASHBOARD), default_timeout=RENDER_TIMEOUT_SECONDS)
+    return session, render(session)
+
+
+def open_sessions(count: int) -> tuple[list[AppTest], list[float], float]:
+    """Opens every session with a first render, one after another. Returns the
+    sessions, their first render times and the peak resident memory the first
+    session added, shared caches included."""
+    before = peak_memory()
+    sessions, first_renders, first_memory = [], [], 0
+    for _ in range(count):
+        session, elapsed = open_session()
+        sessions.append(session)
+        first_renders.append(elapsed)
+        if len(sessions) == 1:
+            first_memory = peak_memory() - before
+    return sessions, first_renders, first_memory
+
+
+def further_session_memory() -> int:
+    """Memory allocated by opening one more session. Tracing slows rendering
+    several times over, so it is kept out of the timed renders."""
+    tracemalloc.start()
+    try:
+        session = open_session()
+        allocated = tracemalloc.get_traced_memory()[0]
+        del session
+        return allocated
+    finally:
+        tracemalloc.stop()
+
+
+def load_history(db_path: str, history: int, rng: np.random.Generator) -> list[int]:
+    """Loads the minutes of readings seen before the sessions open, returning
+    the plant ids."""
+    plant_ids = get_plant_ids(use_local_db(db_path))
+    for minute in range(history):
+        load.main(make_batch(plant_ids, minute, rng))
+    return plant_ids
+
+
+def run_pipeline(plant_ids: list[int], minutes: range, interval: float,
+                 counter: StatementCounter, rng: np.random.Generator) -> None:
+    """Loads one batch of readings every interval, like the ETL schedule."""
+    counter.mark_pipeline()
+    for minute in minutes:
+        time.sleep(interval)
+        load.main(make_batch(plant_ids, minute, rng))
+
+
+def refresh_session(session: AppTest, refreshes: int, interval: float,
+                    offset: float, started: float) -> list[float]:
+    """Reruns one session every interval, starting offset seconds in."""
+    latencies = []
+    for refresh in range(refreshes):
+        time.sleep(max(0.0, started + offset + refresh * interval - time.perf_counter()))
+        latencies.append(render(session))
+    return latencies
+
+
+def refresh_sessions(sessions: list[AppTest], refreshes: int, interval: float,
+                     pipeline: threading.Thread) -> tuple[list[float], float]:
+    """Refreshes every session at a random offset while the pipeline thread
+    loads. Returns the render times and the minutes the refreshes took."""
+    offsets = np.random.default_rng(1).uniform(0, interval, len(sessions))
+    started = time.perf_counter()
+    pipeline.start()
+    with ThreadPoolExecutor(max_workers=len(sessions)) as executor:
+        latencies = list(executor.map(
+            lambda pair: refresh_session(pair[0], refreshes, interval, pair[1], started),
+            zip(sessions, offsets)))
+    pipeline.join()
+    minutes = (time.perf_counter() - started) / 60
+    return [latency for session in latencies for latency in session], minutes
+
+
+def run(db_path: str, sessions: int, refreshes: int, interval: float,
+        history: int) -> None:
+    """Opens the sessions, then refreshes them all while the pipeline loads."""
+    stub_image_downloads()
+    rng = np.random.default_rng(0)
+    plant_ids = load_history(db_path, history, rng)
+
+    counter = StatementCounter()
+    counter.install()
+    try:
+        opened, first_renders, first_memory = open_sessions(sessions)
+        open_statements = counter.count
+        per_session = further_session_memory()
+        report(f"first render ({sessions} sessions)", first_renders)
+
+        counter.count = 0
+        latencies, minutes = refresh_sessions(opened, refreshes, interval, threading.Thread(
+            target=run_pipeline,
+            args=(plant_ids, range(history, history + refreshes), interval, counter, rng)))
+    finally:
+        counter.uninstall()
+
+    report(f"refresh render (every {interval:g}s)", latencies)
+    print(f"{'db statements':<28} opening={open_statements:>5}  "
+          f"refreshing={counter.count / minutes:8.1f}/min "
+          f"({counter.count / minutes / sessions:.2f}/min per session)")
+    print(f"{'memory':<28} first session={first_memory / 2**20:7.2f}MiB  "
+          f"each further session={per_session / 2**20:7.2f}MiB")
+
+
+if __name__ == "__main__":
+    logging.disable(logging.WARNING)
+    os.environ.setdefault("STREAMLIT_LOGGER_LEVEL", "error")
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=30,
+                        help="concurrent dashboard sessions (default: 30)")
+    parser.add_argument("--refreshes", type=int, default=3,
+                        help="refreshes per session after the first render (default: 3)")
+    parser.add_argument("--interval", type=float, default=60,
+                        help="seconds between refreshes and ETL batches (default: 60)")
+    parser.add_argument("--history", type=int, default=120,
+                        help="minutes of readings loaded before the sessions open")
+    parser.add_argument("--db", help="SQLite file to use (default: temporary)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.setdefault("IMAGE_CACHE_DIR", str(Path(tmp) / "image_cache"))
+        os.environ.setdefault("PLANT_FACTS_CACHE_PATH", str(Path(tmp) / "plant_facts.json"))
+        run(args.db or str(Path(tmp) / "bench.db"), args.sessions, args.refreshes,
+            args.interval, args.history)
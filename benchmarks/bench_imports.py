@@ -0,0 +1,116 @@
+"""Measures the cold-start import time of each component's entry module with
+python -X importtime, and lists the slowest modules it imports directly.
+
+With --check, exits non-zero if an entry module imports a module it is meant
+to load lazily, or takes longer than --budget-ms to import, so cold-start
+regressions fail CI.
+
+Usage: python benchmarks/bench_imports.py [--top 8] [--repeat 3] [--check]
+       [--budget-ms 0]"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+IMPORT_TIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+# Entry module of each component, and the modules it must not import up front.
+# pandas is left out for the dashboard: its first render needs it anyway.
+ENTRY_POINTS = {
+    "pipeline": ("etl", []),
+    "archive": ("archive", []),
+    "dashboard": ("dashboard", ["google.generativeai", "altair", "streamlit_autorefresh",
+                                "PIL.Image", "requests"]),
+}
+
+
+def parse_import_times(report: str) -> dict[str, float]:
+    """Cumulative import time in milliseconds of each module in an importtime
+    report, by module name."""
+    times = {}
+    for line in report.splitlines():
+        match = IMPORT_TIME.match(line)
+        if match:
+            times[match.group(4)] = int(match.group(2)) / 1000
+    return times
+
+
+def direct_imports(report: str, module: str) -> dict[str, float]:
+    """Cumulative time of the modules the entry module imports directly. The
+    report lists a module's imports just before the module itself, one level
+    deeper."""
+    children = {}
+    for line in report.splitlines():
+        match = IMPORT_TIME.match(line)
+        if not match:
+            continue
+        depth = len(match.group(3))
+        if depth == 3:
+            children[match.group(4)] = int(match.group(2)) / 1000
+        elif depth == 1:
+            if match.group(4) == module:
+                return children
+            children = {}
+    return children
+
+
+def profile_import(component: str, module: str) -> str:
+    """Imports the entry module in a fresh interpreter and returns the
+    importtime report."""
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        [str(ROOT), os.environ.get("PYTHONPATH", "")]))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT / component, env=environment, capture_output=True, text=True, check=False)
+    if result.returncode:
+        raise RuntimeError(f"Importing {component}/{module} failed:\n{result.stderr}")
+    return result.stderr
+
+
+def run(top: int, repeat: int, budget_ms: float) -> list[str]:
+    """Reports each component's import time and returns the failed checks."""
+    failures = []
+    for component, (module, deferred) in ENTRY_POINTS.items():
+        reports = [profile_import(component, module) for _ in range(repeat)]
+        totals = [parse_import_times(report)[module] for report in reports]
+        total = float(np.median(totals))
+        print(f"{component + '/' + module:<28} median={total:8.1f}ms  "
+              f"min={min(totals):8.1f}ms  runs={repeat}")
+
+        slowest = sorted(direct_imports(reports[-1], module).items(),
+                         key=lambda item: item[1], reverse=True)[:top]
+        for name, elapsed in slowest:
+            print(f"    {name:<32} {elapsed:8.1f}ms")
+
+        imported = parse_import_times(reports[-1])
+        failures += [f"{component}/{module} imports {name} at import time"
+                     for name in deferred if name in imported]
+        if budget_ms and total > budget_ms:
+            failures.append(f"{component}/{module} took {total:.1f}ms to import, "
+                            f"over the {budget_ms:g}ms budget")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--top", type=int, default=8,
+                        help="slowest direct imports to list per component")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="fresh interpreters per component (default: 3)")
+    parser.add_argument("--check", action="store_true",
+                        help="exit non-zero on an eager deferred import or a blown budget")
+    parser.add_argument("--budget-ms", type=float, default=0,
+                        help="import time budget per component with --check (default: none)")
+    args = parser.parse_args()
+
+    failed = run(args.top, args.repeat, args.budget_ms)
+    for failure in failed:
+        print(f"FAIL {failure}")
+    if args.check and failed:
+        sys.exit(1)
@@ -0,0 +1,184 @@
+"""Compares query plans and latency of the dashboard and archive queries that
+read plant_metric over a day's worth of rows, with and without the covering
+indexes from migration 1.
+
+The queries are captured from the real db_queries and archive functions, then
+explained and timed on the local SQLite backend. The archive is timed by its
+read-only per-plant totals, so plants_archive is left unchanged by the run.
+
+Usage: python benchmarks/bench_indexes.py [--minutes 1440] [--repeat 5]"""
+
+import argparse
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from local_db import use_local_db, get_plant_ids, make_batch, BOTANISTS, START_OF_DAY
+
+# pylint: disable=wrong-import-order
+import db_queries
+import summary
+from plantdb.migrations import MIGRATIONS, LATEST_BACKFILL
+from plantdb.sqlite import translate, adapt_params
+
+HISTORY_SPAN = pd.Timedelta(hours=6)
+
+
+class CapturingCursor:
+    """Records the statements a query function runs instead of executing them."""
+
+    def __init__(self) -> None:
+        self.statements = []
+        self.rowcount = 0
+
+    def __enter__(self) -> "CapturingCursor":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        pass
+
+    def cursor(self) -> "CapturingCursor":
+        """Lets the capturer stand in for a connection too."""
+        return self
+
+    def execute(self, query: str, params=None) -> None:
+        """Records a statement and its parameters."""
+        self.statements.append((query, params))
+
+    def commit(self) -> None:
+        """Ignores commits."""
+
+    def rollback(self) -> None:
+        """Ignores rollbacks."""
+
+    def fetchall(self) -> list:
+        """Returns no rows."""
+        return []
+
+    def fetchone(self) -> dict:
+        """Returns an empty row."""
+        return {}
+
+
+def capture(function, *arguments) -> tuple[str, tuple]:
+    """Returns the statement a query function would run."""
+    cursor = CapturingCursor()
+    function(cursor, *arguments)
+    return cursor.statements[0]
+
+
+def get_workloads(plant_ids: list[int], minutes: int) -> dict[str, list[tuple[str, tuple]]]:
+    """Statements that read plant_metric: the live part of each plant's history
+    chart over the dashboard's default six hours, and the archive's totals. The
+    latest metrics and archival data are read from plant_latest and
+    plant_archive_summary, so they are left out."""
+    end = START_OF_DAY + pd.Timedelta(minutes=minutes)
+    start = end - HISTORY_SPAN
+    return {
+        "dashboard plant history": [capture(db_queries.get_plant_history, plant_id,
+                                            start, end) for plant_id in plant_ids],
+        "archive aggregate": [capture(summary.read_table_totals, "epsilon.plant_metric")],
+    }
+
+
+def fill_plant_metric(conn, plant_ids: list[int], minutes: int) -> None:
+    """Inserts a day of readings in a single transaction."""
+    botanist_ids = {name: botanist_id for botanist_id,
+                    name in enumerate(BOTANISTS, start=1)}
+    rng = np.random.default_rng(0)
+    with conn.cursor() as cur:
+        for minute in range(minutes):
+            batch = make_batch(plant_ids, minute, rng)
+            cur.executemany("""INSERT INTO epsilon.plant_metric (temperature, soil_moisture,
+                recording_taken, last_watered, botanist_id, plant_id)
+                VALUES (%s, %s, %s, %s, %s, %s)""",
+                            [(row.temperature, row.soil_moisture, row.recording_taken,
+                              row.last_watered, botanist_ids[row.name], row.plant_id)
+                             for row in batch.itertuples()])
+        cur.execute(LATEST_BACKFILL)
+    conn.commit()
+
+
+def set_covering_indexes(conn, present: bool) -> None:
+    """Creates or drops the indexes added by migration 1."""
+    with conn.cursor() as cur:
+        for statement in MIGRATIONS[0].statements["sqlite"]:
+            if present:
+                cur.execute(statement)
+            else:
+                index_name = statement.split()[2]
+                cur.execute(f"DROP INDEX IF EXISTS {index_name};")
+    conn.commit()
+
+
+def explain(conn, statement: tuple[str, tuple]) -> list[str]:
+    """Returns the SQLite query plan for a statement."""
+    query, params = statement
+    raw = conn._conn  # pylint: disable=protected-access
+    plan = raw.execute("EXPLAIN QUERY PLAN " + translate(query),
+                       adapt_params(params)).fetchall()
+    return [row["detail"] for row in plan]
+
+
+def time_workload(conn, statements: list[tuple[str, tuple]], repeat: int) -> float:
+    """Returns the best total time in milliseconds to run every statement."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        with conn.cursor() as cur:
+            for query, params in statements:
+                cur.execute(query, params)
+                cur.fetchall()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def profile(conn, workloads: dict, repeat: int) -> dict[str, float]:
+    """Prints the plan of each workload and returns its timings."""
+    timings = {}
+    for label, statements in workloads.items():
+        timings[label] = time_workload(conn, statements, repeat)
+        print(f"  {label} ({len(statements)} statements)")
+        for detail in explain(conn, statements[0]):
+            print(f"      {detail}")
+    return timings
+
+
+def run(db_path: str, minutes: int, repeat: int) -> None:
+    """Benchmarks the queries without and then with the covering indexes."""
+    backend = use_local_db(db_path)
+    plant_ids = get_plant_ids(backend)
+    workloads = get_workloads(plant_ids, minutes)
+
+    with backend.connect() as conn:
+        fill_plant_metric(conn, plant_ids, minutes)
+        print(f"plant_metric rows: {len(plant_ids) * minutes}\n")
+
+        set_covering_indexes(conn, present=False)
+        print("Without covering indexes:")
+        before = profile(conn, workloads, repeat)
+        set_covering_indexes(conn, present=True)
+        print("\nWith covering indexes:")
+        after = profile(conn, workloads, repeat)
+
+    print(f"\n{'workload':<28}{'before':>12}{'after':>12}{'speed-up':>10}")
+    for label in workloads:
+        print(f"{label:<28}{before[label]:>10.2f}ms{after[label]:>10.2f}ms"
+              f"{before[label] / after[label]:>9.1f}x")
+
+
+if __name__ == "__main__":
+    logging.disable(logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--minutes", type=int, default=1440,
+                        help="minutes of readings to load (default: one day)")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="runs per workload; the best is reported")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        run(str(Path(tmp) / "bench.db"), args.minutes, args.repeat)
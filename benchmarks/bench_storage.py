@@ -0,0 +1,71 @@
+"""Load-tests the ETL load, dashboard and archive data paths end to end against
+the local SQLite storage backend.
+
+Usage: python benchmarks/bench_storage.py [--minutes 1440] [--db bench.db]"""
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from local_db import use_local_db, get_plant_ids, make_batch
+
+# pylint: disable=wrong-import-order
+import load
+import archive
+import db_queries
+from plantdb import get_connection
+
+
+def time_call(function, *arguments) -> float:
+    """Runs a function once and returns its duration in milliseconds."""
+    started = time.perf_counter()
+    function(*arguments)
+    return (time.perf_counter() - started) * 1000
+
+
+def report(label: str, durations: list[float]) -> None:
+    """Prints latency percentiles for a set of runs."""
+    durations = np.asarray(durations)
+    print(f"{label:<28} runs={len(durations):>5}  "
+          f"p50={np.percentile(durations, 50):8.2f}ms  "
+          f"p95={np.percentile(durations, 95):8.2f}ms  "
+          f"max={durations.max():8.2f}ms")
+
+
+def run(db_path: str, minutes: int) -> None:
+    """Loads a day of readings, queries them like the dashboard, then archives them."""
+    backend = use_local_db(db_path)
+    plant_ids = get_plant_ids(backend)
+    rng = np.random.default_rng(0)
+
+    load_times = [time_call(load.main, make_batch(plant_ids, minute, rng))
+                  for minute in range(minutes)]
+    report(f"ETL load ({len(plant_ids)} rows/batch)", load_times)
+
+    with get_connection() as conn:
+        cursor = db_queries.get_cursor(conn)
+        report("dashboard latest metrics",
+               [time_call(db_queries.get_latest_metrics, cursor) for _ in range(20)])
+        report("dashboard archival data",
+               [time_call(db_queries.get_archival_data, cursor) for _ in range(20)])
+
+    report("archive", [time_call(archive.lambda_handler, None, None)])
+
+
+if __name__ == "__main__":
+    logging.disable(logging.INFO)
+    # Time the archive work itself rather than the pauses between purge chunks.
+    os.environ.setdefault("PURGE_PAUSE_SECONDS", "0")
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--minutes", type=int, default=1440,
+                        help="minutes of readings to load (default: one day)")
+    parser.add_argument("--db", help="SQLite file to use (default: temporary)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        run(args.db or str(Path(tmp) / "bench.db"), args.minutes)
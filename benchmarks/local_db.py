@@ -0,0 +1,64 @@
+"""Helpers for benchmarking against the local SQLite storage backend: creates a
+seeded database and generates realistic batches of sensor readings."""
+
+from os import environ
+from pathlib import Path
+import sys
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+for component in ("pipeline", "archive", "dashboard"):
+    if str(ROOT / component) not in sys.path:
+        sys.path.insert(0, str(ROOT / component))
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+# pylint: disable=wrong-import-position
+from plantdb import SQLiteBackend, migrate
+
+BOTANISTS = ["Carl Linnaeus", "Gertrude Jekyll", "Eliza Andrews"]
+START_OF_DAY = pd.Timestamp("2024-11-27 00:00:00")
+
+
+def use_local_db(path: str, migrated: bool = True) -> SQLiteBackend:
+    """Points every component at a freshly seeded SQLite database,
+    with every migration applied unless migrated is False."""
+    environ["DB_BACKEND"] = "sqlite"
+    environ["SQLITE_PATH"] = str(path)
+    environ.setdefault("SCHEMA_NAME", "epsilon")
+
+    backend = SQLiteBackend()
+    conn = backend.connect()
+    backend.create_schema(conn)
+    if migrated:
+        migrate(conn, backend)
+    conn.close()
+    return backend
+
+
+def get_plant_ids(backend: SQLiteBackend) -> list[int]:
+    """Reads the seeded plant ids."""
+    with backend.connect() as conn, conn.cursor() as cur:
+        cur.execute("SELECT plant_id FROM epsilon.plant ORDER BY plant_id;")
+        return [row["plant_id"] for row in cur.fetchall()]
+
+
+def make_batch(plant_ids: list[int], minute: int,
+               rng: np.random.Generator) -> pd.DataFrame:
+    """Builds one minute of cleaned readings, shaped like transform's output.
+    Each plant is watered every six hours, at a time offset by its id."""
+    taken = START_OF_DAY + pd.Timedelta(minutes=minute)
+    plant_ids = np.asarray(plant_ids)
+    since_watered = (minute - plant_ids % 360) % 360
+    last_watered = taken - pd.to_timedelta(since_watered, unit="min")
+
+    return pd.DataFrame({
+        "name": [BOTANISTS[plant_id % len(BOTANISTS)] for plant_id in plant_ids],
+        "temperature": rng.normal(12, 1.5, len(plant_ids)).round(2),
+        "soil_moisture": rng.normal(30, 5, len(plant_ids)).round(2),
+        "recording_taken": taken,
+        "last_watered": last_watered,
+        "plant_id": plant_ids
+    })
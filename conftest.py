@@ -0,0 +1,29 @@
+"""Fixtures shared by the tests of every component"""
+# pylint: skip-file
+
+import pytest
+
+from plantdb import SQLiteBackend, migrate
+
+
+@pytest.fixture
+def sqlite_backend(tmp_path):
+    """A local SQLite database with the schema and seed data, not yet migrated."""
+    backend = SQLiteBackend(str(tmp_path / "plants.db"), "epsilon")
+    with backend.connect() as conn:
+        backend.create_schema(conn)
+    return backend
+
+
+@pytest.fixture
+def sqlite_conn(sqlite_backend):
+    """A connection to the local database, closed after the test."""
+    with sqlite_backend.connect() as conn:
+        yield conn
+
+
+@pytest.fixture
+def migrated_conn(sqlite_backend, sqlite_conn):
+    """A connection to the local database with every migration applied."""
+    migrate(sqlite_conn, sqlite_backend)
+    return sqlite_conn
@@ -0,0 +1,170 @@
+"""api.py: a small JSON API serving the latest reading of every plant from memory.
+
+A background task reads plant_latest once per ETL cadence and serialises it
+once. Every consumer is then served from memory with an ETag, so clients that
+poll with If-None-Match get an empty 304 until the readings change. However
+many gallery screens and systems poll, the database sees one query per refresh.
+
+Usage: python api.py"""
+# pylint: disable=broad-exception-caught
+
+from os import environ
+from datetime import datetime, timezone
+from functools import partial
+from typing import Callable
+import asyncio
+import hashlib
+import json
+import logging
+
+from aiohttp import web
+from dotenv import load_dotenv
+import pandas as pd
+
+from db_queries import get_cursor, get_latest_metrics
+from plantdb import ConnectionPool, get_connection
+
+DEFAULT_REFRESH_SECONDS = 60
+DEFAULT_PORT = 8080
+TIME_COLUMNS = ["latest_time", "last_watered"]
+
+
+def make_etag(body: bytes) -> str:
+    """Strong entity tag of a response body."""
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Checks an If-None-Match header against the current entity tag. Weak
+    tags compare by value, as the header's weak comparison requires."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+class PlantSnapshot:
+    """The latest reading of every plant, serialised once per refresh."""
+
+    def __init__(self, fetch: Callable[[], pd.DataFrame]) -> None:
+        self.fetch = fetch
+        self.body = None
+        self.etag = None
+        self.plants = {}
+        self.refreshed_at = None
+
+    def update(self, metrics: pd.DataFrame) -> bool:
+        """Serialises the metrics for every request until the next refresh.
+        Returns whether any reading changed."""
+        metrics = metrics.assign(**{column: pd.to_datetime(metrics[column])
+                                    for column in TIME_COLUMNS if column in metrics})
+        records = json.loads(metrics.sort_values("plant_id").to_json(
+            orient="records", date_format="iso"))
+        body = json.dumps({"plants": records}).encode()
+        self.refreshed_at = datetime.now(timezone.utc)
+        if body == self.body:
+            return False
+
+        self.plants = {}
+        for record in records:
+            plant_body = json.dumps(record).encode()
+            self.plants[record["plant_id"]] = (plant_body, make_etag(plant_body))
+        self.body, self.etag = body, make_etag(body)
+        return True
+
+    async def refresh(self) -> None:
+        """Reads the latest metrics on a worker thread, keeping the last
+        snapshot if the read fails."""
+        try:
+            metrics = await asyncio.get_running_loop().run_in_executor(None, self.fetch)
+            if self.update(metrics):
+                logging.info("Plant snapshot updated with %s plants", len(self.plants))
+        except Exception as e:
+            logging.error("Could not refresh the plant snapshot: %s", e)
+
+    async def refresh_periodically(self, interval: float) -> None:
+        """Refreshes the snapshot every interval until cancelled."""
+        while True:
+            await self.refresh()
+            await asyncio.sleep(interval)
+
+
+SNAPSHOT = web.AppKey("snapshot", PlantSnapshot)
+REFRESH_SECONDS = web.AppKey("refresh_seconds", float)
+
+
+def cached_response(request: web.Request, body: bytes, etag: str) -> web.Response:
+    """Serves a body with its entity tag, or an empty 304 if the client
+    already holds it."""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        return web.Response(status=304, headers=headers)
+    return web.Response(body=body, content_type="application/json", headers=headers)
+
+
+async def get_plants(request: web.Request) -> web.Response:
+    """The latest reading of every plant."""
+    snapshot = request.app[SNAPSHOT]
+    if snapshot.body is None:
+        raise web.HTTPServiceUnavailable(text="No plant readings loaded yet")
+    return cached_response(request, snapshot.body, snapshot.etag)
+
+
+async def get_plant(request: web.Request) -> web.Response:
+    """The latest reading of one plant."""
+    snapshot = request.app[SNAPSHOT]
+    if snapshot.body is None:
+        raise web.HTTPServiceUnavailable(text="No plant readings loaded yet")
+    try:
+        body, etag = snapshot.plants[int(request.match_info["plant_id"])]
+    except (KeyError, ValueError) as e:
+        raise web.HTTPNotFound(text="No such plant") from e
+    return cached_response(request, body, etag)
+
+
+async def get_health(request: web.Request) -> web.Response:
+    """Whether the snapshot has loaded, and when it was last refreshed."""
+    snapshot = request.app[SNAPSHOT]
+    return web.json_response({
+        "status": "ok" if snapshot.body is not None else "starting",
+        "plants": len(snapshot.plants),
+        "refreshed_at": snapshot.refreshed_at.isoformat() if snapshot.refreshed_at else None
+    })
+
+
+async def run_refresher(app: web.Application):
+    """Keeps the snapshot refreshed while the app is running."""
+    task = asyncio.create_task(
+        app[SNAPSHOT].refresh_periodically(app[REFRESH_SECONDS]))
+    yield
+    task.cancel()
+
+
+def create_app(snapshot: PlantSnapshot,
+               refresh_seconds: float = DEFAULT_REFRESH_SECONDS) -> web.Application:
+    """Builds the API around a snapshot refreshed every refresh_seconds."""
+    app = web.Application()
+    app[SNAPSHOT] = snapshot
+    app[REFRESH_SECONDS] = refresh_seconds
+    app.cleanup_ctx.append(run_refresher)
+    app.router.add_get("/plants", get_plants)
+    app.router.add_get("/plants/{plant_id}", get_plant)
+    app.router.add_get("/health", get_health)
+    return app
+
+
+def fetch_latest_metrics(pool: ConnectionPool) -> pd.DataFrame:
+    """Reads the latest metrics on a pooled connection."""
+    with pool.connection() as connection, get_cursor(connection) as cursor:
+        return get_latest_metrics(cursor)
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    plant_snapshot = PlantSnapshot(partial(fetch_latest_metrics,
+                                           ConnectionPool(get_connection, size=1)))
+    web.run_app(create_app(plant_snapshot, float(environ.get(
+                    "API_REFRESH_SECONDS", DEFAULT_REFRESH_SECONDS))),
+                port=int(environ.get("API_PORT", DEFAULT_PORT)), access_log=None)
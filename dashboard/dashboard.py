@@ -1,21 +1,151 @@
 """Streamlit Dashboard for LNMH Plant Monitoring System."""
 # pylint: disable=broad-exception-caught
 # pylint: disable=no-name-in-module
+# pylint: disable=unused-argument
+
+from __future__ import annotations
 
 from os import environ
+from datetime import datetime, timedelta
+from typing import Callable
+import logging
 from dotenv import load_dotenv
 import pandas as pd
 import streamlit as st
-import altair as alt
-from streamlit_autorefresh import st_autorefresh
-import google.generativeai as genai
-from pymssql import Cursor
 
-from db_queries import (get_archival_data, get_latest_metrics,
-                        get_connection, get_cursor, get_plant_image_url,
-                        get_plant_countries, get_plant_fact)
+from lazy import lazy_import
+from db_queries import (get_archival_data, get_latest_metrics, get_data_versions,
+                        get_cursor, get_plant_image_url,
+                        get_plant_history, get_metrics_since)
+from reading_window import ReadingWindow
+from plant_facts import PlantFactCache
+from image_cache import ImageCache
+from plantdb import ConnectionPool, get_connection, METRIC_VERSION, ARCHIVE_VERSION
+
+# pandas stays eager: every render, the first included, builds DataFrames from
+# the latest metrics, and db_queries, reading_window and downsample need it at
+# import. Deferring it would only move its import into the first page load.
+alt = lazy_import("altair")
+genai = lazy_import("google.generativeai")
+autorefresh = lazy_import("streamlit_autorefresh")
 
 COLOUR_PALETTE = ["#84b067", "#a7de83", "#4b633b", "#2c3b23"]
+VERSION_POLL_SECONDS = 5
+PLANT_CACHE_TTL_SECONDS = 3600
+HISTORY_RANGES = {"6 hours": timedelta(hours=6), "24 hours": timedelta(days=1),
+                  "7 days": timedelta(days=7), "30 days": timedelta(days=30)}
+HISTORY_LABELS = {"temperature": "Temperature (°C)", "soil_moisture": "Soil Moisture"}
+
+
+@st.cache_resource
+def get_pool() -> ConnectionPool:
+    """The connection pool shared by every session and thread of the server."""
+    return ConnectionPool.from_environ(get_connection)
+
+
+def run_query(query: Callable, *args):
+    """Runs a db_queries function on a pooled connection."""
+    with get_pool().connection() as connection, get_cursor(connection) as cursor:
+        return query(cursor, *args)
+
+
+@st.cache_data(ttl=VERSION_POLL_SECONDS, show_spinner=False)
+def load_data_versions() -> dict:
+    """Data versions, the only query an idle refresh runs, shared by every
+    session for a few seconds."""
+    return run_query(get_data_versions)
+
+
+@st.cache_data(max_entries=2, show_spinner=False)
+def load_latest_metrics(version: int) -> pd.DataFrame:
+    """Latest metrics with their plant labels, shared by every session until
+    the next load bumps the version."""
+    return link_plant_name_id(run_query(get_latest_metrics))
+
+
+@st.cache_data(max_entries=2, show_spinner=False)
+def load_archival_data(version: int) -> pd.DataFrame:
+    """Archive averages with their plant labels, shared by every session until
+    the next archive run."""
+    return link_plant_name_id(run_query(get_archival_data))
+
+
+@st.cache_resource
+def get_reading_window() -> ReadingWindow:
+    """The rolling window of recent readings shared by every session."""
+    return ReadingWindow()
+
+
+def refresh_reading_window(version: int) -> None:
+    """Appends the readings loaded since the window last saw a new version."""
+    get_reading_window().refresh(
+        version, lambda after_id, limit: run_query(get_metrics_since, after_id, limit))
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def build_chart_specs(metric_version: int, archive_version: int,
+                      selected_plants: tuple) -> dict:
+    """Serialised specs of the live charts for one data version and plant
+    selection, so reruns with nothing new skip building them."""
+    data_live, data_archival = filter_by_plant(
+        list(selected_plants), load_latest_metrics(metric_version),
+        load_archival_data(archive_version))
+    return {
+        "temperature": overlay_temperature_chart(data_live, data_archival).to_dict(),
+        "soil_moisture": overlay_soil_moisture_chart(data_live, data_archival).to_dict(),
+        "last_watered": plot_last_watered(data_live).to_dict()
+    }
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def load_plant_history(plant_id: int, start: datetime, end: datetime) -> pd.DataFrame:
+    """Downsampled history of a plant, shared by every session. The end is the
+    newest reading, so a new batch starts a new cache entry. Recent readings
+    come from the rolling window rather than plant_metric."""
+    live = get_reading_window().plant_readings(plant_id, start, end)
+    return run_query(get_plant_history, plant_id, start, end, live)
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def build_history_spec(plant_id: int, plant_name: str, start: datetime,
+                       end: datetime) -> dict:
+    """Serialised spec of a plant's history chart, or None without history."""
+    history = load_plant_history(plant_id, start, end)
+    if history.empty:
+        return None
+    return plot_plant_history(history, plant_name).to_dict()
+
+
+@st.cache_resource
+def get_image_cache() -> ImageCache:
+    """The local plant thumbnail cache shared by every session."""
+    return ImageCache.from_environ()
+
+
+@st.cache_data(ttl=PLANT_CACHE_TTL_SECONDS, show_spinner=False)
+def load_plant_thumbnail(image_url: str) -> str:
+    """Local thumbnail path of a plant image. Images that can't be fetched are
+    tried again once the TTL expires."""
+    return get_image_cache().get(image_url)
+
+
+@st.cache_resource
+def get_fact_cache() -> PlantFactCache:
+    """The Gemini model and plant fact cache, set up once per server."""
+    genai.configure(api_key=environ["GEMINI_API_KEY"])
+    return PlantFactCache.from_environ(genai.GenerativeModel('gemini-1.5-flash'))
+
+
+@st.cache_resource
+def prewarm_plant_facts(plant_names: tuple) -> None:
+    """Starts generating the facts of every plant, once per set of plants."""
+    get_fact_cache().prewarm(list(plant_names))
+
+
+@st.cache_data(ttl=PLANT_CACHE_TTL_SECONDS, show_spinner=False)
+def load_plant_image_url(plant_name: str) -> dict:
+    """Image url of a plant, which rarely changes, shared by every session."""
+    return run_query(get_plant_image_url, plant_name)
 
 
 def homepage() -> None:
@@ -35,16 +165,16 @@ def homepage() -> None:
         st.markdown("<h1 style='text-align: right;'>🍄🌵🌱</h1>",
                     unsafe_allow_html=True)
 
-    connection = get_connection()
-    cursor = get_cursor(connection)
-
-    archival_metrics = get_archival_data(cursor)
-    plant_metrics = get_latest_metrics(cursor)
+    versions = load_data_versions()
+    archival_metrics = load_archival_data(versions.get(ARCHIVE_VERSION, 0))
+    plant_metrics = load_latest_metrics(versions.get(METRIC_VERSION, 0))
 
     try:
+        refresh_reading_window(versions.get(METRIC_VERSION, 0))
+        start_fact_prewarm(list(plant_metrics['plant_name']))
         filter_plant = get_plant_filter(
             list(plant_metrics['plant_name']))
-        populate_columns(cursor, archival_metrics, plant_metrics, filter_plant)
+        populate_columns(versions, archival_metrics, plant_metrics, filter_plant)
     except Exception:
         st.markdown(
             """<h2 style='text-align: center;'>No data in the system currently 😔 
@@ -54,6 +184,14 @@ def homepage() -> None:
     st.write(" ")
 
 
+def start_fact_prewarm(plant_names: list) -> None:
+    """Prewarms the plant facts in the background, without holding up the page."""
+    try:
+        prewarm_plant_facts(tuple(sorted(plant_names)))
+    except Exception as e:
+        logging.warning("Plant facts are not being prewarmed: %s", e)
+
+
 def embed_gif() -> None:
     """Embeds gif into Streamlit dasboard."""
     sad_groot_code = """
@@ -70,7 +208,7 @@ def embed_gif() -> None:
     st.components.v1.html(sad_groot_code, height=500)
 
 
-def populate_columns(cursor: Cursor, archival_metrics: pd.DataFrame,
+def populate_columns(versions: dict, archival_metrics: pd.DataFrame,
                      plant_metrics: pd.DataFrame, filter_plant: list) -> None:
     """ Create and populate columns of the dashboard container. Left side contains graphs.
         Right side contains legend and plant images. """
@@ -89,30 +227,50 @@ def populate_columns(cursor: Cursor, archival_metrics: pd.DataFrame,
 
         single_plant_chosen = filter_single_plant_for_image(
             plant_metrics['plant_name'].unique())
-        plant_url = get_plant_image_url(cursor, single_plant_chosen)
+        plant_url = load_plant_image_url(single_plant_chosen)
         display_plant_image(plant_url)
         display_plant_information(single_plant_chosen)
     with space:
         st.write("")
     with left:
-        st_autorefresh(interval=60000, limit=200, key="refresh-counter")
+        autorefresh.st_autorefresh(interval=60000, limit=200, key="refresh-counter")
 
-        live_metrics = get_latest_metrics(cursor)
-        filtered_data = filter_by_plant(
-            filter_plant, live_metrics, archival_metrics)
-        display_charts(
-            filtered_data[0], filtered_data[1])
+        display_charts(build_chart_specs(
+            versions.get(METRIC_VERSION, 0), versions.get(ARCHIVE_VERSION, 0),
+            tuple(sorted(filter_plant))))
+        st.write(" ")
+        display_plant_history(plant_metrics)
 
 
-def display_charts(data_live: pd.DataFrame, data_archival: pd.DataFrame) -> None:
-    """Function to display and format charts."""
-    st.altair_chart(overlay_temperature_chart(data_live,
-                                              data_archival))
+def display_charts(specs: dict) -> None:
+    """Function to display the prebuilt chart specs."""
+    st.vega_lite_chart(specs["temperature"])
     st.write(" ")
-    st.altair_chart(overlay_soil_moisture_chart(data_live,
-                                                data_archival))
+    st.vega_lite_chart(specs["soil_moisture"])
     st.write(" ")
-    st.altair_chart(plot_last_watered(data_live))
+    st.vega_lite_chart(specs["last_watered"])
+
+
+def display_plant_history(plant_metrics: pd.DataFrame) -> None:
+    """Shows one plant's temperature and soil moisture over a chosen span."""
+    plant_column, range_column = st.columns(2)
+    with plant_column:
+        plant_name = st.selectbox("Plant history 📈",
+                                  options=sorted(plant_metrics['plant_name'].unique()),
+                                  key="history_plant")
+    with range_column:
+        span = st.radio("Over the last", options=list(HISTORY_RANGES),
+                        index=1, horizontal=True, key="history_range")
+
+    plant_id = int(plant_metrics.loc[plant_metrics['plant_name'] == plant_name,
+                                     'plant_id'].iloc[0])
+    end = pd.Timestamp(plant_metrics['latest_time'].max()).to_pydatetime() + \
+        timedelta(seconds=1)
+    spec = build_history_spec(plant_id, plant_name, end - HISTORY_RANGES[span], end)
+    if spec is None:
+        st.write("No history for this plant yet, check back in a few minutes!")
+        return
+    st.vega_lite_chart(spec)
 
 
 def filter_single_plant_for_image(plant_names: list) -> str:
@@ -125,24 +283,23 @@ def filter_single_plant_for_image(plant_names: list) -> str:
 
 
 def display_plant_image(plant_url: str) -> None:
-    """Displays a plant image by its url if it exists in database."""
-    if plant_url:
-        st.image(plant_url['image_url'],
-                 use_container_width=True, width=500)
+    """Displays the local thumbnail of a plant's image if it exists in database."""
+    thumbnail = load_plant_thumbnail(plant_url['image_url']) if plant_url else None
+    if thumbnail:
+        st.image(thumbnail, use_container_width=True, width=500)
     else:
         st.write(
             "Ooops! No picture for this plant can be found, try a different plant!")
 
 
 def display_plant_information(single_plant_chosen: str) -> None:
-    """ Create gemini model and get plant facts."""
+    """ Show the plant's cached fact and native range, generating them on a miss."""
 
     st.write("Fun Fact:")
     try:
-        genai.configure(api_key=environ["GEMINI_API_KEY"])
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        st.write(get_plant_fact(model, single_plant_chosen))
-        st.write(get_plant_countries(model, single_plant_chosen))
+        information = get_fact_cache().get(single_plant_chosen)
+        st.write(information["fact"])
+        st.write(information["countries"])
     except Exception:
         st.write(
             "🪴 Oops you're going a bit fast with the plant searches! Try again in a minute...")
@@ -168,10 +325,12 @@ def filter_by_plant(selected_plants: list, plant_metrics: pd.DataFrame,
 
 
 def link_plant_name_id(data: pd.DataFrame) -> pd.DataFrame:
-    """Create a link between id and name in the dataframe."""
-    data['plant_id_name'] = data['plant_name'] + \
-        ' (ID: ' + data['plant_id'].astype(str) + ')'
-    return data
+    """Create a link between id and name in the dataframe. The input is left
+    unchanged, and data that is already labelled is returned as it is."""
+    if data.empty or 'plant_id_name' in data:
+        return data
+    return data.assign(plant_id_name=data['plant_name'] + ' (ID: '
+                       + data['plant_id'].astype(str) + ')')
 
 
 def plot_live_temp(data: pd.DataFrame) -> alt.Chart:
@@ -261,6 +420,28 @@ def plot_last_watered(data: pd.DataFrame) -> alt.Chart:
     return chart
 
 
+def plot_plant_history(history: pd.DataFrame, plant_name: str) -> alt.Chart:
+    """Line charts of a plant's downsampled metrics, one row per metric."""
+    history = history.assign(metric=history['metric'].map(HISTORY_LABELS))
+    chart = alt.Chart(history).mark_line(color=COLOUR_PALETTE[2]).encode(
+        x=alt.X("recording_taken:T", title="Time"),
+        y=alt.Y("value:Q", title=None, scale=alt.Scale(zero=False)),
+        tooltip=[alt.Tooltip("recording_taken:T", title="Recorded At", format="%d %b %H:%M"),
+                 alt.Tooltip("value:Q", title="Value", format=".2f")]
+    ).properties(
+        height=200,
+        width=700
+    ).facet(
+        row=alt.Row("metric:N", title=None)
+    ).resolve_scale(
+        y="independent"
+    ).properties(
+        title=f"{plant_name} History"
+    )
+
+    return chart
+
+
 def create_avg_temp_line(data: pd.DataFrame) -> alt.Chart:
     """Create a line for the average temperature for each plant."""
     data = link_plant_name_id(data)
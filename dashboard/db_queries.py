@@ -1,36 +1,21 @@
 """db_queries.py: data retrieval for dashboard visualisations."""
 # pylint: disable=no-name-in-module
 
+from datetime import datetime, timedelta
 from os import environ
 import logging
 import pandas as pd
-from pymssql import connect, Connection, exceptions, Cursor
+from pymssql import Connection, exceptions, Cursor
 
+from downsample import downsample
 
-def get_connection() -> Connection:
-    """Connects to Microsoft SQL Server Database"""
-
-    logging.info("Attempting to connect to the database.")
-    try:
-        conn = connect(
-            server=environ["DB_HOST"],
-            port=environ["DB_PORT"],
-            user=environ["DB_USER"],
-            password=environ["DB_PASSWORD"],
-            database=environ["DB_NAME"],
-            as_dict=True
-        )
-        logging.info("Database connection successful.")
-        return conn
-    except KeyError as e:
-        logging.error("%s missing from environment variables.", e)
-        raise
-    except exceptions.OperationalError as e:
-        logging.error("Error connecting to database: %s", e)
-        raise
-    except Exception as e:
-        logging.error("Unexpected error while connecting to database: %s", e)
-        raise
+ROLLUP_TIERS = [("plant_metric_hourly", timedelta(hours=1)),
+                ("plant_metric_daily", timedelta(days=1))]
+MAX_CHART_POINTS = 500
+HISTORY_METRICS = ["temperature", "soil_moisture"]
+DELTA_COLUMNS = ["plant_metric_id", "plant_id", "recording_taken",
+                 "temperature", "soil_moisture"]
+MAX_DELTA_ROWS = 20000
 
 
 def get_cursor(connection: Connection) -> Cursor:
@@ -40,19 +25,14 @@ def get_cursor(connection: Connection) -> Cursor:
 
 def get_latest_metrics(cursor: Cursor) -> pd.DataFrame:
     """Function gets the latest plant health metrics including: temperature, soil moisture levels
-    plant name, time of recording and last_watered, and extracts these to a dataframe."""
+    plant name, time of recording and last_watered, and extracts these to a dataframe.
+    Reads plant_latest, which the pipeline keeps at one row per plant."""
 
     query = f"""
-        SELECT pm.temperature, pm.soil_moisture, latest_recording_info.latest_time,
-          p.plant_name, pm.plant_id, pm.last_watered
-        FROM {environ['SCHEMA_NAME']}.plant_metric pm
-        JOIN (SELECT plant_id,
-            MAX(recording_taken) as latest_time
-            FROM {environ['SCHEMA_NAME']}.plant_metric
-            GROUP BY plant_id) as latest_recording_info
-        ON pm.plant_id = latest_recording_info.plant_id
-            AND pm.recording_taken = latest_recording_info.latest_time
-        JOIN {environ['SCHEMA_NAME']}.plant as p ON pm.plant_id = p.plant_id;
+        SELECT pl.temperature, pl.soil_moisture, pl.recording_taken AS latest_time,
+          p.plant_name, pl.plant_id, pl.last_watered
+        FROM {environ['SCHEMA_NAME']}.plant_latest pl
+        JOIN {environ['SCHEMA_NAME']}.plant as p ON pl.plant_id = p.plant_id;
        """
     try:
 
@@ -70,16 +50,18 @@ def get_latest_metrics(cursor: Cursor) -> pd.DataFrame:
 
 
 def get_archival_data(cursor: Cursor) -> pd.DataFrame:
-    """Function gets archival data including averages of temperature, soil_moisture."""
+    """Function gets archival data including averages of temperature, soil_moisture.
+    The averages come from the running totals the archive keeps per plant, so
+    this reads one row per plant however much has been archived."""
 
     query = f"""
-        SELECT ROUND(AVG(pa.avg_temperature), 2) AS avg_temperature,
-        ROUND(AVG(pa.avg_soil_moisture), 2) AS avg_soil_moisture,
+        SELECT ROUND(s.temperature_sum / s.reading_count, 2) AS avg_temperature,
+        ROUND(s.soil_moisture_sum / s.reading_count, 2) AS avg_soil_moisture,
         p.plant_name, p.plant_id
-        FROM epsilon.plants_archive AS pa
+        FROM epsilon.plant_archive_summary AS s
         JOIN epsilon.plant AS p
-        ON p.plant_id = pa.plant_id
-        GROUP BY p.plant_name, p.plant_id;
+        ON p.plant_id = s.plant_id
+        WHERE s.reading_count > 0;
         """
     try:
         cursor.execute(query)
@@ -95,6 +77,112 @@ def get_archival_data(cursor: Cursor) -> pd.DataFrame:
     return pd.DataFrame(result)
 
 
+def get_metrics_since(cursor: Cursor, after_id: int,
+                      limit: int = MAX_DELTA_ROWS) -> pd.DataFrame:
+    """Function gets up to limit readings with a plant_metric_id past after_id,
+    oldest first, so a caller holding a watermark only reads what is new."""
+
+    query = f"""
+        SELECT TOP ({int(limit)}) {', '.join(DELTA_COLUMNS)}
+        FROM {environ['SCHEMA_NAME']}.plant_metric
+        WHERE plant_metric_id > %s
+        ORDER BY plant_metric_id;
+        """
+    try:
+        cursor.execute(query, (after_id,))
+        result = cursor.fetchall()
+    except exceptions.OperationalError as e:
+        logging.error(
+            "Operational error occurred connecting whilst fetching new readings: %s", e)
+        raise
+    except Exception as e:
+        logging.error("Error occurred whilst fetching new readings: %s", e)
+        raise
+
+    readings = pd.DataFrame(result, columns=DELTA_COLUMNS)
+    readings["recording_taken"] = pd.to_datetime(readings["recording_taken"])
+    return readings
+
+
+def get_data_versions(cursor: Cursor) -> dict:
+    """Function gets the version of each table the pipeline and archive write.
+    A version goes up with every load or archive run, so this one small read
+    tells the dashboard whether its data has changed."""
+
+    query = f"SELECT name, batch_version FROM {environ['SCHEMA_NAME']}.etl_batch;"
+    try:
+        cursor.execute(query)
+        result = cursor.fetchall()
+    except exceptions.OperationalError as e:
+        logging.error(
+            "Operational error occurred connecting whilst fetching data versions: %s", e)
+        raise
+    except Exception as e:
+        logging.error("Error occurred whilst fetching data versions: %s", e)
+        raise
+
+    return {row["name"]: row["batch_version"] for row in result}
+
+
+def choose_rollup_table(start: datetime, end: datetime,
+                        max_points: int = MAX_CHART_POINTS) -> str:
+    """Returns the finest rollup tier that covers the range in at most
+    max_points buckets per plant, falling back to the coarsest tier."""
+    for table, bucket_width in ROLLUP_TIERS:
+        if (end - start) / bucket_width <= max_points:
+            return table
+    return ROLLUP_TIERS[-1][0]
+
+
+def get_plant_history(cursor: Cursor, plant_id: int, start: datetime, end: datetime,
+                      live: pd.DataFrame = None) -> pd.DataFrame:
+    """Function gets one plant's temperature and soil moisture between start and end,
+    as time, metric and value rows. Readings still in plant_metric are used as
+    they are and the time before them comes from the finest rollup tier covering
+    the range. Each metric is downsampled with LTTB to at most MAX_CHART_POINTS points,
+    so the chart costs the same whatever the span. Recent readings the caller
+    already holds can be passed as live instead of being read again."""
+    schema = environ['SCHEMA_NAME']
+    live_query = f"""
+        SELECT recording_taken, temperature, soil_moisture
+        FROM {schema}.plant_metric
+        WHERE plant_id = %s AND recording_taken >= %s AND recording_taken < %s
+        ORDER BY recording_taken;
+        """
+    archived_query = f"""
+        SELECT bucket_start AS recording_taken, temperature_mean AS temperature,
+          soil_moisture_mean AS soil_moisture
+        FROM {schema}.{choose_rollup_table(start, end)}
+        WHERE plant_id = %s AND bucket_start >= %s AND bucket_start < %s
+        ORDER BY bucket_start;
+        """
+    try:
+        if live is None:
+            cursor.execute(live_query, (plant_id, start, end))
+            live = pd.DataFrame(cursor.fetchall(),
+                                columns=["recording_taken", *HISTORY_METRICS])
+        live_start = min(live["recording_taken"]) if not live.empty else end
+        cursor.execute(archived_query, (plant_id, start, live_start))
+        archived = cursor.fetchall()
+    except exceptions.OperationalError as e:
+        logging.error(
+            "Operational error occurred connecting whilst fetching plant history: %s", e)
+        raise
+    except Exception as e:
+        logging.error("Error occurred whilst fetching plant history: %s", e)
+        raise
+
+    columns = ["recording_taken", *HISTORY_METRICS]
+    readings = pd.concat([frame for frame in (pd.DataFrame(archived, columns=columns),
+                                              live[columns]) if not frame.empty]
+                         or [pd.DataFrame(columns=columns)], ignore_index=True)
+    readings["recording_taken"] = pd.to_datetime(readings["recording_taken"])
+    return pd.concat([
+        downsample(readings, "recording_taken", metric, MAX_CHART_POINTS)[
+            ["recording_taken", metric]].rename(columns={metric: "value"}).assign(metric=metric)
+        for metric in HISTORY_METRICS], ignore_index=True)
+
+
 def get_plant_image_url(cursor: Cursor, plant_name: str) -> str:
     """Extracts the plant image url for a plant by its name."""
     query = """ SELECT image_url
@@ -0,0 +1,44 @@
+"""downsample.py: reduces long time series to a fixed number of chart points.
+
+Uses Largest-Triangle-Three-Buckets (LTTB), which keeps the first and last
+points and, from each bucket in between, the point forming the largest triangle
+with the point already chosen and the average of the next bucket. Peaks and
+troughs survive, so a day of minute readings still looks right at 500 points."""
+
+import numpy as np
+import pandas as pd
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Returns the positions of the points LTTB keeps out of x and y, which
+    must be sorted by x. Every position is kept if there are few enough."""
+    length = len(y)
+    if threshold >= length or threshold < 3:
+        return np.arange(length)
+
+    every = (length - 2) / (threshold - 2)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, length - 1
+    chosen = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * every) + 1
+        end = int((bucket + 1) * every) + 1
+        next_end = min(int((bucket + 2) * every) + 1, length)
+        next_x, next_y = x[end:next_end].mean(), y[end:next_end].mean()
+
+        areas = np.abs((x[chosen] - next_x) * (y[start:end] - y[chosen])
+                       - (x[chosen] - x[start:end]) * (next_y - y[chosen]))
+        chosen = start + int(np.argmax(areas))
+        selected[bucket + 1] = chosen
+    return selected
+
+
+def downsample(readings: pd.DataFrame, time_column: str, value_column: str,
+               threshold: int) -> pd.DataFrame:
+    """Keeps at most threshold rows of the readings, chosen by LTTB on one
+    value column."""
+    readings = readings.sort_values(time_column).dropna(subset=[value_column])
+    times = pd.to_datetime(readings[time_column]).to_numpy(dtype="datetime64[ns]")
+    indices = lttb_indices(times.astype(np.int64).astype(np.float64),
+                           readings[value_column].to_numpy(dtype=np.float64), threshold)
+    return readings.iloc[indices]
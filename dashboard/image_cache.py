@@ -0,0 +1,118 @@
+"""image_cache.py: local thumbnails of the plant images.
+
+The image urls in epsilon.plant point at third-party hosts, some slow or dead
+and many serving multi-megabyte originals. Each image is downloaded once, resized
+to the dashboard's thumbnail width and saved under the hash of its content, so
+the dashboard serves it from local disk however often it refreshes."""
+# pylint: disable=broad-exception-caught
+
+from io import BytesIO
+from os import environ
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from lazy import lazy_import
+
+requests = lazy_import("requests")
+Image = lazy_import("PIL.Image")
+
+DEFAULT_CACHE_DIR = "image_cache"
+THUMBNAIL_WIDTH = 500
+DOWNLOAD_TIMEOUT_SECONDS = 10
+MAX_DOWNLOAD_BYTES = 20 * 1024 * 1024
+INDEX_FILE = "index.json"
+
+
+class ImageCache:
+    """Thumbnails of remote images, stored in a directory by content hash."""
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR,
+                 width: int = THUMBNAIL_WIDTH) -> None:
+        self.directory = directory
+        self.width = width
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._index = self._read_index()
+
+    @classmethod
+    def from_environ(cls) -> "ImageCache":
+        """Creates a cache in IMAGE_CACHE_DIR."""
+        return cls(environ.get("IMAGE_CACHE_DIR", DEFAULT_CACHE_DIR))
+
+    @property
+    def index_path(self) -> str:
+        """File mapping each image url to the hash of its content."""
+        return os.path.join(self.directory, INDEX_FILE)
+
+    def _read_index(self) -> dict:
+        """Loads the url to content hash index saved by earlier runs."""
+        if not os.path.exists(self.index_path):
+            return {}
+        try:
+            with open(self.index_path, encoding="utf-8") as index_file:
+                return json.load(index_file)
+        except (OSError, ValueError) as e:
+            logging.warning("Ignoring unreadable image index %s: %s", self.index_path, e)
+            return {}
+
+    def _write_index(self) -> None:
+        """Saves the index, replacing the file in one step."""
+        temporary_path = f"{self.index_path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as index_file:
+            json.dump(self._index, index_file)
+        os.replace(temporary_path, self.index_path)
+
+    def thumbnail_path(self, content_hash: str) -> str:
+        """Where the thumbnail of the content with this hash is stored."""
+        return os.path.join(self.directory, f"{content_hash}-{self.width}.jpg")
+
+    @staticmethod
+    def download(url: str) -> bytes:
+        """Fetches the original image, refusing anything over the size limit."""
+        with requests.get(url, timeout=DOWNLOAD_TIMEOUT_SECONDS, stream=True) as response:
+            response.raise_for_status()
+            content = response.raw.read(MAX_DOWNLOAD_BYTES + 1, decode_content=True)
+        if len(content) > MAX_DOWNLOAD_BYTES:
+            raise ValueError(f"{url} is larger than {MAX_DOWNLOAD_BYTES} bytes")
+        return content
+
+    def resize(self, content: bytes) -> bytes:
+        """Shrinks the image to the thumbnail width, as a JPEG."""
+        with Image.open(BytesIO(content)) as image:
+            image = image.convert("RGB")
+            image.thumbnail((self.width, self.width * 4))
+            thumbnail = BytesIO()
+            image.save(thumbnail, format="JPEG", quality=85, optimize=True)
+        return thumbnail.getvalue()
+
+    def get(self, url: str) -> str:
+        """Returns the local thumbnail path for the image url, downloading and
+        resizing it on a miss. Returns None if the image can't be fetched."""
+        if not url:
+            return None
+        with self._lock:
+            content_hash = self._index.get(url)
+        if content_hash and os.path.exists(self.thumbnail_path(content_hash)):
+            return self.thumbnail_path(content_hash)
+
+        try:
+            content = self.download(url)
+            content_hash = hashlib.sha256(content).hexdigest()
+            path = self.thumbnail_path(content_hash)
+            if not os.path.exists(path):
+                thumbnail = self.resize(content)
+                temporary_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(temporary_path, "wb") as thumbnail_file:
+                    thumbnail_file.write(thumbnail)
+                os.replace(temporary_path, path)
+        except Exception as e:
+            logging.warning("Could not cache the image at %s: %s", url, e)
+            return None
+
+        with self._lock:
+            self._index[url] = content_hash
+            self._write_index()
+        return path
@@ -0,0 +1,23 @@
+"""lazy.py: defers importing heavy modules until they are first used.
+
+Importing the dashboard used to load Gemini's client, Altair and the image
+libraries before the first line of the page could render, although most reruns
+never touch them. A lazy module is a stand-in that imports the real module the
+first time one of its attributes is read."""
+
+import importlib
+import sys
+from types import ModuleType
+
+
+class LazyModule(ModuleType):  # pylint: disable=too-few-public-methods
+    """Stands in for a module that is imported on first attribute access."""
+
+    def __getattr__(self, attribute: str):
+        # The import lock makes concurrent first uses import the module once.
+        return getattr(importlib.import_module(self.__name__), attribute)
+
+
+def lazy_import(name: str) -> ModuleType:
+    """Returns the module if it is already imported, or a stand-in for it."""
+    return sys.modules.get(name) or LazyModule(name)
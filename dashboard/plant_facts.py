@@ -0,0 +1,85 @@
+"""plant_facts.py: on-disk cache of the Gemini facts and native ranges of each plant.
+
+Generated text doesn't change, so each plant's fact and native range are asked
+for once, concurrently, and saved to a JSON file keyed by plant name. Every
+later render, session and restart reads them from the file."""
+# pylint: disable=broad-exception-caught
+
+from concurrent.futures import ThreadPoolExecutor
+from os import environ
+import json
+import logging
+import os
+import threading
+
+from db_queries import get_plant_countries, get_plant_fact
+
+DEFAULT_CACHE_PATH = "plant_facts.json"
+
+
+class PlantFactCache:
+    """Plant facts and native ranges, generated on a miss and kept on disk."""
+
+    def __init__(self, model, path: str = DEFAULT_CACHE_PATH) -> None:
+        self.model = model
+        self.path = path
+        self._lock = threading.Lock()
+        self._facts = self._read()
+
+    @classmethod
+    def from_environ(cls, model) -> "PlantFactCache":
+        """Creates a cache stored at PLANT_FACTS_CACHE_PATH."""
+        return cls(model, environ.get("PLANT_FACTS_CACHE_PATH", DEFAULT_CACHE_PATH))
+
+    def _read(self) -> dict:
+        """Loads the facts saved by earlier runs."""
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, encoding="utf-8") as cache_file:
+                return json.load(cache_file)
+        except (OSError, ValueError) as e:
+            logging.warning("Ignoring unreadable plant fact cache %s: %s", self.path, e)
+            return {}
+
+    def _write(self) -> None:
+        """Saves every fact, replacing the file in one step so readers never
+        see half of it."""
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as cache_file:
+            json.dump(self._facts, cache_file)
+        os.replace(temporary_path, self.path)
+
+    def generate(self, plant_name: str) -> dict:
+        """Asks for the plant's fact and native range at the same time."""
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            fact = executor.submit(get_plant_fact, self.model, plant_name)
+            countries = executor.submit(get_plant_countries, self.model, plant_name)
+            return {"fact": fact.result(), "countries": countries.result()}
+
+    def get(self, plant_name: str) -> dict:
+        """Returns the plant's fact and native range, generating them on a miss."""
+        with self._lock:
+            cached = self._facts.get(plant_name)
+        if cached:
+            return cached
+
+        generated = self.generate(plant_name)
+        with self._lock:
+            self._facts[plant_name] = generated
+            self._write()
+        return generated
+
+    def prewarm(self, plant_names: list) -> threading.Thread:
+        """Generates the missing plants one at a time on a background thread.
+        Failures are logged and left for the next miss."""
+        def warm() -> None:
+            for plant_name in plant_names:
+                try:
+                    self.get(plant_name)
+                except Exception as e:
+                    logging.warning("Could not prewarm facts for %s: %s", plant_name, e)
+
+        thread = threading.Thread(target=warm, name="plant-fact-prewarm", daemon=True)
+        thread.start()
+        return thread
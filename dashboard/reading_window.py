@@ -0,0 +1,77 @@
+"""reading_window.py: a rolling in-memory window of the most recent readings.
+
+The window holds the plant_metric_id of the newest reading it has seen. Each
+new ETL batch only fetches the readings past that id, appends them, and drops
+readings older than the span. A refresh therefore costs the database and
+network only as much as the new data. plant_metric_id only grows, because
+purges delete rows and the swap mode switches rows out without resetting the
+identity."""
+
+from datetime import timedelta
+import threading
+from typing import Callable
+
+import pandas as pd
+
+from db_queries import DELTA_COLUMNS, MAX_DELTA_ROWS
+
+DEFAULT_SPAN = timedelta(hours=24)
+DEFAULT_MAX_ROWS = 100000
+
+
+class ReadingWindow:
+    """The last `span` of readings of every plant, at most `max_rows` of them."""
+
+    def __init__(self, span: timedelta = DEFAULT_SPAN,
+                 max_rows: int = DEFAULT_MAX_ROWS,
+                 page_rows: int = MAX_DELTA_ROWS) -> None:
+        self.span = span
+        self.max_rows = max_rows
+        self.page_rows = page_rows
+        self.last_id = 0
+        self.version = None
+        self._readings = pd.DataFrame(columns=DELTA_COLUMNS)
+        self._lock = threading.Lock()
+
+    @property
+    def readings(self) -> pd.DataFrame:
+        """Every reading in the window, oldest first."""
+        with self._lock:
+            return self._readings
+
+    def refresh(self, version: int, fetch: Callable[[int, int], pd.DataFrame]) -> int:
+        """Appends the readings past the watermark, read a page at a time with
+        fetch(after_id, limit), unless the window already holds this data
+        version. Returns the number of new readings."""
+        with self._lock:
+            if version == self.version:
+                return 0
+            pages = []
+            while True:
+                page = fetch(self.last_id, self.page_rows)
+                if not page.empty:
+                    pages.append(page)
+                    self.last_id = int(page["plant_metric_id"].max())
+                if len(page) < self.page_rows:
+                    break
+            self.version = version
+            added = sum(len(page) for page in pages)
+            if added:
+                if not self._readings.empty:
+                    pages.insert(0, self._readings)
+                self._readings = self._trim(pd.concat(pages, ignore_index=True))
+            return added
+
+    def _trim(self, readings: pd.DataFrame) -> pd.DataFrame:
+        """Drops readings older than the span before the newest, then the
+        oldest beyond max_rows."""
+        newest = readings["recording_taken"].max()
+        readings = readings[readings["recording_taken"] >= newest - self.span]
+        return readings.tail(self.max_rows).reset_index(drop=True)
+
+    def plant_readings(self, plant_id: int, start, end) -> pd.DataFrame:
+        """One plant's readings in the window between start and end."""
+        readings = self.readings
+        return readings[(readings["plant_id"] == plant_id)
+                        & (readings["recording_taken"] >= start)
+                        & (readings["recording_taken"] < end)]
@@ -0,0 +1,149 @@
+"""Test file for the live plant JSON API"""
+# pylint: skip-file
+import asyncio
+import logging
+from unittest.mock import Mock
+
+import pandas as pd
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from api import PlantSnapshot, create_app, etag_matches, make_etag
+
+
+def make_metrics(temperature=20.0):
+    return pd.DataFrame({
+        "temperature": [temperature, 15.0],
+        "soil_moisture": [30.0, 40.0],
+        "latest_time": ["2024-11-27 10:00:00", "2024-11-27 10:00:00"],
+        "plant_name": ["Fern", "Cactus"],
+        "plant_id": [2, 1],
+        "last_watered": ["2024-11-27 08:00:00", "2024-11-26 14:00:00"]})
+
+
+async def start_client(snapshot, refresh_seconds=3600):
+    client = TestClient(TestServer(create_app(snapshot, refresh_seconds)))
+    await client.start_server()
+    return client
+
+
+class TestEtag:
+    """Test Class for entity tag matching."""
+
+    def test_matches(self):
+        """Test listed, weak and wildcard tags match, and others don't."""
+        etag = make_etag(b"body")
+
+        assert etag_matches(etag, etag)
+        assert etag_matches(f'"other", W/{etag}', etag)
+        assert etag_matches("*", etag)
+        assert not etag_matches('"other"', etag)
+        assert not etag_matches(None, etag)
+
+
+class TestPlantSnapshot:
+    """Test Class for the in-memory snapshot."""
+
+    def test_update_detects_changes(self):
+        """Test the entity tag only changes when a reading changes."""
+        snapshot = PlantSnapshot(Mock())
+
+        assert snapshot.update(make_metrics())
+        etag = snapshot.etag
+        assert not snapshot.update(make_metrics())
+        assert snapshot.etag == etag
+        assert snapshot.update(make_metrics(temperature=21.0))
+        assert snapshot.etag != etag
+
+    def test_plants_sorted_with_iso_times(self):
+        """Test plants are served in id order with ISO timestamps."""
+        snapshot = PlantSnapshot(Mock())
+        snapshot.update(make_metrics())
+
+        assert list(snapshot.plants) == [1, 2]
+        assert b'"latest_time": "2024-11-27T10:00:00.000"' in snapshot.plants[2][0]
+
+    @pytest.mark.asyncio
+    async def test_failed_refresh_keeps_snapshot(self, caplog):
+        """Test a failed read is logged and the last snapshot kept."""
+        fetch = Mock(side_effect=[make_metrics(), Exception("Database down")])
+        snapshot = PlantSnapshot(fetch)
+
+        await snapshot.refresh()
+        etag = snapshot.etag
+        with caplog.at_level(logging.ERROR):
+            await snapshot.refresh()
+
+        assert snapshot.etag == etag
+        assert "Could not refresh the plant snapshot: Database down" in caplog.text
+
+
+class TestApi:
+    """Test Class for the HTTP endpoints."""
+
+    @pytest.mark.asyncio
+    async def test_plants_revalidated_with_etag(self):
+        """Test a client holding the current tag gets an empty 304."""
+        fetch = Mock(return_value=make_metrics())
+        client = await start_client(PlantSnapshot(fetch))
+        try:
+            await asyncio.sleep(0.05)
+            response = await client.get("/plants")
+            body = await response.json()
+            etag = response.headers["ETag"]
+
+            assert response.status == 200
+            assert [plant["plant_id"] for plant in body["plants"]] == [1, 2]
+
+            cached = await client.get("/plants", headers={"If-None-Match": etag})
+            assert cached.status == 304
+            assert await cached.read() == b""
+            assert cached.headers["ETag"] == etag
+            fetch.assert_called_once()
+        finally:
+            await client.close()
+
+    @pytest.mark.asyncio
+    async def test_single_plant(self):
+        """Test one plant is served with its own tag, and unknown ids are 404s."""
+        client = await start_client(PlantSnapshot(Mock(return_value=make_metrics())))
+        try:
+            await asyncio.sleep(0.05)
+            response = await client.get("/plants/2")
+            plant = await response.json()
+
+            assert response.status == 200
+            assert plant["plant_name"] == "Fern"
+            assert (await client.get("/plants/99")).status == 404
+            assert (await client.get("/plants/fern")).status == 404
+        finally:
+            await client.close()
+
+    @pytest.mark.asyncio
+    async def test_unavailable_before_first_refresh(self):
+        """Test plants are unavailable until the first read succeeds."""
+        client = await start_client(PlantSnapshot(Mock(side_effect=Exception("Down"))))
+        try:
+            await asyncio.sleep(0.05)
+            assert (await client.get("/plants")).status == 503
+            health = await (await client.get("/health")).json()
+            assert health["status"] == "starting"
+        finally:
+            await client.close()
+
+    @pytest.mark.asyncio
+    async def test_refreshed_on_cadence(self):
+        """Test the snapshot is read again every refresh interval."""
+        fetch = Mock(side_effect=[make_metrics(), make_metrics(temperature=25.0)]
+                     + [make_metrics(temperature=25.0)] * 10)
+        client = await start_client(PlantSnapshot(fetch), refresh_seconds=0.05)
+        try:
+            await asyncio.sleep(0.02)
+            first = (await client.get("/plants")).headers["ETag"]
+            await asyncio.sleep(0.1)
+            response = await client.get("/plants", headers={"If-None-Match": first})
+
+            assert response.status == 200
+            assert response.headers["ETag"] != first
+        finally:
+            await client.close()
@@ -1,12 +1,14 @@
 """Test file for queries.py"""
 # pylint: skip-file
 from os import environ
+from unittest.mock import patch
 import pandas as pd
 from pandas.testing import assert_frame_equal
 import pytest
 
 from dashboard import (
-    filter_by_plant, link_plant_name_id, get_data_plant_table)
+    filter_by_plant, link_plant_name_id, get_data_plant_table,
+    load_latest_metrics, load_plant_image_url, get_pool, build_chart_specs)
 
 
 class TestingDashboardFunctions:
@@ -77,6 +79,16 @@ class TestingDashboardFunctions:
         result = link_plant_name_id(input_data)
         assert_frame_equal(result, expected_data)
 
+    def test_link_plant_name_id_leaves_input_unchanged(self):
+        """Test labelling returns a new frame and skips data already labelled."""
+        input_data = pd.DataFrame({'plant_id': [1], 'plant_name': ['Fern']})
+
+        labelled = link_plant_name_id(input_data)
+
+        assert 'plant_id_name' not in input_data
+        assert link_plant_name_id(labelled) is labelled
+        assert link_plant_name_id(pd.DataFrame()).empty
+
     def test_get_data_plant_table(self):
         """Test getting the plant data table works correctly."""
         input_data = {
@@ -90,3 +102,92 @@ class TestingDashboardFunctions:
 
         result_df = get_data_plant_table(input_data)
         assert_frame_equal(result_df, expected_df)
+
+
+class TestingCachedQueries:
+    """Test Class for the query cache shared across dashboard sessions."""
+
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        load_latest_metrics.clear()
+        load_plant_image_url.clear()
+        yield
+        load_latest_metrics.clear()
+        load_plant_image_url.clear()
+
+    @patch('dashboard.get_latest_metrics')
+    @patch('dashboard.get_pool')
+    def test_reruns_share_one_query(self, mock_get_pool, mock_get_latest_metrics):
+        """Test repeated renders within the TTL query the database once."""
+        mock_get_latest_metrics.return_value = pd.DataFrame({'plant_id': [1], 'plant_name': ['Fern']})
+
+        first = load_latest_metrics(7)
+        second = load_latest_metrics(7)
+
+        assert_frame_equal(first, second)
+        mock_get_latest_metrics.assert_called_once()
+        mock_get_pool.return_value.connection.assert_called_once()
+
+    @patch('dashboard.plot_last_watered')
+    @patch('dashboard.overlay_soil_moisture_chart')
+    @patch('dashboard.overlay_temperature_chart')
+    @patch('dashboard.load_archival_data')
+    @patch('dashboard.load_latest_metrics')
+    def test_chart_specs_memoized(self, mock_latest, mock_archival, mock_temperature,
+                                  mock_soil_moisture, mock_last_watered):
+        """Test charts are built once per data version and plant selection."""
+        build_chart_specs.clear()
+        mock_latest.return_value = pd.DataFrame({'plant_name': ['Fern', 'Rose']})
+        mock_archival.return_value = pd.DataFrame({'plant_name': ['Fern', 'Rose']})
+        for mock_chart in (mock_temperature, mock_soil_moisture, mock_last_watered):
+            mock_chart.return_value.to_dict.return_value = {'mark': 'bar'}
+
+        first = build_chart_specs(7, 1, ('Fern',))
+        build_chart_specs(7, 1, ('Fern',))
+        build_chart_specs(7, 1, ('Fern', 'Rose'))
+        build_chart_specs(8, 1, ('Fern',))
+
+        assert first['temperature'] == {'mark': 'bar'}
+        assert mock_temperature.call_count == 3
+        build_chart_specs.clear()
+
+    @patch('dashboard.get_latest_metrics')
+    @patch('dashboard.get_pool')
+    def test_new_version_refetches(self, mock_get_pool, mock_get_latest_metrics):
+        """Test a new ETL batch version runs the full query again."""
+        mock_get_latest_metrics.side_effect = [pd.DataFrame({'plant_id': [1], 'plant_name': ['Fern']}),
+                                               pd.DataFrame({'plant_id': [2], 'plant_name': ['Rose']})]
+
+        load_latest_metrics(7)
+        latest = load_latest_metrics(8)
+
+        assert latest['plant_id'].tolist() == [2]
+        assert mock_get_latest_metrics.call_count == 2
+
+    @patch('dashboard.get_plant_image_url')
+    @patch('dashboard.get_pool')
+    def test_image_url_cached_per_plant(self, mock_get_pool, mock_get_plant_image_url):
+        """Test image urls are cached separately for each plant."""
+        mock_get_plant_image_url.side_effect = lambda cursor, name: {'image_url': name}
+
+        assert load_plant_image_url('Fern') == {'image_url': 'Fern'}
+        assert load_plant_image_url('Rose') == {'image_url': 'Rose'}
+        assert load_plant_image_url('Fern') == {'image_url': 'Fern'}
+
+        assert mock_get_plant_image_url.call_count == 2
+
+    @patch('dashboard.get_latest_metrics')
+    @patch('dashboard.get_connection')
+    def test_failed_query_returns_connection(self, mock_get_connection, mock_get_latest_metrics):
+        """Test a failed query hands its connection back to the pool and is not cached."""
+        get_pool.clear()
+        mock_get_latest_metrics.side_effect = [Exception("Simulated database error"),
+                                               pd.DataFrame({'plant_id': [1], 'plant_name': ['Fern']})]
+
+        with pytest.raises(Exception):
+            load_latest_metrics(7)
+        load_latest_metrics(7)
+
+        mock_get_connection.assert_called_once()
+        mock_get_connection.return_value.rollback.assert_called()
+        get_pool.clear()
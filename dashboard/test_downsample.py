@@ -0,0 +1,48 @@
+"""Test file for the LTTB downsampling"""
+# pylint: skip-file
+import numpy as np
+import pandas as pd
+
+from downsample import lttb_indices, downsample
+
+
+class TestingDownsample:
+    """Test Class for reducing series to a point budget."""
+
+    def test_short_series_kept_whole(self):
+        """Test series within the budget are returned unchanged."""
+        x = np.arange(10, dtype=float)
+
+        assert lttb_indices(x, x, 500).tolist() == list(range(10))
+
+    def test_budget_and_ends_kept(self):
+        """Test the output has exactly the budget, in order, with both ends."""
+        x = np.arange(1440, dtype=float)
+        y = np.sin(x / 50)
+
+        indices = lttb_indices(x, y, 100)
+
+        assert len(indices) == 100
+        assert indices[0] == 0 and indices[-1] == 1439
+        assert (np.diff(indices) > 0).all()
+
+    def test_spike_survives(self):
+        """Test a single spike in a flat series is kept."""
+        y = np.zeros(1000)
+        y[437] = 40.0
+
+        indices = lttb_indices(np.arange(1000, dtype=float), y, 20)
+
+        assert 437 in indices
+
+    def test_downsample_frame(self):
+        """Test a frame is sorted by time and reduced to the budget."""
+        times = pd.date_range("2024-11-27", periods=1440, freq="min")
+        readings = pd.DataFrame({"recording_taken": times[::-1],
+                                 "temperature": np.arange(1440.0)[::-1]})
+
+        result = downsample(readings, "recording_taken", "temperature", 50)
+
+        assert len(result) == 50
+        assert result["recording_taken"].is_monotonic_increasing
+        assert result["recording_taken"].iloc[0] == times[0]
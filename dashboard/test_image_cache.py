@@ -0,0 +1,78 @@
+"""Test file for the plant image thumbnail cache"""
+# pylint: skip-file
+import os
+from io import BytesIO
+from unittest.mock import patch
+
+import pytest
+from PIL import Image
+
+from image_cache import ImageCache
+
+
+def make_image(width: int = 2000, height: int = 1500, colour: str = "green") -> bytes:
+    image = BytesIO()
+    Image.new("RGB", (width, height), colour).save(image, format="PNG")
+    return image.getvalue()
+
+
+class TestImageCache:
+    """Test Class for downloading and resizing plant images once."""
+
+    @pytest.fixture
+    def cache(self, tmp_path):
+        return ImageCache(str(tmp_path / "images"), width=500)
+
+    @patch.object(ImageCache, "download")
+    def test_thumbnail_resized_and_reused(self, mock_download, cache):
+        """Test an image is downloaded once and stored at the thumbnail width."""
+        mock_download.return_value = make_image()
+
+        path = cache.get("https://example.com/fern.png")
+
+        assert cache.get("https://example.com/fern.png") == path
+        mock_download.assert_called_once()
+        with Image.open(path) as thumbnail:
+            assert thumbnail.size == (500, 375)
+            assert thumbnail.format == "JPEG"
+
+    @patch.object(ImageCache, "download")
+    def test_same_content_stored_once(self, mock_download, cache):
+        """Test two urls serving the same image share one thumbnail."""
+        mock_download.return_value = make_image()
+
+        first = cache.get("https://example.com/fern.png")
+        second = cache.get("https://mirror.example.com/fern.png")
+
+        assert first == second
+        assert len([name for name in os.listdir(cache.directory)
+                    if name.endswith(".jpg")]) == 1
+
+    @patch.object(ImageCache, "download")
+    def test_index_survives_restart(self, mock_download, cache):
+        """Test a new cache on the same directory serves without downloading."""
+        mock_download.return_value = make_image()
+        path = cache.get("https://example.com/fern.png")
+
+        restarted = ImageCache(cache.directory, width=500)
+
+        assert restarted.get("https://example.com/fern.png") == path
+        mock_download.assert_called_once()
+
+    @patch.object(ImageCache, "download")
+    def test_unavailable_image(self, mock_download, cache):
+        """Test dead hosts, broken images and missing urls give no thumbnail."""
+        mock_download.side_effect = [Exception("Connection timed out"), b"not an image"]
+
+        assert cache.get("https://dead.example.com/fern.png") is None
+        assert cache.get("https://example.com/broken.png") is None
+        assert cache.get(None) is None
+
+    @patch("image_cache.MAX_DOWNLOAD_BYTES", 10)
+    @patch("image_cache.requests.get")
+    def test_download_size_limit(self, mock_get):
+        """Test downloads over the size limit are refused."""
+        mock_get.return_value.__enter__.return_value.raw.read.return_value = b"x" * 11
+
+        with pytest.raises(ValueError):
+            ImageCache.download("https://example.com/huge.png")
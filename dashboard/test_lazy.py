@@ -0,0 +1,35 @@
+"""Test file for the lazy module imports"""
+# pylint: skip-file
+import sys
+from unittest.mock import patch
+
+from lazy import LazyModule, lazy_import
+
+
+class TestLazyImport:
+    """Test Class for deferring module imports."""
+
+    def test_imported_on_first_attribute(self):
+        """Test the module is only imported once an attribute is read."""
+        with patch.dict(sys.modules):
+            sys.modules.pop("colorsys", None)
+            colorsys = lazy_import("colorsys")
+
+            assert isinstance(colorsys, LazyModule)
+            assert "colorsys" not in sys.modules
+            assert colorsys.rgb_to_hsv(1.0, 0.0, 0.0) == (0.0, 1.0, 1.0)
+            assert "colorsys" in sys.modules
+
+    def test_imported_module_returned(self):
+        """Test a module that is already imported is returned as it is."""
+        assert lazy_import("json") is sys.modules["json"]
+
+    def test_attribute_can_be_patched(self):
+        """Test attributes of a lazy module can be patched in tests."""
+        with patch.dict(sys.modules):
+            sys.modules.pop("colorsys", None)
+            colorsys = lazy_import("colorsys")
+
+            with patch.object(colorsys, "rgb_to_hsv", return_value="patched"):
+                assert colorsys.rgb_to_hsv(1.0, 0.0, 0.0) == "patched"
+            assert colorsys.rgb_to_hsv(1.0, 0.0, 0.0) == (0.0, 1.0, 1.0)
@@ -0,0 +1,83 @@
+"""Test file for the plant fact cache"""
+# pylint: skip-file
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from plant_facts import PlantFactCache
+
+
+def fake_fact(model, plant_name):
+    return f"{plant_name} fact"
+
+
+def fake_countries(model, plant_name):
+    return f"{plant_name} range"
+
+
+class TestPlantFactCache:
+    """Test Class for caching generated plant facts."""
+
+    @pytest.fixture
+    def path(self, tmp_path):
+        return str(tmp_path / "facts.json")
+
+    @patch("plant_facts.get_plant_countries", side_effect=fake_countries)
+    @patch("plant_facts.get_plant_fact", side_effect=fake_fact)
+    def test_generated_once_and_persisted(self, mock_fact, mock_countries, path):
+        """Test a plant is generated once and read from disk by a new cache."""
+        cache = PlantFactCache("model", path)
+
+        assert cache.get("Fern") == {"fact": "Fern fact", "countries": "Fern range"}
+        cache.get("Fern")
+        restarted = PlantFactCache("model", path)
+
+        assert restarted.get("Fern") == {"fact": "Fern fact", "countries": "Fern range"}
+        mock_fact.assert_called_once_with("model", "Fern")
+        mock_countries.assert_called_once_with("model", "Fern")
+
+    def test_calls_run_concurrently(self, path):
+        """Test the fact and native range are requested at the same time."""
+        both_started = threading.Barrier(2, timeout=5)
+
+        def slow(model, plant_name):
+            both_started.wait()
+            return plant_name
+
+        with patch("plant_facts.get_plant_fact", side_effect=slow), \
+                patch("plant_facts.get_plant_countries", side_effect=slow):
+            assert PlantFactCache("model", path).get("Rose") == \
+                {"fact": "Rose", "countries": "Rose"}
+
+    @patch("plant_facts.get_plant_countries", side_effect=fake_countries)
+    @patch("plant_facts.get_plant_fact")
+    def test_failures_not_cached(self, mock_fact, mock_countries, path):
+        """Test a failed generation is retried on the next request."""
+        mock_fact.side_effect = [Exception("429 Resource exhausted"), "Fern fact"]
+        cache = PlantFactCache("model", path)
+
+        with pytest.raises(Exception):
+            cache.get("Fern")
+
+        assert cache.get("Fern")["fact"] == "Fern fact"
+
+    @patch("plant_facts.get_plant_countries", side_effect=fake_countries)
+    @patch("plant_facts.get_plant_fact", side_effect=fake_fact)
+    def test_prewarm_skips_cached_and_survives_errors(self, mock_fact, mock_countries, path):
+        """Test prewarming generates the missing plants and carries on past failures."""
+        cache = PlantFactCache("model", path)
+        cache.get("Fern")
+        mock_fact.side_effect = [Exception("429 Resource exhausted"), "Rose fact"]
+
+        cache.prewarm(["Fern", "Cactus", "Rose"]).join(timeout=5)
+
+        assert mock_fact.call_count == 3
+        assert PlantFactCache("model", path)._facts.keys() == {"Fern", "Rose"}
+
+    def test_unreadable_file_ignored(self, path):
+        """Test a corrupt cache file starts an empty cache."""
+        with open(path, "w") as cache_file:
+            cache_file.write("{not json")
+
+        assert PlantFactCache("model", path)._facts == {}
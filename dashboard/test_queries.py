@@ -1,15 +1,17 @@
 """Test file for the db_queries.py which queries the database for dashboard"""
 # pylint: skip-file
-from os import environ
 import pandas as pd
 import pytest
 import logging
 from unittest.mock import Mock, MagicMock, patch
 from pymssql import exceptions
 
-from db_queries import (get_connection, get_cursor,
+from db_queries import (get_cursor,
                         get_archival_data, get_latest_metrics, get_plant_image_url,
-                        get_plant_countries, get_plant_fact)
+                        get_plant_countries, get_plant_fact,
+                        choose_rollup_table, get_data_versions,
+                        get_plant_history, get_metrics_since)
+from datetime import datetime, timedelta
 
 
 class TestingDBQueries:
@@ -20,105 +22,7 @@ class TestingDBQueries:
         """Mock cursor to avoid real world db connections."""
         return Mock()
 
-    @patch.dict(
-        environ,
-        {
-            "DB_HOST": "mock_value",
-            "DB_NAME": "mock_value",
-            "DB_USER": "mock_value",
-            "DB_PASSWORD": "mock_value",
-            "DB_PORT": "mock_value",
-            "SERVER": "mock_value"
-        },
-    )
-    @patch('db_queries.connect')
-    def test_get_connection_success(self, mock_connect):
-        """Test successful database connection."""
-
-        mock_connection = MagicMock()
-        mock_connect.return_value = mock_connection
-
-        connection = get_connection()
-
-        mock_connect.assert_called_once_with(
-            server='mock_value',
-            port='mock_value',
-            user='mock_value',
-            password='mock_value',
-            database='mock_value',
-            as_dict=True
-        )
-        assert connection == mock_connect.return_value
-
-    @patch.dict(
-        environ,
-        {
-            "DB_HOST": "mock_value",
-            "DB_NAME": "mock_value",
-            "DB_USER": "mock_value",
-            "DB_PASSWORD": "mock_value",
-            "DB_PORT": "mock_value",
-        },
-    )
-    @patch('db_queries.connect')
-    def test_get_connection_operational_error(self, mock_connect):
-        """Test OperationalError when database connection fails."""
-        mock_connect.side_effect = exceptions.OperationalError(
-            "Operational error occurred")
-
-        with pytest.raises(exceptions.OperationalError) as error:
-            get_connection()
-
-        mock_connect.assert_called_once_with(
-            server='mock_value',
-            port='mock_value',
-            user='mock_value',
-            password='mock_value',
-            database='mock_value',
-            as_dict=True
-        )
-        assert str(error.value) == "Operational error occurred"
-
-    @patch.dict(
-        environ,
-        {
-            "DB_HOST": "mock_value",
-            "DB_NAME": "mock_value",
-            "DB_USER": "mock_value",
-            "DB_PASSWORD": "mock_value",
-            "DB_PORT": "mock_value",
-        },)
-    @patch('db_queries.connect')
-    def test_get_connection_exception(self, mock_connect):
-        """Test General Exception when database connection fails."""
-        mock_connect.side_effect = Exception(
-            "Unexpected error while connecting to database:")
-
-        with pytest.raises(Exception) as error:
-            get_connection()
-
-        mock_connect.assert_called_once_with(
-            server='mock_value',
-            port='mock_value',
-            user='mock_value',
-            password='mock_value',
-            database='mock_value',
-            as_dict=True
-        )
-        assert str(
-            error.value) == "Unexpected error while connecting to database:"
-
-    @patch.dict(
-        environ,
-        {
-            "DB_HOST": "mock_value",
-            "DB_NAME": "mock_value",
-            "DB_USER": "mock_value",
-            "DB_PASSWORD": "mock_value",
-            "DB_PORT": "mock_value",
-        },)
-    @patch('db_queries.connect')
-    def test_get_cursor(self, mock_connect):
+    def test_get_cursor(self):
         """Test the get_cursor function returns a valid cursor."""
 
         mock_connection = MagicMock()
@@ -129,14 +33,12 @@ class TestingDBQueries:
         mock_connection.cursor.assert_called_once()
         assert cursor == mock_cursor
 
-    @patch("db_queries.connect")
     @patch("db_queries.environ", {"SCHEMA_NAME": "test_schema"})
-    def test_successful_latest_metrics(self, mock_connect):
+    def test_successful_latest_metrics(self):
         """Test that latest temp and soil metrics retrieved successfully."""
 
         mock_connection = MagicMock()
         mock_cursor = MagicMock()
-        mock_connect.return_value = mock_connection
         mock_connection.cursor.return_value.__enter__.return_value = mock_cursor
 
         mock_cursor.fetchall.return_value = [
@@ -166,14 +68,12 @@ class TestingDBQueries:
                                        "soil_moisture", "latest_time",
                                        "plant_name", "plant_id", "last_watered"}
 
-    @patch("db_queries.connect")
     @patch("db_queries.environ", {"SCHEMA_NAME": "test_schema"})
-    def test_unsuccessful_latest_metrics_operational(self, mock_connect, caplog):
+    def test_unsuccessful_latest_metrics_operational(self, caplog):
         """Test that unsuccessful retrieval is handled gracefully with Operational Error. """
 
         mock_connection = MagicMock()
         mock_cursor = MagicMock()
-        mock_connect.return_value = mock_connection
         mock_connection.cursor.return_value.__enter__.return_value = mock_cursor
 
         mock_cursor.execute.side_effect = exceptions.OperationalError(
@@ -187,14 +87,12 @@ class TestingDBQueries:
             mock_cursor.execute.assert_called_once()
             mock_cursor.fetchall.assert_not_called()
 
-    @patch("db_queries.connect")
     @patch("db_queries.environ", {"SCHEMA_NAME": "test_schema"})
-    def test_unsuccessful_latest_metrics_exception(self, mock_connect, caplog):
+    def test_unsuccessful_latest_metrics_exception(self, caplog):
         """Test that unsuccessful retrieval is handled gracefully with fallback general exception. """
 
         mock_connection = MagicMock()
         mock_cursor = MagicMock()
-        mock_connect.return_value = mock_connection
         mock_connection.cursor.return_value.__enter__.return_value = mock_cursor
 
         mock_cursor.execute.side_effect = Exception("Simulated database error")
@@ -207,14 +105,12 @@ class TestingDBQueries:
             mock_cursor.execute.assert_called_once()
             mock_cursor.fetchall.assert_not_called()
 
-    @patch("db_queries.connect")
     @patch("db_queries.environ", {"SCHEMA_NAME": "test_schema"})
-    def test_successful_archival_metrics(self, mock_connect):
+    def test_successful_archival_metrics(self):
         """Test that archival temp and soil metrics retrieved successfully."""
 
         mock_connection = MagicMock()
         mock_cursor = MagicMock()
-        mock_connect.return_value = mock_connection
         mock_connection.cursor.return_value.__enter__.return_value = mock_cursor
 
         mock_cursor.fetchall.return_value = [
@@ -231,14 +127,12 @@ class TestingDBQueries:
         assert set(result.columns) == {
             'plant_id', 'avg_soil_moisture', 'plant_name', 'avg_temperature'}
 
-    @patch("db_queries.connect")
     @patch("db_queries.environ", {"SCHEMA_NAME": "test_schema"})
-    def test_unsuccessful_archival_metrics_operational(self, mock_connect, caplog):
+    def test_unsuccessful_archival_metrics_operational(self, caplog):
         """Test that unsuccessful retrieval is handled gracefully with operational error. """
 
         mock_connection = MagicMock()
         mock_cursor = MagicMock()
-        mock_connect.return_value = mock_connection
         mock_connection.cursor.return_value.__enter__.return_value = mock_cursor
 
         mock_cursor.execute.side_effect = exceptions.OperationalError(
@@ -252,14 +146,12 @@ class TestingDBQueries:
             mock_cursor.execute.assert_called_once()
             mock_cursor.fetchall.assert_not_called()
 
-    @patch("db_queries.connect")
     @patch("db_queries.environ", {"SCHEMA_NAME": "test_schema"})
-    def test_unsuccessful_archival_exception(self, mock_connect, caplog):
+    def test_unsuccessful_archival_exception(self, caplog):
         """Test that unsuccessful retrieval is handled gracefully with fallback general error. """
 
         mock_connection = MagicMock()
         mock_cursor = MagicMock()
-        mock_connect.return_value = mock_connection
         mock_connection.cursor.return_value.__enter__.return_value = mock_cursor
 
         mock_cursor.execute.side_effect = Exception("Simulated database error")
@@ -272,14 +164,136 @@ class TestingDBQueries:
             mock_cursor.execute.assert_called_once()
             mock_cursor.fetchall.assert_not_called()
 
-    @patch("db_queries.connect")
+    @patch("db_queries.MAX_CHART_POINTS", 50)
+    @patch("db_queries.environ", {"SCHEMA_NAME": "test_schema"})
+    def test_plant_history_joins_archived_and_live(self, mock_cursor):
+        """Test rollups fill the time before the live readings and each metric is
+        downsampled to the point budget."""
+        start, end = datetime(2024, 11, 26, 12), datetime(2024, 11, 27, 12)
+        live = [{"recording_taken": datetime(2024, 11, 27, 10) + timedelta(minutes=i),
+                 "temperature": 20.0 + i % 7, "soil_moisture": 30.0} for i in range(120)]
+        archived = [{"recording_taken": datetime(2024, 11, 26, 12) + timedelta(hours=i),
+                     "temperature": 18.0, "soil_moisture": 31.0} for i in range(22)]
+        mock_cursor.fetchall.side_effect = [live, archived]
+
+        history = get_plant_history(mock_cursor, 3, start, end)
+
+        live_call, archived_call = mock_cursor.execute.call_args_list
+        assert "FROM test_schema.plant_metric\n" in live_call.args[0]
+        assert live_call.args[1] == (3, start, end)
+        assert "FROM test_schema.plant_metric_hourly" in archived_call.args[0]
+        assert archived_call.args[1] == (3, start, live[0]["recording_taken"])
+        assert list(history.columns) == ["recording_taken", "value", "metric"]
+        assert history.groupby("metric").size().to_dict() == \
+            {"soil_moisture": 50, "temperature": 50}
+        assert history["recording_taken"].min() == datetime(2024, 11, 26, 12)
+
+    @patch("db_queries.environ", {"SCHEMA_NAME": "test_schema"})
+    def test_plant_history_without_readings(self, mock_cursor):
+        """Test a plant with no readings in range has an empty history."""
+        mock_cursor.fetchall.side_effect = [[], []]
+
+        history = get_plant_history(mock_cursor, 3, datetime(2024, 11, 26),
+                                    datetime(2024, 11, 27))
+
+        assert history.empty
+        assert mock_cursor.execute.call_args_list[1].args[1][2] == datetime(2024, 11, 27)
+
+    @patch("db_queries.environ", {"SCHEMA_NAME": "test_schema"})
+    def test_plant_history_with_held_readings(self, mock_cursor):
+        """Test readings passed in by the caller replace the live query."""
+        start, end = datetime(2024, 11, 26, 12), datetime(2024, 11, 27, 12)
+        live = pd.DataFrame({
+            "plant_id": 3,
+            "recording_taken": [datetime(2024, 11, 27, 10) + timedelta(minutes=i)
+                                for i in range(10)],
+            "temperature": 20.0, "soil_moisture": 30.0})
+        mock_cursor.fetchall.return_value = [
+            {"recording_taken": datetime(2024, 11, 27, 9), "temperature": 18.0,
+             "soil_moisture": 31.0}]
+
+        history = get_plant_history(mock_cursor, 3, start, end, live)
+
+        mock_cursor.execute.assert_called_once()
+        query, params = mock_cursor.execute.call_args.args
+        assert "FROM test_schema.plant_metric_hourly" in query
+        assert params == (3, start, datetime(2024, 11, 27, 10))
+        assert history.groupby("metric").size().to_dict() == \
+            {"soil_moisture": 11, "temperature": 11}
+
+    @patch("db_queries.environ", {"SCHEMA_NAME": "test_schema"})
+    def test_successful_metrics_since(self, mock_cursor):
+        """Test only readings past the watermark are requested, oldest first."""
+        mock_cursor.fetchall.return_value = [
+            {"plant_metric_id": 8, "plant_id": 1, "recording_taken": "2024-11-27 10:00:00",
+             "temperature": 20.0, "soil_moisture": 30.0}]
+
+        readings = get_metrics_since(mock_cursor, 7, limit=100)
+
+        query, params = mock_cursor.execute.call_args.args
+        assert "SELECT TOP (100)" in query
+        assert "FROM test_schema.plant_metric" in query
+        assert "WHERE plant_metric_id > %s" in query
+        assert "ORDER BY plant_metric_id" in query
+        assert params == (7,)
+        assert readings["recording_taken"].iloc[0] == datetime(2024, 11, 27, 10)
+
+    @patch("db_queries.environ", {"SCHEMA_NAME": "test_schema"})
+    def test_metrics_since_without_new_readings(self, mock_cursor):
+        """Test no new readings give an empty frame with the delta columns."""
+        mock_cursor.fetchall.return_value = []
+
+        readings = get_metrics_since(mock_cursor, 7)
+
+        assert readings.empty
+        assert "plant_metric_id" in readings.columns
+
+    @patch("db_queries.environ", {"SCHEMA_NAME": "test_schema"})
+    def test_unsuccessful_metrics_since(self, mock_cursor, caplog):
+        """Test that unsuccessful retrieval of new readings is logged and raised."""
+        mock_cursor.execute.side_effect = Exception("Simulated database error")
+
+        with caplog.at_level(logging.ERROR):
+            with pytest.raises(Exception):
+                get_metrics_since(mock_cursor, 7)
+
+            assert "Error occurred whilst fetching new readings:" in caplog.text
+
+    @patch("db_queries.environ", {"SCHEMA_NAME": "test_schema"})
+    def test_successful_data_versions(self, mock_cursor):
+        """Test data versions are returned per table name."""
+        mock_cursor.fetchall.return_value = [
+            {"name": "plant_metric", "batch_version": 41},
+            {"name": "plants_archive", "batch_version": 3}]
+
+        assert get_data_versions(mock_cursor) == {"plant_metric": 41, "plants_archive": 3}
+        assert "FROM test_schema.etl_batch" in mock_cursor.execute.call_args.args[0]
+
+    @patch("db_queries.environ", {"SCHEMA_NAME": "test_schema"})
+    def test_unsuccessful_data_versions(self, mock_cursor, caplog):
+        """Test that unsuccessful retrieval of data versions is logged and raised."""
+        mock_cursor.execute.side_effect = Exception("Simulated database error")
+
+        with caplog.at_level(logging.ERROR):
+            with pytest.raises(Exception):
+                get_data_versions(mock_cursor)
+
+            assert "Error occurred whilst fetching data versions:" in caplog.text
+
+    def test_choose_rollup_table(self):
+        """Test the finest tier within the point budget is chosen for a range."""
+        start = datetime(2024, 11, 1)
+
+        assert choose_rollup_table(start, start + timedelta(days=7)) == "plant_metric_hourly"
+        assert choose_rollup_table(start, start + timedelta(days=90)) == "plant_metric_daily"
+        assert choose_rollup_table(start, start + timedelta(days=9000)) == "plant_metric_daily"
+
     @patch("db_queries.environ", {"SCHEMA_NAME": "test_schema"})
-    def test_successful_link(self, mock_connect):
+    def test_successful_link(self):
         """Test that archival temp and soil metrics retrieved successfully."""
 
         mock_connection = MagicMock()
         mock_cursor = MagicMock()
-        mock_connect.return_value = mock_connection
         mock_connection.cursor.return_value.__enter__.return_value = mock_cursor
 
         mock_cursor.fetchone.return_value = pd.DataFrame(
@@ -289,14 +303,12 @@ class TestingDBQueries:
         assert isinstance(result, pd.DataFrame)
         assert set(result.columns) == {'image_url'}
 
-    @patch("db_queries.connect")
     @patch("db_queries.environ", {"SCHEMA_NAME": "test_schema"})
-    def test_unsuccessful_plant_url_operational(self, mock_connect, caplog):
+    def test_unsuccessful_plant_url_operational(self, caplog):
         """Test that unsuccessful retrieval is handled gracefully with operational error. """
 
         mock_connection = MagicMock()
         mock_cursor = MagicMock()
-        mock_connect.return_value = mock_connection
         mock_connection.cursor.return_value.__enter__.return_value = mock_cursor
 
         mock_cursor.execute.side_effect = exceptions.OperationalError(
@@ -310,14 +322,12 @@ class TestingDBQueries:
             mock_cursor.execute.assert_called_once()
             mock_cursor.fetchall.assert_not_called()
 
-    @patch("db_queries.connect")
     @patch("db_queries.environ", {"SCHEMA_NAME": "test_schema"})
-    def test_unsuccessful_plant_url_exception(self, mock_connect, caplog):
+    def test_unsuccessful_plant_url_exception(self, caplog):
         """Test that unsuccessful retrieval is handled gracefully with fallback general exception. """
 
         mock_connection = MagicMock()
         mock_cursor = MagicMock()
-        mock_connect.return_value = mock_connection
         mock_connection.cursor.return_value.__enter__.return_value = mock_cursor
 
         mock_cursor.execute.side_effect = Exception("Simulated database error")
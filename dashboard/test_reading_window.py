@@ -0,0 +1,97 @@
+"""Test file for the rolling window of recent readings"""
+# pylint: skip-file
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+
+import pandas as pd
+
+from db_queries import DELTA_COLUMNS
+from reading_window import ReadingWindow
+
+START = datetime(2024, 11, 27)
+
+
+def make_readings(first_id, count, plant_id=1):
+    """Minute readings with consecutive ids."""
+    return pd.DataFrame({
+        "plant_metric_id": range(first_id, first_id + count),
+        "plant_id": plant_id,
+        "recording_taken": [START + timedelta(minutes=first_id + i) for i in range(count)],
+        "temperature": 20.0,
+        "soil_moisture": 30.0})
+
+
+def fake_source(readings):
+    """A fetch function paging through readings past the watermark."""
+    def fetch(after_id, limit):
+        return readings[readings["plant_metric_id"] > after_id].head(limit)
+    return Mock(side_effect=fetch)
+
+
+class TestReadingWindow:
+    """Test Class for the rolling reading window."""
+
+    def test_fetches_only_past_the_watermark(self):
+        """Test a new version only asks for readings after the newest held."""
+        window = ReadingWindow()
+        source = make_readings(1, 5)
+        fetch = fake_source(source)
+
+        assert window.refresh(1, fetch) == 5
+        source = pd.concat([source, make_readings(6, 3)], ignore_index=True)
+        fetch = fake_source(source)
+
+        assert window.refresh(2, fetch) == 3
+        fetch.assert_called_once_with(5, window.page_rows)
+        assert window.last_id == 8
+        assert list(window.readings["plant_metric_id"]) == list(range(1, 9))
+
+    def test_same_version_skips_fetch(self):
+        """Test refreshing with the held version costs no query."""
+        window = ReadingWindow()
+        window.refresh(1, fake_source(make_readings(1, 5)))
+        fetch = fake_source(make_readings(1, 9))
+
+        assert window.refresh(1, fetch) == 0
+        fetch.assert_not_called()
+
+    def test_pages_until_short_page(self):
+        """Test a backlog larger than a page is read in pages."""
+        window = ReadingWindow(page_rows=4)
+        fetch = fake_source(make_readings(1, 10))
+
+        assert window.refresh(1, fetch) == 10
+        assert [call.args[0] for call in fetch.call_args_list] == [0, 4, 8]
+
+    def test_trims_to_span_and_row_bound(self):
+        """Test readings older than the span or beyond the row bound are dropped."""
+        window = ReadingWindow(span=timedelta(minutes=30), max_rows=20)
+        window.refresh(1, fake_source(make_readings(1, 60)))
+
+        assert len(window.readings) == 20
+        assert window.readings["plant_metric_id"].iloc[0] == 41
+
+        window = ReadingWindow(span=timedelta(minutes=10))
+        window.refresh(1, fake_source(make_readings(1, 60)))
+
+        assert window.readings["recording_taken"].min() == START + timedelta(minutes=50)
+
+    def test_no_new_readings(self):
+        """Test a version with no new readings keeps the window unchanged."""
+        window = ReadingWindow()
+
+        assert window.refresh(1, fake_source(make_readings(1, 0))) == 0
+        assert list(window.readings.columns) == DELTA_COLUMNS
+        assert window.last_id == 0
+
+    def test_plant_readings(self):
+        """Test one plant's readings in a range are selected."""
+        window = ReadingWindow()
+        window.refresh(1, fake_source(pd.concat(
+            [make_readings(1, 10, plant_id=1), make_readings(11, 10, plant_id=2)],
+            ignore_index=True)))
+
+        readings = window.plant_readings(2, START + timedelta(minutes=12),
+                                         START + timedelta(minutes=15))
+
+        assert list(readings["plant_metric_id"]) == [12, 13, 14]
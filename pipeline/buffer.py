@@ -0,0 +1,133 @@
+"""Write-behind buffer for the load stage: accumulates plant readings in a local
+spill file and loads them in one batch once enough rows or time have built up."""
+
+from os import environ
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable
+
+import pandas as pd
+
+from load import main as load
+
+DEFAULT_FLUSH_ROWS = 1000
+DEFAULT_FLUSH_SECONDS = 300
+DATETIME_COLUMNS = ["recording_taken", "last_watered"]
+
+
+# The lock takes the settings and buffered state one over pylint's limit of seven.
+class WriteBehindBuffer:  # pylint: disable=too-many-instance-attributes
+    """Buffers readings in an append-only JSON lines spill file.
+
+    Every batch is fsynced to the spill file before `add` returns, so readings
+    survive a crash and are picked up again by the next buffer on the same path.
+    The file is only cleared after the load succeeds, so delivery is at-least-once.
+    Adding and flushing are serialised, so the extract loop can flush a due
+    buffer while the writer thread adds to it."""
+
+    def __init__(self, spill_path: str, flush_rows: int = DEFAULT_FLUSH_ROWS,
+                 flush_seconds: float = DEFAULT_FLUSH_SECONDS,
+                 load_batch: Callable[[pd.DataFrame], None] = load,
+                 clock: Callable[[], float] = time.time) -> None:
+        self.spill_path = spill_path
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self._load_batch = load_batch
+        self._clock = clock
+        self.buffered_rows = 0
+        self.oldest_buffered_at = None
+        self._lock = threading.RLock()
+        self._recover()
+
+    @classmethod
+    def from_environ(cls) -> "WriteBehindBuffer":
+        """Creates a buffer from LOAD_BUFFER_* variables, or None if buffering is off."""
+        spill_path = environ.get("LOAD_BUFFER_PATH")
+        if not spill_path:
+            return None
+        return cls(spill_path,
+                   flush_rows=int(environ.get(
+                       "LOAD_BUFFER_ROWS", DEFAULT_FLUSH_ROWS)),
+                   flush_seconds=float(environ.get(
+                       "LOAD_BUFFER_SECONDS", DEFAULT_FLUSH_SECONDS)))
+
+    def _recover(self) -> None:
+        """Counts readings left in the spill file by a previous run."""
+        if not os.path.exists(self.spill_path):
+            return
+        with open(self.spill_path, encoding="utf-8") as spill:
+            for line in spill:
+                if not line.strip():
+                    continue
+                if self.oldest_buffered_at is None:
+                    self.oldest_buffered_at = json.loads(line)["buffered_at"]
+                self.buffered_rows += 1
+        if self.buffered_rows:
+            logging.info("Recovered %s buffered readings from %s.",
+                         self.buffered_rows, self.spill_path)
+
+    def is_due(self) -> bool:
+        """Whether the buffer has reached its row count or age limit."""
+        if not self.buffered_rows:
+            return False
+        age = self._clock() - self.oldest_buffered_at
+        return self.buffered_rows >= self.flush_rows or age >= self.flush_seconds
+
+    def add(self, plant_metrics: pd.DataFrame) -> bool:
+        """Appends a batch to the spill file and flushes if the buffer is due.
+        Returns True if a flush happened."""
+        with self._lock:
+            now = self._clock()
+            records = plant_metrics.to_dict(orient="records")
+            with open(self.spill_path, "a", encoding="utf-8") as spill:
+                for record in records:
+                    spill.write(json.dumps({"buffered_at": now, "reading": record},
+                                           default=str) + "\n")
+                spill.flush()
+                os.fsync(spill.fileno())
+
+            if records and self.oldest_buffered_at is None:
+                self.oldest_buffered_at = now
+            self.buffered_rows += len(records)
+            return self.flush_if_due()
+
+    def flush_if_due(self) -> bool:
+        """Flushes if the buffer has reached its row count or age limit. Called
+        on every tick of the extract loop as well as after each add, so the age
+        limit holds even while no new batches arrive. Returns True if a flush
+        happened."""
+        with self._lock:
+            if not self.is_due():
+                return False
+            self.flush()
+            return True
+
+    def read_buffered(self) -> pd.DataFrame:
+        """Reads every buffered reading back into a dataframe."""
+        if not os.path.exists(self.spill_path):
+            return pd.DataFrame()
+        with open(self.spill_path, encoding="utf-8") as spill:
+            readings = [json.loads(line)["reading"]
+                        for line in spill if line.strip()]
+        buffered = pd.DataFrame(readings)
+        for column in DATETIME_COLUMNS:
+            if column in buffered:
+                buffered[column] = pd.to_datetime(buffered[column])
+        return buffered
+
+    def flush(self) -> None:
+        """Loads every buffered reading in one batch, then clears the spill file."""
+        with self._lock:
+            if not self.buffered_rows:
+                return
+            buffered = self.read_buffered()
+            logging.info("Flushing %s buffered readings.", len(buffered))
+            self._load_batch(buffered)
+
+            with open(self.spill_path, "w", encoding="utf-8") as spill:
+                os.fsync(spill.fileno())
+            self.buffered_rows = 0
+            self.oldest_buffered_at = None
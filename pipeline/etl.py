@@ -3,25 +3,41 @@
 # pylint: disable=broad-exception-caught
 # pylint: disable=line-too-long
 
+from os import environ
 import asyncio
+import logging
+import signal
+import threading
+import time
 import pandas as pd
 
 from dotenv import load_dotenv
-from extract import fetch_and_collect_data
+from extract import collect_all_plant_data
 from transform import main as transform
 from load import main as load
+from writer import BackgroundWriter, DEFAULT_QUEUE_SIZE
+from buffer import WriteBehindBuffer
+
+ETL_INTERVAL_SECONDS = 60
+
+
+def extract_and_transform() -> pd.DataFrame:
+    """Extracts the latest readings from the API and cleans them."""
+    extracted_plants_metrics = pd.DataFrame(
+        asyncio.run(collect_all_plant_data()))
+
+    return transform(extracted_plants_metrics)
 
 
 def lambda_handler(event, context):
-    """Runs the ETL pipeline when the lambda is invoked"""
+    """Runs the ETL pipeline when the lambda is invoked. Each batch is loaded
+    straight away: a Lambda's /tmp spill file is private to one container and
+    lost when it is reaped, so the write-behind buffer is not durable here."""
     try:
 
         load_dotenv()
 
-        extracted_plants_metrics = pd.DataFrame(
-            asyncio.run(fetch_and_collect_data()))
-
-        cleaned_plant_metrics = transform(extracted_plants_metrics)
+        cleaned_plant_metrics = extract_and_transform()
 
         load(cleaned_plant_metrics)
         return {
@@ -33,3 +49,42 @@ def lambda_handler(event, context):
             "statusCode": 500,
             "body": f"An unexpected error occurred: {e}"
         }
+
+
+def run_continuously(stop: threading.Event) -> None:
+    """Runs the ETL on a fixed cadence until stopped. Each batch is loaded on a
+    background writer thread, so the next extract overlaps the database write.
+    A write-behind buffer is checked every tick, so readings are flushed within
+    LOAD_BUFFER_SECONDS even while extracts fail or return nothing."""
+    interval = float(environ.get("ETL_INTERVAL_SECONDS", ETL_INTERVAL_SECONDS))
+    queue_size = int(environ.get("LOAD_QUEUE_SIZE", DEFAULT_QUEUE_SIZE))
+    buffer = WriteBehindBuffer.from_environ()
+    load_batch = buffer.add if buffer else load
+
+    with BackgroundWriter(load_batch=load_batch, max_pending=queue_size) as writer:
+        while not stop.is_set():
+            started = time.monotonic()
+            try:
+                writer.submit(extract_and_transform())
+            except Exception as e:
+                logging.error("ETL run failed: %s", e)
+            if buffer:
+                try:
+                    buffer.flush_if_due()
+                except Exception as e:
+                    logging.error("Flushing the load buffer failed: %s", e)
+            stop.wait(max(0.0, interval - (time.monotonic() - started)))
+        logging.info("Stopping ETL, waiting for pending loads to finish.")
+
+    if buffer:
+        buffer.flush()
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    try:
+        run_continuously(stop_event)
+    except KeyboardInterrupt:
+        stop_event.set()
@@ -1,40 +1,18 @@
 # pylint: disable = no-name-in-module
 
-from os import environ
 import logging
 from dotenv import load_dotenv
 import pandas as pd
-from pymssql import connect, Connection, exceptions
+from pymssql import Connection, Cursor, exceptions
+
+from watering import record_watering_events
+from plantdb import (get_backend, pooled_connection, bump_data_version,
+                     METRIC_VERSION, OPERATIONAL_ERRORS)
 
 logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(levelname)s - %(message)s')
 
 
-def get_connection() -> Connection:
-    """Connects to Microsoft SQL Server Database"""
-    logging.info("Attempting to connect to the database.")
-    try:
-        conn = connect(
-            server=environ["DB_HOST"],
-            port=environ["DB_PORT"],
-            user=environ["DB_USER"],
-            password=environ["DB_PASSWORD"],
-            database=environ["DB_NAME"],
-            as_dict=True
-        )
-        logging.info("Database connection successful.")
-        return conn
-    except KeyError as e:
-        logging.error("%s missing from environment variables.", e)
-        raise
-    except exceptions.OperationalError as e:
-        logging.error("Error connecting to database: %s", e)
-        raise
-    except Exception as e:
-        logging.error("Unexpected error while connecting to database: %s", e)
-        raise
-
-
 def get_botanists_details(connection: Connection, names: list) -> dict:
     """Fetches botanist IDs for a list of names."""
     logging.info("Fetching botanist IDs for names: %s", names)
@@ -73,9 +51,13 @@ def insert_plant_metric(conn: Connection, metric_df: pd.DataFrame, botanist_deta
         try:
             with conn.cursor() as cur:
                 cur.executemany(query, data_to_insert)
+                events = record_watering_events(cur, metric_df)
+                update_latest_readings(cur, metric_df, botanist_details)
+                bump_data_version(cur, METRIC_VERSION, len(data_to_insert))
                 conn.commit()
                 logging.info(
                     "Inserted %s rows into the plant_metric table.", len(data_to_insert))
+                logging.info("Recorded %s watering events.", events)
         except exceptions.DatabaseError as e:
             logging.error(
                 "Database error while inserting plant metric data: %s", e)
@@ -88,12 +70,36 @@ def insert_plant_metric(conn: Connection, metric_df: pd.DataFrame, botanist_deta
         logging.warning("No data to insert into the plant_metric table.")
 
 
+def update_latest_readings(cur: Cursor, metric_df: pd.DataFrame, botanist_details: dict) -> None:
+    """Upserts the newest reading of each plant into plant_latest. Runs on the
+    insert's cursor so both land in the same transaction."""
+    query = get_backend().upsert_query(
+        "epsilon.plant_latest", ["plant_id"],
+        ["plant_id", "temperature", "soil_moisture",
+         "recording_taken", "last_watered", "botanist_id"],
+        newer_column="recording_taken")
+
+    newest = metric_df.sort_values("recording_taken").drop_duplicates(
+        "plant_id", keep="last")
+    data_to_upsert = newest.apply(
+        lambda row: (
+            row['plant_id'],
+            row['temperature'],
+            row['soil_moisture'],
+            row['recording_taken'],
+            row['last_watered'],
+            botanist_details.get(row['name'])
+        ), axis=1).tolist()
+
+    cur.executemany(query, data_to_upsert)
+
+
 def main(plant_metrics_df: pd.DataFrame):
     """ Loads the plant readings into the MS-SQL RDS database. """
     load_dotenv()
 
     try:
-        with get_connection() as conn:
+        with pooled_connection() as conn:
             botanist_names = plant_metrics_df['name'].unique().tolist()
 
             botanist_id_mapping = get_botanists_details(
@@ -102,7 +108,7 @@ def main(plant_metrics_df: pd.DataFrame):
             if botanist_id_mapping:
                 insert_plant_metric(
                     conn, plant_metrics_df, botanist_id_mapping)
-    except exceptions.OperationalError as e:
+    except OPERATIONAL_ERRORS as e:
         logging.error("Failed to connect to the database: %s", e)
         raise
     except Exception as e:
@@ -1,10 +1,20 @@
 -- Database schema code to create database tables.
+-- Indexes and later schema changes are applied on top by plantdb/migrations.py.
 
 IF NOT EXISTS (SELECT * FROM sys.schemas WHERE name = 'epsilon')
 BEGIN
     EXEC('CREATE SCHEMA epsilon');
 END;
 
+DROP TABLE IF EXISTS epsilon.schema_version;
+DROP TABLE IF EXISTS epsilon.plant_latest;
+DROP TABLE IF EXISTS epsilon.plant_metric_staging;
+DROP TABLE IF EXISTS epsilon.plant_metric_hourly;
+DROP TABLE IF EXISTS epsilon.plant_metric_daily;
+DROP TABLE IF EXISTS epsilon.archive_watermark;
+DROP TABLE IF EXISTS epsilon.watering_event;
+DROP TABLE IF EXISTS epsilon.etl_batch;
+DROP TABLE IF EXISTS epsilon.plant_archive_summary;
 DROP TABLE IF EXISTS epsilon.plant_metric;
 DROP TABLE IF EXISTS epsilon.botanist;
 DROP TABLE IF EXISTS epsilon.plants_archive;
@@ -0,0 +1,112 @@
+"""Test file for the write-behind load buffer"""
+# pylint: skip-file
+
+import os
+import pytest
+import pandas as pd
+from unittest.mock import MagicMock, patch
+
+from buffer import WriteBehindBuffer
+
+
+class TestWriteBehindBuffer():
+    """ Test class containing write-behind buffer tests """
+
+    @pytest.fixture
+    def mock_df(self):
+        return pd.DataFrame({
+            'name': ['Alice', 'Bob'],
+            'temperature': ['22.00', '24.00'],
+            'soil_moisture': ['50.00', '55.00'],
+            'recording_taken': pd.to_datetime(['2024-11-27 10:00:00', '2024-11-27 10:00:01']),
+            'last_watered': pd.to_datetime(['2024-11-25 09:00:00', '2024-11-26 09:00:00']),
+            'plant_id': [1, 2]
+        })
+
+    @pytest.fixture
+    def spill_path(self, tmp_path):
+        return str(tmp_path / "plant_metric_buffer.jsonl")
+
+    def test_flushes_when_row_limit_reached(self, mock_df, spill_path):
+        """Tests readings are held until the row limit, then loaded in one batch."""
+        mock_load = MagicMock()
+        buffer = WriteBehindBuffer(spill_path, flush_rows=4,
+                                   flush_seconds=600, load_batch=mock_load)
+
+        assert buffer.add(mock_df) is False
+        mock_load.assert_not_called()
+
+        assert buffer.add(mock_df) is True
+        mock_load.assert_called_once()
+        assert len(mock_load.call_args[0][0]) == 4
+        assert buffer.buffered_rows == 0
+        assert os.path.getsize(spill_path) == 0
+
+    def test_flushes_when_age_limit_reached(self, mock_df, spill_path):
+        """Tests readings are flushed once the oldest one is older than the lag."""
+        clock = MagicMock(side_effect=[1000.0, 1000.0, 1061.0, 1061.0])
+        mock_load = MagicMock()
+        buffer = WriteBehindBuffer(spill_path, flush_rows=100, flush_seconds=60,
+                                   load_batch=mock_load, clock=clock)
+
+        assert buffer.add(mock_df) is False
+        assert buffer.add(mock_df) is True
+        mock_load.assert_called_once()
+
+    def test_flushes_when_due_without_new_batches(self, mock_df, spill_path):
+        """Tests a buffer past its age limit is flushed by the loop's tick even
+        when no further batch is added."""
+        now = [1000.0]
+        mock_load = MagicMock()
+        buffer = WriteBehindBuffer(spill_path, flush_rows=100, flush_seconds=60,
+                                   load_batch=mock_load, clock=lambda: now[0])
+        buffer.add(mock_df)
+
+        now[0] = 1030.0
+        assert buffer.flush_if_due() is False
+        now[0] = 1060.0
+        assert buffer.flush_if_due() is True
+        mock_load.assert_called_once()
+        assert buffer.buffered_rows == 0
+
+    def test_recovers_spilled_readings(self, mock_df, spill_path):
+        """Tests a new buffer picks up readings a previous run left behind."""
+        WriteBehindBuffer(spill_path, flush_rows=100,
+                          load_batch=MagicMock()).add(mock_df)
+
+        mock_load = MagicMock()
+        recovered = WriteBehindBuffer(spill_path, load_batch=mock_load)
+        assert recovered.buffered_rows == 2
+
+        recovered.flush()
+        loaded = mock_load.call_args[0][0]
+        assert list(loaded['plant_id']) == [1, 2]
+        assert list(loaded['temperature']) == ['22.00', '24.00']
+        assert loaded['recording_taken'].iloc[1] == pd.Timestamp(
+            '2024-11-27 10:00:01')
+
+    def test_failed_flush_keeps_readings(self, mock_df, spill_path):
+        """Tests the spill file is kept when the load fails."""
+        buffer = WriteBehindBuffer(spill_path, flush_rows=1,
+                                   load_batch=MagicMock(side_effect=Exception("DB down")))
+
+        with pytest.raises(Exception):
+            buffer.add(mock_df)
+
+        assert buffer.buffered_rows == 2
+        assert WriteBehindBuffer(spill_path).buffered_rows == 2
+
+    @patch.dict(os.environ, {}, clear=True)
+    def test_from_environ_disabled_without_path(self):
+        """Tests buffering is off unless a spill path is configured."""
+        assert WriteBehindBuffer.from_environ() is None
+
+    def test_from_environ(self, spill_path):
+        """Tests the buffer limits are read from the environment."""
+        with patch.dict(os.environ, {"LOAD_BUFFER_PATH": spill_path,
+                                     "LOAD_BUFFER_ROWS": "500",
+                                     "LOAD_BUFFER_SECONDS": "120"}):
+            buffer = WriteBehindBuffer.from_environ()
+
+        assert buffer.flush_rows == 500
+        assert buffer.flush_seconds == 120
@@ -8,7 +8,8 @@ import logging
 from unittest.mock import patch, MagicMock
 from pymssql import exceptions
 
-from load import get_connection, get_botanists_details, insert_plant_metric, main
+from load import (get_botanists_details, insert_plant_metric,
+                  update_latest_readings, main)
 
 
 class TestLoadPlantData():
@@ -36,63 +37,12 @@ class TestLoadPlantData():
             'plant_id': [1]
         })
 
-    @patch.dict(
-        os.environ,
-        {
-            "DB_HOST": "mock_value",
-            "DB_NAME": "mock_value",
-            "DB_USER": "mock_value",
-            "DB_PASSWORD": "mock_value",
-            "DB_PORT": "mock_value",
-            "SERVER": "mock_value"
-        },
-    )
-    @patch('load.connect')
-    def test_get_connection_success(self, mock_connect):
-        """Test successful database connection."""
-
-        mock_connection = MagicMock()
-        mock_connect.return_value = mock_connection
-
-        connection = get_connection()
-
-        mock_connect.assert_called_once_with(
-            server='mock_value',
-            port='mock_value',
-            user='mock_value',
-            password='mock_value',
-            database='mock_value',
-            as_dict=True
-        )
-        assert connection == mock_connect.return_value
-
-    @patch.dict(
-        os.environ,
-        {
-            "DB_HOST": "mock_value",
-            "DB_NAME": "mock_value",
-            "DB_USER": "mock_value",
-            "DB_PASSWORD": "mock_value",
-            "DB_PORT": "mock_value",
-        },
-    )
-    @patch('load.connect')
-    def test_get_connection_operational_error(self, mock_connect):
-        """Test OperationalError when database connection fails."""
-        mock_connect.side_effect = exceptions.OperationalError(
-            "Operational error occurred")
-
-        with pytest.raises(exceptions.OperationalError) as error:
-            get_connection()
-
-    @patch('load.connect')
-    def test_get_botanists_id_mapping_successful(self, mock_connect):
+    def test_get_botanists_id_mapping_successful(self):
         """Tests if the botanists details are successfully retrieved."""
         mock_connection = MagicMock()
 
         mock_connection = MagicMock()
         mock_cursor = MagicMock()
-        mock_connect.return_value = mock_connection
         mock_connection.cursor.return_value.__enter__.return_value = mock_cursor
         mock_cursor.fetchall.return_value = [
             {'botanist_id': 1, 'full_name': 'Alice'},
@@ -102,14 +52,12 @@ class TestLoadPlantData():
 
         assert result == {'Alice': 1, 'Bob': 2}
 
-    @patch('load.connect')
-    def test_get_botanists_id_mapping_unsuccessful(self, mock_connect):
+    def test_get_botanists_id_mapping_unsuccessful(self):
         """Tests to see if None is returned for invalid botanist names"""
         mock_connection = MagicMock()
 
         mock_connection = MagicMock()
         mock_cursor = MagicMock()
-        mock_connect.return_value = mock_connection
         mock_connection.cursor.return_value.__enter__.return_value = mock_cursor
         mock_cursor.fetchall.return_value = None
         result = get_botanists_details(mock_connection, ['', ''])
@@ -129,13 +77,11 @@ class TestLoadPlantData():
         with pytest.raises(exceptions.DatabaseError) as error:
             get_botanists_details(mock_connection, names)
 
-    @patch('load.connect')
-    def test_insert_plant_metric_successful(self, mock_connect, mock_df):
+    def test_insert_plant_metric_successful(self, mock_df):
         """Tests whether the plant metric data is successfully inserted via mocking"""
         mock_connection = MagicMock()
         mock_cursor = MagicMock()
 
-        mock_connect.return_value = mock_connection
 
         mock_connection.cursor.return_value.__enter__.return_value = mock_cursor
 
@@ -148,7 +94,7 @@ class TestLoadPlantData():
             (24, 55, '2024-11-27', '2024-11-26', 2, 2)
         ]
 
-        mock_cursor.executemany.assert_called_once_with(
+        mock_cursor.executemany.assert_any_call(
             """INSERT INTO epsilon.plant_metric (temperature, soil_moisture,
                 recording_taken, last_watered, botanist_id, plant_id) 
                 VALUES (%s, %s, %s, %s, %s, %s)""",
@@ -156,13 +102,87 @@ class TestLoadPlantData():
         )
         mock_connection.commit.assert_called_once()
 
-    @patch('load.connect')
-    def test_insert_plant_metric_empty_df(self, mock_connect, caplog):
+    @patch.dict(os.environ, {"DB_BACKEND": "mssql"})
+    def test_insert_plant_metric_updates_latest(self, mock_df):
+        """Tests plant_latest is upserted before the insert is committed."""
+        mock_connection = MagicMock()
+        mock_cursor = MagicMock()
+        mock_connection.cursor.return_value.__enter__.return_value = mock_cursor
+        mock_cursor.fetchall.return_value = []
+        mock_cursor.executemany.side_effect = lambda *args: \
+            mock_connection.commit.assert_not_called()
+
+        insert_plant_metric(mock_connection, mock_df, {'Alice': 1, 'Bob': 2})
+
+        upsert_query, upsert_rows = mock_cursor.executemany.call_args_list[-1][0]
+        assert upsert_query.startswith("MERGE epsilon.plant_latest")
+        assert upsert_rows == [
+            (1, 22, 50, '2024-11-27', '2024-11-25', 1),
+            (2, 24, 55, '2024-11-27', '2024-11-26', 2)
+        ]
+        mock_connection.commit.assert_called_once()
+
+    @patch.dict(os.environ, {"DB_BACKEND": "mssql"})
+    def test_insert_plant_metric_bumps_data_version(self, mock_df):
+        """Tests the load bumps the plant_metric version before the commit."""
+        mock_connection = MagicMock()
+        mock_cursor = MagicMock()
+        mock_connection.cursor.return_value.__enter__.return_value = mock_cursor
+        mock_cursor.fetchall.return_value = []
+        mock_cursor.execute.side_effect = lambda *args: \
+            mock_connection.commit.assert_not_called()
+
+        insert_plant_metric(mock_connection, mock_df, {'Alice': 1, 'Bob': 2})
+
+        version_query, version_params = mock_cursor.execute.call_args_list[-1][0]
+        assert "UPDATE epsilon.etl_batch" in version_query
+        assert version_params == (2, "plant_metric")
+        mock_connection.commit.assert_called_once()
+
+    @patch.dict(os.environ, {"DB_BACKEND": "mssql"})
+    def test_insert_plant_metric_records_waterings(self, mock_df):
+        """Tests new watering events are inserted before the commit, and before
+        plant_latest, which they are compared with, is upserted."""
+        mock_connection = MagicMock()
+        mock_cursor = MagicMock()
+        mock_connection.cursor.return_value.__enter__.return_value = mock_cursor
+        mock_cursor.fetchall.return_value = [
+            {'plant_id': 1, 'recording_taken': '2024-11-26', 'last_watered': '2024-11-20'},
+            {'plant_id': 2, 'recording_taken': '2024-11-26', 'last_watered': '2024-11-20'}]
+        mock_cursor.executemany.side_effect = lambda *args: \
+            mock_connection.commit.assert_not_called()
+
+        insert_plant_metric(mock_connection, mock_df, {'Alice': 1, 'Bob': 2})
+
+        event_query, event_rows = mock_cursor.executemany.call_args_list[1][0]
+        assert "epsilon.watering_event" in event_query
+        assert "plant_latest" in mock_cursor.executemany.call_args_list[2][0][0]
+        assert [(row[0], str(row[1].date())) for row in event_rows] == \
+            [(1, '2024-11-25'), (2, '2024-11-26')]
+        mock_connection.commit.assert_called_once()
+
+    def test_update_latest_readings_keeps_newest_per_plant(self):
+        """Tests only the newest reading of each plant is upserted."""
+        mock_cursor = MagicMock()
+        metric_df = pd.DataFrame({
+            'name': ['Alice', 'Alice', 'Bob'],
+            'temperature': [20, 21, 24],
+            'soil_moisture': [50, 51, 55],
+            'recording_taken': pd.to_datetime(['2024-11-27 10:01', '2024-11-27 10:00', '2024-11-27 10:00']),
+            'last_watered': ['2024-11-25', '2024-11-25', '2024-11-26'],
+            'plant_id': [1, 1, 2]
+        })
+
+        update_latest_readings(mock_cursor, metric_df, {'Alice': 1, 'Bob': 2})
+
+        upsert_rows = mock_cursor.executemany.call_args[0][1]
+        assert [(row[0], row[1]) for row in upsert_rows] == [(2, 24), (1, 20)]
+
+    def test_insert_plant_metric_empty_df(self, caplog):
         """Tests to see if the correct logging is raised if there is no data to insert."""
         mock_connection = MagicMock()
         mock_cursor = MagicMock()
 
-        mock_connect.return_value = mock_connection
 
         mock_connection.cursor.return_value.__enter__.return_value = mock_cursor
 
@@ -177,9 +197,9 @@ class TestLoadPlantData():
         assert "No data to insert into the plant_metric table." in caplog.text
         mock_connection.cursor.assert_not_called()
 
-    @patch('load.connect')
-    def test_insert_plant_metric_database_error(self, mock_connection, mock_df_2):
+    def test_insert_plant_metric_database_error(self, mock_df_2):
         """Test DatabaseError during plant metric insertion."""
+        mock_connection = MagicMock()
         mock_cursor = MagicMock()
         mock_connection.cursor.return_value.__enter__.return_value = mock_cursor
 
@@ -190,9 +210,9 @@ class TestLoadPlantData():
         with pytest.raises(exceptions.DatabaseError) as error:
             insert_plant_metric(mock_connection, mock_df_2, botanist_details)
 
-    @patch('load.connect')
-    def test_insert_plant_unexpected_error(self, mock_connection, mock_df_2):
+    def test_insert_plant_unexpected_error(self, mock_df_2):
         """Test unexpected exception during execution."""
+        mock_connection = MagicMock()
 
         mock_cursor = MagicMock()
         mock_connection.cursor.return_value.__enter__.return_value = mock_cursor
@@ -206,41 +226,41 @@ class TestLoadPlantData():
 
     @patch('load.get_botanists_details')
     @patch('load.insert_plant_metric')
-    @patch('load.get_connection')
+    @patch('load.pooled_connection')
     @patch('load.load_dotenv')
-    def test_main_success(self, mock_load_dotenv, mock_get_connection, mock_insert_plant_metric, mock_get_botanists_details, mock_df):
+    def test_main_success(self, mock_load_dotenv, mock_pooled_connection, mock_insert_plant_metric, mock_get_botanists_details, mock_df):
         """Test successful execution of the main function."""
         mock_connection = MagicMock()
-        mock_get_connection.return_value.__enter__.return_value = mock_connection
+        mock_pooled_connection.return_value.__enter__.return_value = mock_connection
 
         mock_get_botanists_details.return_value = {"Alice": 1, "Bob": 2}
 
         main(mock_df)
 
         mock_load_dotenv.assert_called_once()
-        mock_get_connection.assert_called_once()
+        mock_pooled_connection.assert_called_once()
         mock_get_botanists_details.assert_called_once_with(
             mock_connection, ["Alice", "Bob"])
         mock_insert_plant_metric.assert_called_once_with(
             mock_connection, mock_df, {"Alice": 1, "Bob": 2})
 
-    @patch('load.get_connection')
+    @patch('load.pooled_connection')
     @patch('load.load_dotenv')
-    def test_main_connection_error(self, mock_load_dotenv, mock_get_connection, mock_df):
+    def test_main_connection_error(self, mock_load_dotenv, mock_pooled_connection, mock_df):
         """Test OperationalError during database connection."""
 
-        mock_get_connection.side_effect = exceptions.OperationalError(
+        mock_pooled_connection.side_effect = exceptions.OperationalError(
             "Connection failed")
 
         with pytest.raises(exceptions.OperationalError) as error:
             main(mock_df)
 
-    @patch('load.get_connection')
+    @patch('load.pooled_connection')
     @patch('load.load_dotenv')
-    def test_main_unexpected_error(self, mock_load_dotenv, mock_get_connection, mock_df):
+    def test_main_unexpected_error(self, mock_load_dotenv, mock_pooled_connection, mock_df):
         """Test unexpected exception during execution."""
 
-        mock_get_connection.side_effect = Exception(
+        mock_pooled_connection.side_effect = Exception(
             "Unexpected error occurred")
 
         with pytest.raises(Exception) as error:
@@ -0,0 +1,128 @@
+"""Test file for watering event detection"""
+# pylint: skip-file
+
+import os
+from unittest.mock import patch
+
+import pandas as pd
+
+from load import update_latest_readings
+from watering import detect_watering_events, record_watering_events, get_jitter
+
+JITTER = pd.Timedelta(seconds=60)
+NO_HISTORY = pd.DataFrame(columns=["recording_taken", "last_watered"],
+                          index=pd.Index([], name="plant_id"))
+
+
+def make_readings(rows: list[tuple]) -> pd.DataFrame:
+    return pd.DataFrame(rows, columns=["plant_id", "recording_taken", "last_watered"])
+
+
+def make_latest(rows: dict) -> pd.DataFrame:
+    return pd.DataFrame.from_dict(
+        {plant_id: (pd.Timestamp(taken), pd.Timestamp(watered))
+         for plant_id, (taken, watered) in rows.items()},
+        orient="index", columns=["recording_taken", "last_watered"])
+
+
+def load_readings(cur, readings: pd.DataFrame) -> int:
+    """Records the events, then upserts plant_latest, as the load does."""
+    events = record_watering_events(cur, readings)
+    update_latest_readings(cur, readings.assign(name="Carl Linnaeus", temperature=20.0,
+                                                soil_moisture=30.0),
+                           {"Carl Linnaeus": 1})
+    return events
+
+
+class TestDetectWateringEvents:
+    """Test class for finding waterings in a batch of readings."""
+
+    def test_plant_without_history(self):
+        """Tests a plant's first reading is not a watering, as there is nothing
+        to compare it with, but later jumps in the same batch are."""
+        readings = make_readings([(1, "2024-11-27 10:01:00", "2024-11-27 08:00:00"),
+                                  (1, "2024-11-27 10:00:00", "2024-11-27 08:00:00"),
+                                  (1, "2024-11-27 10:02:00", "2024-11-27 10:01:30")])
+
+        events = detect_watering_events(readings, NO_HISTORY, JITTER)
+
+        assert events.to_dict("records") == [
+            {"plant_id": 1, "watered_at": pd.Timestamp("2024-11-27 10:01:30"),
+             "detected_at": pd.Timestamp("2024-11-27 10:02:00")}]
+
+    def test_clock_jitter_is_not_a_watering(self):
+        """Tests last_watered values within the jitter of the one before are ignored."""
+        readings = make_readings([(1, "2024-11-27 10:00:00", "2024-11-27 08:00:20"),
+                                  (1, "2024-11-27 10:01:00", "2024-11-27 07:59:50"),
+                                  (1, "2024-11-27 10:02:00", "2024-11-27 08:00:40")])
+        latest = make_latest({1: ("2024-11-27 09:59:00", "2024-11-27 08:00:00")})
+
+        assert detect_watering_events(readings, latest, JITTER).empty
+
+    def test_new_waterings_per_plant(self):
+        """Tests each jump past the jitter is an event, compared per plant."""
+        readings = make_readings([(1, "2024-11-27 10:00:00", "2024-11-27 08:00:00"),
+                                  (1, "2024-11-27 10:01:00", "2024-11-27 10:00:30"),
+                                  (2, "2024-11-27 10:00:00", "2024-11-27 09:00:00"),
+                                  (2, "2024-11-27 10:01:00", "2024-11-27 09:00:10")])
+        latest = make_latest({1: ("2024-11-27 09:59:00", "2024-11-27 08:00:00"),
+                              2: ("2024-11-27 09:59:00", "2024-11-27 06:00:00")})
+
+        events = detect_watering_events(readings, latest, JITTER)
+
+        assert events[["plant_id", "watered_at"]].values.tolist() == [
+            [1, pd.Timestamp("2024-11-27 10:00:30")],
+            [2, pd.Timestamp("2024-11-27 09:00:00")]]
+        assert events["detected_at"].tolist() == [pd.Timestamp("2024-11-27 10:01:00"),
+                                                  pd.Timestamp("2024-11-27 10:00:00")]
+
+    def test_jitter_from_environment(self):
+        """Tests WATERING_JITTER_SECONDS sets the tolerance."""
+        with patch.dict(os.environ, {"WATERING_JITTER_SECONDS": "5"}):
+            assert get_jitter() == pd.Timedelta(seconds=5)
+
+
+@patch.dict(os.environ, {"DB_BACKEND": "sqlite"})
+class TestRecordWateringEvents:
+    """Test class for storing detected waterings."""
+
+    def read_events(self, conn) -> list[dict]:
+        with conn.cursor() as cur:
+            cur.execute("""SELECT plant_id, watered_at, detected_at
+                           FROM epsilon.watering_event ORDER BY plant_id, watered_at;""")
+            return cur.fetchall()
+
+    def test_replayed_batch_adds_nothing(self, migrated_conn):
+        """Tests events are continued from plant_latest across loads, and a
+        replayed batch of readings already seen adds nothing."""
+        first = make_readings([(1, "2024-11-27 10:00:00", "2024-11-27 08:00:00"),
+                               (2, "2024-11-27 10:00:00", "2024-11-27 07:00:00")])
+        second = make_readings([(1, "2024-11-27 10:01:00", "2024-11-27 08:00:05"),
+                                (2, "2024-11-27 10:01:00", "2024-11-27 10:00:30")])
+        spanning = make_readings([(2, "2024-11-27 10:00:00", "2024-11-27 07:00:00"),
+                                  (2, "2024-11-27 10:00:30", "2024-11-27 07:00:00"),
+                                  (2, "2024-11-27 10:01:00", "2024-11-27 10:00:30")])
+
+        with migrated_conn.cursor() as cur:
+            before = len(self.read_events(migrated_conn))
+            assert load_readings(cur, first) == 0
+            assert load_readings(cur, first) == 0
+            assert load_readings(cur, second) == 1
+            assert load_readings(cur, spanning) == 0
+
+        assert self.read_events(migrated_conn)[before:] == [
+            {"plant_id": 2, "watered_at": "2024-11-27 10:00:30",
+             "detected_at": "2024-11-27 10:01:00"}]
+
+    def test_drift_is_the_same_across_batches(self, migrated_conn):
+        """Tests last_watered drifting by less than the jitter each minute is
+        never a watering, whether the readings load together or one by one."""
+        drifting = make_readings([(1, f"2024-11-27 10:0{minute}:00",
+                                   pd.Timestamp("2024-11-27 08:00:00")
+                                   + pd.Timedelta(seconds=40 * minute))
+                                  for minute in range(5)])
+
+        with migrated_conn.cursor() as cur:
+            assert detect_watering_events(drifting, NO_HISTORY, JITTER).empty
+            assert sum(load_readings(cur, drifting.iloc[[row]])
+                       for row in range(len(drifting))) == 0
@@ -0,0 +1,69 @@
+"""Test file for the background load writer"""
+# pylint: skip-file
+
+import queue
+import threading
+import pytest
+import pandas as pd
+from unittest.mock import MagicMock
+
+from writer import BackgroundWriter
+
+
+class TestBackgroundWriter():
+    """ Test class containing background writer tests """
+
+    @pytest.fixture
+    def mock_df(self):
+        return pd.DataFrame({
+            'name': ['Alice', 'Bob'],
+            'temperature': [22, 24],
+            'plant_id': [1, 2]
+        })
+
+    def test_close_flushes_pending_batches(self, mock_df):
+        """Tests every submitted batch is loaded before close returns."""
+        mock_load = MagicMock()
+
+        with BackgroundWriter(load_batch=mock_load, max_pending=5) as writer:
+            for _ in range(3):
+                writer.submit(mock_df)
+
+        assert mock_load.call_count == 3
+        assert writer.loaded_batches == 3
+        assert writer.pending == 0
+
+    def test_submit_applies_backpressure(self, mock_df):
+        """Tests submit blocks once the queue is full and the writer is busy."""
+        release = threading.Event()
+        writer = BackgroundWriter(
+            load_batch=lambda batch: release.wait(), max_pending=1)
+
+        writer.submit(mock_df)
+        writer.submit(mock_df)
+
+        with pytest.raises(queue.Full):
+            writer.submit(mock_df, timeout=0.05)
+
+        release.set()
+        writer.close()
+        assert writer.loaded_batches == 2
+
+    def test_failed_batch_does_not_stop_writer(self, mock_df):
+        """Tests a failing load is logged and later batches still load."""
+        mock_load = MagicMock(side_effect=[Exception("DB down"), None])
+
+        with BackgroundWriter(load_batch=mock_load) as writer:
+            writer.submit(mock_df)
+            writer.submit(mock_df)
+
+        assert writer.failed_batches == 1
+        assert writer.loaded_batches == 1
+
+    def test_submit_after_close_raises(self, mock_df):
+        """Tests a closed writer rejects new batches."""
+        writer = BackgroundWriter(load_batch=MagicMock())
+        writer.close()
+
+        with pytest.raises(RuntimeError):
+            writer.submit(mock_df)
@@ -0,0 +1,82 @@
+"""Detects watering events from the last_watered value of each new reading.
+
+Sensors report the time they were last watered with every reading, and their
+clocks jitter, so the same watering can come back a few seconds apart. Each load
+compares every new reading's last_watered with the one reported just before it,
+which for the first reading of a batch is the plant's row in epsilon.plant_latest.
+Only a jump of more than the jitter tolerance counts as a new watering, so the
+outcome is the same whether readings arrive in one batch or many. Readings no
+newer than plant_latest were already seen and are skipped, and a plant's very
+first reading has nothing to compare with, so it is not an event. The events go
+to epsilon.watering_event, so counts never need a rescan of plant_metric."""
+# pylint: disable=no-name-in-module
+
+from os import environ
+
+import pandas as pd
+from pymssql import Cursor
+
+DEFAULT_JITTER_SECONDS = 60
+EVENT_COLUMNS = ["plant_id", "watered_at", "detected_at"]
+LATEST_COLUMNS = ["plant_id", "recording_taken", "last_watered"]
+
+
+def get_jitter() -> pd.Timedelta:
+    """The largest last_watered change still treated as the same watering."""
+    return pd.Timedelta(seconds=float(
+        environ.get("WATERING_JITTER_SECONDS", DEFAULT_JITTER_SECONDS)))
+
+
+def get_latest_readings(cur: Cursor, plant_ids: list) -> pd.DataFrame:
+    """Returns the newest stored reading of each plant, indexed by plant_id.
+    Must run before the batch is upserted into plant_latest."""
+    cur.execute(f"""SELECT plant_id, recording_taken, last_watered
+                    FROM epsilon.plant_latest
+                    WHERE plant_id IN ({', '.join(['%s'] * len(plant_ids))});""",
+                plant_ids)
+    latest = pd.DataFrame(cur.fetchall(), columns=LATEST_COLUMNS)
+    return latest.assign(recording_taken=pd.to_datetime(latest["recording_taken"]),
+                         last_watered=pd.to_datetime(latest["last_watered"])
+                         ).set_index("plant_id")
+
+
+def detect_watering_events(readings: pd.DataFrame, latest: pd.DataFrame,
+                           jitter: pd.Timedelta) -> pd.DataFrame:
+    """Returns the new watering events in the readings, one row per plant and
+    watering with the time of the reading that first reported it."""
+    readings = readings.assign(
+        last_watered=pd.to_datetime(readings["last_watered"]),
+        recording_taken=pd.to_datetime(readings["recording_taken"]))
+    stored_taken = pd.to_datetime(readings["plant_id"].map(latest["recording_taken"]))
+    new = readings[stored_taken.isna() | (readings["recording_taken"] > stored_taken)] \
+        .drop_duplicates(["plant_id", "recording_taken"]) \
+        .sort_values(["plant_id", "recording_taken"])
+
+    # Each reading is compared with the one before it, and the first of each
+    # plant with the newest stored reading, if there is one.
+    previous = new.groupby("plant_id")["last_watered"].shift()
+    is_first = new.groupby("plant_id").cumcount() == 0
+    previous = previous.where(~is_first, pd.to_datetime(
+        new["plant_id"].map(latest["last_watered"])))
+    is_event = previous.notna() & (new["last_watered"] - previous > jitter)
+
+    events = new[is_event].rename(columns={"last_watered": "watered_at",
+                                           "recording_taken": "detected_at"})
+    return events[EVENT_COLUMNS].reset_index(drop=True)
+
+
+def record_watering_events(cur: Cursor, metric_df: pd.DataFrame) -> int:
+    """Detects the batch's watering events and inserts them. Runs on the load's
+    cursor before plant_latest is upserted, so the events commit with the
+    readings. Returns the events found."""
+    plant_ids = [int(plant_id) for plant_id in metric_df["plant_id"].unique()]
+    latest = get_latest_readings(cur, plant_ids)
+    events = detect_watering_events(metric_df, latest, get_jitter())
+    if not events.empty:
+        cur.executemany("""INSERT INTO epsilon.watering_event
+                           (plant_id, watered_at, detected_at)
+                           VALUES (%s, %s, %s)""",
+                        [(int(event.plant_id), event.watered_at.to_pydatetime(),
+                          event.detected_at.to_pydatetime())
+                         for event in events.itertuples(index=False)])
+    return len(events)
@@ -0,0 +1,84 @@
+"""Runs the load stage on a background thread so the next extract can start
+while the previous batch is still being written to the database."""
+# pylint: disable=broad-exception-caught
+
+import logging
+import queue
+import threading
+from typing import Callable
+
+import pandas as pd
+
+from load import main as load
+
+DEFAULT_QUEUE_SIZE = 2
+
+_STOP = object()
+
+
+class BackgroundWriter:
+    """Loads plant metric batches from a bounded queue on a dedicated writer thread.
+
+    `submit` blocks while the queue is full, so a slow database applies
+    backpressure to the extract loop instead of letting batches pile up in memory.
+    `close` flushes every queued batch before the thread exits."""
+
+    def __init__(self, load_batch: Callable[[pd.DataFrame], None] = load,
+                 max_pending: int = DEFAULT_QUEUE_SIZE) -> None:
+        self._load_batch = load_batch
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._closed = False
+        self.loaded_batches = 0
+        self.failed_batches = 0
+        self._thread = threading.Thread(
+            target=self._run, name="plant-metric-writer", daemon=True)
+        self._thread.start()
+
+    def __enter__(self) -> "BackgroundWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    @property
+    def pending(self) -> int:
+        """Number of batches waiting to be loaded."""
+        return self._queue.qsize()
+
+    def submit(self, plant_metrics: pd.DataFrame, timeout: float = None) -> None:
+        """Queues a batch for loading, blocking while the writer is behind.
+        Raises queue.Full if the timeout passes before there is room."""
+        if self._closed:
+            raise RuntimeError("Cannot submit to a closed writer.")
+        if self._queue.full():
+            logging.warning(
+                "Load queue is full (%s batches), waiting for the database.",
+                self._queue.maxsize)
+        self._queue.put(plant_metrics, timeout=timeout)
+
+    def close(self, timeout: float = None) -> None:
+        """Flushes the queued batches and stops the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        logging.info("Flushing %s pending load batches.", self.pending)
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logging.error("Writer thread did not finish flushing in time.")
+
+    def _run(self) -> None:
+        """Writer thread loop: loads batches until the stop marker arrives."""
+        while True:
+            batch = self._queue.get()
+            try:
+                if batch is _STOP:
+                    return
+                self._load_batch(batch)
+                self.loaded_batches += 1
+            except Exception as e:
+                self.failed_batches += 1
+                logging.error("Background load of %s rows failed: %s",
+                              len(batch), e)
+            finally:
+                self._queue.task_done()
@@ -0,0 +1,17 @@
+"""Shared database access for the pipeline, archive and dashboard."""
+
+from plantdb.backends import (StorageBackend, MSSQLBackend, SQLiteBackend,
+                              BACKENDS, get_backend)
+from plantdb.sqlite import SQLiteConnection
+from plantdb.pool import ConnectionPool, PoolExhaustedError
+from plantdb.connection import (get_connection, get_pool, pooled_connection, retry,
+                                QueryStats, QUERY_STATS, OPERATIONAL_ERRORS)
+from plantdb.data_version import bump_data_version, METRIC_VERSION, ARCHIVE_VERSION
+from plantdb.migrations import MIGRATIONS, migrate
+
+__all__ = ["StorageBackend", "MSSQLBackend", "SQLiteBackend", "BACKENDS",
+           "get_backend", "SQLiteConnection", "ConnectionPool", "PoolExhaustedError",
+           "get_connection", "get_pool", "pooled_connection", "retry", "QueryStats",
+           "QUERY_STATS", "OPERATIONAL_ERRORS",
+           "bump_data_version", "METRIC_VERSION", "ARCHIVE_VERSION",
+           "MIGRATIONS", "migrate"]
@@ -0,0 +1,164 @@
+"""Storage backends for the plant database, selected with the DB_BACKEND variable.
+
+`mssql` (the default) is the Microsoft SQL Server RDS database used in production.
+`sqlite` stores the same schema in a local file given by SQLITE_PATH, so the ETL,
+archive and dashboard data paths can be run and load-tested without SQL Server."""
+# pylint: disable=no-name-in-module
+
+from os import environ
+from pathlib import Path
+import re
+
+from pymssql import connect, Connection
+
+from plantdb.sqlite import SQLiteConnection
+
+DEFAULT_SCHEMA = "epsilon"
+DEFAULT_SQLITE_PATH = "plants.db"
+DEFAULT_LOGIN_TIMEOUT = 15
+DEFAULT_STATEMENT_TIMEOUT = 0
+SEED_SCHEMA_PATH = Path(__file__).resolve().parent.parent / \
+    "pipeline" / "schema.sql"
+SQLITE_SCHEMA_PATH = Path(__file__).resolve().parent / "schema_sqlite.sql"
+
+
+def seed_statements(schema_path: Path = SEED_SCHEMA_PATH) -> list[str]:
+    """Returns the INSERT statements that seed pipeline/schema.sql."""
+    script = re.sub(r"^\s*--.*$", "", schema_path.read_text(encoding="utf-8"),
+                    flags=re.MULTILINE)
+    return [statement.strip() for statement in script.split(";")
+            if statement.strip().upper().startswith("INSERT")]
+
+
+class StorageBackend:
+    """Interface shared by every storage backend."""
+
+    name = None
+
+    def connect(self):
+        """Opens a connection whose cursors return rows as dictionaries."""
+        raise NotImplementedError
+
+    def create_schema(self, conn) -> None:
+        """Drops and recreates the tables, then seeds the known data."""
+        raise NotImplementedError
+
+    def upsert_query(self, table: str, key_columns: list[str], columns: list[str],
+                     newer_column: str = None) -> str:
+        """Builds a single-row insert-or-update statement with %s placeholders
+        for `columns`. If newer_column is given, existing rows are only replaced
+        by rows where that column is at least as recent."""
+        raise NotImplementedError
+
+    def swap_statements(self, table: str, staging: str) -> list[str]:
+        """Statements that move every row of `table` into the empty `staging`
+        table in one transaction, as a metadata change rather than a copy."""
+        raise NotImplementedError
+
+
+class MSSQLBackend(StorageBackend):
+    """Microsoft SQL Server, configured with the DB_* variables."""
+
+    name = "mssql"
+
+    def connect(self) -> Connection:
+        return connect(
+            server=environ["DB_HOST"],
+            port=environ["DB_PORT"],
+            user=environ["DB_USER"],
+            password=environ["DB_PASSWORD"],
+            database=environ["DB_NAME"],
+            as_dict=True,
+            login_timeout=int(environ.get("DB_LOGIN_TIMEOUT", DEFAULT_LOGIN_TIMEOUT)),
+            timeout=int(environ.get("DB_STATEMENT_TIMEOUT", DEFAULT_STATEMENT_TIMEOUT))
+        )
+
+    def create_schema(self, conn: Connection) -> None:
+        raise NotImplementedError(
+            "Run pipeline/reset.sh to create the SQL Server schema.")
+
+    def upsert_query(self, table: str, key_columns: list[str], columns: list[str],
+                     newer_column: str = None) -> str:
+        updates = ", ".join(f"{column} = source.{column}"
+                            for column in columns if column not in key_columns)
+        matched = "WHEN MATCHED"
+        if newer_column:
+            matched += f" AND source.{newer_column} >= target.{newer_column}"
+        return f"""MERGE {table} WITH (HOLDLOCK) AS target
+                USING (VALUES ({", ".join(["%s"] * len(columns))}))
+                    AS source ({", ".join(columns)})
+                ON {" AND ".join(f"target.{key} = source.{key}" for key in key_columns)}
+                {matched} THEN
+                    UPDATE SET {updates}
+                WHEN NOT MATCHED THEN
+                    INSERT ({", ".join(columns)})
+                    VALUES ({", ".join(f"source.{column}" for column in columns)});"""
+
+    def swap_statements(self, table: str, staging: str) -> list[str]:
+        return [f"ALTER TABLE {table} SWITCH TO {staging};"]
+
+
+class SQLiteBackend(StorageBackend):
+    """Local SQLite file holding the same tables under the schema name."""
+
+    name = "sqlite"
+
+    def __init__(self, path: str = None, schema: str = None) -> None:
+        self.path = path or environ.get("SQLITE_PATH", DEFAULT_SQLITE_PATH)
+        self.schema = schema or environ.get("SCHEMA_NAME", DEFAULT_SCHEMA)
+
+    def connect(self) -> SQLiteConnection:
+        return SQLiteConnection(self.path, self.schema)
+
+    def create_schema(self, conn: SQLiteConnection) -> None:
+        conn.executescript(SQLITE_SCHEMA_PATH.read_text(encoding="utf-8"))
+        with conn.cursor() as cur:
+            for statement in seed_statements():
+                cur.execute(statement)
+        conn.commit()
+
+    def upsert_query(self, table: str, key_columns: list[str], columns: list[str],
+                     newer_column: str = None) -> str:
+        updates = ", ".join(f"{column} = excluded.{column}"
+                            for column in columns if column not in key_columns)
+        table_name = table.split(".")[-1]
+        condition = ""
+        if newer_column:
+            condition = ("\n                WHERE "
+                         f"excluded.{newer_column} >= {table_name}.{newer_column}")
+        return f"""INSERT INTO {table} ({", ".join(columns)})
+                VALUES ({", ".join(["%s"] * len(columns))})
+                ON CONFLICT ({", ".join(key_columns)}) DO UPDATE SET {updates}{condition};"""
+
+    def swap_statements(self, table: str, staging: str) -> list[str]:
+        schema, table_name = table.split(".")
+        staging_name = staging.split(".")[-1]
+        swap_name = f"{table_name}_swap"
+        sequence = f"{schema}.sqlite_sequence"
+        # sqlite3 autocommits DDL, so the renames need an explicit transaction.
+        # Renaming carries each table's AUTOINCREMENT counter with it, so the
+        # live table takes over the higher one and its ids keep growing.
+        return ["BEGIN IMMEDIATE;",
+                f"ALTER TABLE {table} RENAME TO {swap_name};",
+                f"ALTER TABLE {staging} RENAME TO {table_name};",
+                f"ALTER TABLE {schema}.{swap_name} RENAME TO {staging_name};",
+                f"""UPDATE {sequence} SET seq = (SELECT MAX(seq) FROM {sequence}
+                        WHERE name IN ('{table_name}', '{staging_name}'))
+                    WHERE name = '{table_name}';""",
+                f"""INSERT INTO {sequence} (name, seq)
+                    SELECT '{table_name}', seq FROM {sequence}
+                    WHERE name = '{staging_name}' AND NOT EXISTS
+                        (SELECT 1 FROM {sequence} WHERE name = '{table_name}');"""]
+
+
+BACKENDS = {backend.name: backend for backend in (MSSQLBackend, SQLiteBackend)}
+
+
+def get_backend() -> StorageBackend:
+    """Returns the backend named by DB_BACKEND, defaulting to SQL Server."""
+    name = environ.get("DB_BACKEND", MSSQLBackend.name).lower()
+    try:
+        return BACKENDS[name]()
+    except KeyError as e:
+        raise ValueError(
+            f"Unknown DB_BACKEND '{name}', expected one of {sorted(BACKENDS)}") from e
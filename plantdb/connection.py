@@ -0,0 +1,222 @@
+"""Opens the database connections used by the pipeline, archive and dashboard.
+
+Connections are retried with exponential backoff when the server refuses them,
+and their cursors time every statement. Each statement's latency and row count
+are added to QUERY_STATS, and statements slower than DB_SLOW_QUERY_MS are
+logged as warnings. Lambdas and servers check connections out of one shared
+pool, so a warm Lambda container reuses its connection between invocations."""
+# pylint: disable=no-name-in-module
+
+from os import environ
+from contextlib import contextmanager
+from time import perf_counter, sleep
+from typing import Callable, Iterator
+import logging
+import re
+import sqlite3
+import threading
+
+from pymssql import exceptions
+
+from plantdb.backends import get_backend
+from plantdb.pool import ConnectionPool
+
+DEFAULT_CONNECT_ATTEMPTS = 3
+DEFAULT_RETRY_BACKOFF_SECONDS = 0.5
+DEFAULT_SLOW_QUERY_MS = 500
+OPERATIONAL_ERRORS = (exceptions.OperationalError, sqlite3.OperationalError)
+WHITESPACE = re.compile(r"\s+")
+
+
+def retry(operation: Callable, attempts: int = None, backoff: float = None):
+    """Runs the operation, retrying it on operational errors such as a refused
+    or dropped connection. Waits backoff seconds before the first retry and
+    doubles the wait each time. Defaults come from DB_CONNECT_ATTEMPTS and
+    DB_RETRY_BACKOFF_SECONDS."""
+    if attempts is None:
+        attempts = int(environ.get("DB_CONNECT_ATTEMPTS", DEFAULT_CONNECT_ATTEMPTS))
+    if backoff is None:
+        backoff = float(environ.get("DB_RETRY_BACKOFF_SECONDS",
+                                    DEFAULT_RETRY_BACKOFF_SECONDS))
+    for attempt in range(1, attempts + 1):
+        try:
+            return operation()
+        except OPERATIONAL_ERRORS as e:
+            if attempt >= attempts:
+                raise
+            delay = backoff * 2 ** (attempt - 1)
+            logging.warning("Database unavailable (attempt %s of %s), retrying in %.1fs: %s",
+                            attempt, attempts, delay, e)
+            sleep(delay)
+    return None
+
+
+def statement_key(query: str) -> str:
+    """A statement with its whitespace collapsed, so the same query written
+    across several lines is counted together."""
+    return WHITESPACE.sub(" ", query).strip()
+
+
+class QueryStats:
+    """Thread-safe running totals of calls, time and rows per statement."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._totals = {}
+
+    def record(self, key: str, seconds: float, rows: int = 0, calls: int = 1) -> None:
+        """Adds a statement's latency and row count to the totals of its key."""
+        with self._lock:
+            totals = self._totals.setdefault(
+                key, {"calls": 0, "seconds": 0.0, "max_seconds": 0.0, "rows": 0})
+            totals["calls"] += calls
+            totals["seconds"] += seconds
+            totals["rows"] += max(rows, 0)
+            if calls:
+                totals["max_seconds"] = max(totals["max_seconds"], seconds)
+
+    def summary(self) -> list[dict]:
+        """The totals of every statement, slowest in total first."""
+        with self._lock:
+            rows = [{"statement": key, **totals} for key, totals in self._totals.items()]
+        return sorted(rows, key=lambda row: row["seconds"], reverse=True)
+
+    def reset(self) -> None:
+        """Forgets every statement."""
+        with self._lock:
+            self._totals.clear()
+
+
+QUERY_STATS = QueryStats()
+
+
+class InstrumentedCursor:
+    """Cursor that records the latency and row count of each statement it runs.
+    Rows are counted as they are fetched, or from the row count of writes."""
+
+    def __init__(self, cursor, stats: QueryStats = QUERY_STATS,
+                 slow_seconds: float = None) -> None:
+        self._cursor = cursor
+        self._stats = stats
+        self._slow_seconds = slow_seconds if slow_seconds is not None else float(
+            environ.get("DB_SLOW_QUERY_MS", DEFAULT_SLOW_QUERY_MS)) / 1000
+        self._key = None
+
+    def __enter__(self) -> "InstrumentedCursor":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self._cursor.close()
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def __getattr__(self, name: str):
+        return getattr(self._cursor, name)
+
+    def _timed(self, method: Callable, query: str, *params) -> None:
+        self._key = statement_key(query)
+        started = perf_counter()
+        try:
+            method(query, *params)
+        finally:
+            elapsed = perf_counter() - started
+            rows = self._cursor.rowcount
+            self._stats.record(self._key, elapsed, rows)
+            # Reads only report their row count once fetched.
+            affected = rows if rows >= 0 else "?"
+            logging.debug("Query took %.1fms (%s rows): %.200s",
+                          elapsed * 1000, affected, self._key)
+            if elapsed >= self._slow_seconds:
+                logging.warning("Slow query took %.1fms (%s rows): %.200s",
+                                elapsed * 1000, affected, self._key)
+
+    def _fetched(self, fetch: Callable, *args):
+        started = perf_counter()
+        result = fetch(*args)
+        if self._key is not None:
+            rows = len(result) if isinstance(result, list) else int(result is not None)
+            self._stats.record(self._key, perf_counter() - started, rows, calls=0)
+        return result
+
+    def execute(self, query: str, params=None) -> None:
+        """Executes a single statement."""
+        self._timed(self._cursor.execute, query, *([] if params is None else [params]))
+
+    def executemany(self, query: str, seq_of_params) -> None:
+        """Executes a statement once per row of parameters."""
+        self._timed(self._cursor.executemany, query, seq_of_params)
+
+    def fetchone(self):
+        """Fetches the next row, or None."""
+        return self._fetched(self._cursor.fetchone)
+
+    def fetchmany(self, size: int = 1):
+        """Fetches up to size rows."""
+        return self._fetched(self._cursor.fetchmany, size)
+
+    def fetchall(self):
+        """Fetches every remaining row."""
+        return self._fetched(self._cursor.fetchall)
+
+
+class InstrumentedConnection:
+    """Connection whose cursors are instrumented. Everything else is passed
+    through to the wrapped connection."""
+
+    def __init__(self, conn, stats: QueryStats = QUERY_STATS) -> None:
+        self._conn = conn
+        self._stats = stats
+
+    def __enter__(self) -> "InstrumentedConnection":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self._conn.close()
+
+    def __getattr__(self, name: str):
+        return getattr(self._conn, name)
+
+    def cursor(self) -> InstrumentedCursor:
+        """Creates an instrumented dictionary cursor."""
+        return InstrumentedCursor(self._conn.cursor(), self._stats)
+
+
+def get_connection() -> InstrumentedConnection:
+    """Connects to the storage backend chosen by DB_BACKEND, retrying while the
+    database is unavailable."""
+    backend = get_backend()
+    logging.info("Attempting to connect to the %s database.", backend.name)
+    try:
+        conn = retry(backend.connect)
+        logging.info("Database connection successful.")
+        return InstrumentedConnection(conn)
+    except KeyError as e:
+        logging.error("%s missing from environment variables.", e)
+        raise
+    except OPERATIONAL_ERRORS as e:
+        logging.error("Error connecting to database: %s", e)
+        raise
+    except Exception as e:
+        logging.error("Unexpected error while connecting to database: %s", e)
+        raise
+
+
+_pool = None  # pylint: disable=invalid-name
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """The connection pool shared by the whole process, created on first use."""
+    global _pool  # pylint: disable=global-statement
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool.from_environ(get_connection)
+        return _pool
+
+
+@contextmanager
+def pooled_connection() -> Iterator[InstrumentedConnection]:
+    """Checks a connection out of the shared pool for a with block."""
+    with get_pool().connection() as conn:
+        yield conn
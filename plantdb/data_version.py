@@ -0,0 +1,16 @@
+"""Data versions: one small row per table the pipeline and archive write.
+
+Each write bumps its table's version in the same transaction, so readers such as
+the dashboard can poll epsilon.etl_batch and only rerun their full queries once
+a version has changed."""
+
+METRIC_VERSION = "plant_metric"
+ARCHIVE_VERSION = "plants_archive"
+
+
+def bump_data_version(cur, name: str, rows: int) -> None:
+    """Records a new batch of `rows` rows written to the named table."""
+    cur.execute("""UPDATE epsilon.etl_batch
+                   SET batch_version = batch_version + 1, row_count = %s,
+                       loaded_at = CURRENT_TIMESTAMP
+                   WHERE name = %s;""", (rows, name))
@@ -0,0 +1,360 @@
+"""Versioned schema migrations applied on top of pipeline/schema.sql.
+
+Each migration has a version number and the statements to run on each backend.
+Applied versions are recorded in the schema_version table, so running the
+migrations again only applies the new ones.
+
+Usage: python -m plantdb.migrations [--status]"""
+# pylint: disable=broad-exception-caught
+
+import argparse
+import logging
+from typing import NamedTuple
+
+from dotenv import load_dotenv, find_dotenv
+
+from plantdb.backends import StorageBackend, get_backend
+
+
+class Migration(NamedTuple):
+    """One schema change, with the statements for each backend."""
+    version: int
+    description: str
+    statements: dict[str, list[str]]
+
+
+VERSION_TABLE = {
+    "mssql": """IF OBJECT_ID('epsilon.schema_version') IS NULL
+                    CREATE TABLE epsilon.schema_version (
+                        version INT PRIMARY KEY,
+                        description VARCHAR(200) NOT NULL,
+                        applied_at DATETIME2 NOT NULL DEFAULT SYSDATETIME()
+                    );""",
+    "sqlite": """CREATE TABLE IF NOT EXISTS epsilon.schema_version (
+                    version INT PRIMARY KEY,
+                    description VARCHAR(200) NOT NULL,
+                    applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+                );"""
+}
+
+LATEST_BACKFILL = """INSERT INTO epsilon.plant_latest (plant_id, temperature, soil_moisture,
+                        recording_taken, last_watered, botanist_id)
+                    SELECT plant_id, temperature, soil_moisture,
+                        recording_taken, last_watered, botanist_id
+                    FROM (SELECT *, ROW_NUMBER() OVER (
+                            PARTITION BY plant_id
+                            ORDER BY recording_taken DESC, plant_metric_id DESC) AS newest
+                          FROM epsilon.plant_metric) AS ranked
+                    WHERE newest = 1;"""
+
+WATERING_BACKFILL = """INSERT INTO epsilon.watering_event (plant_id, watered_at, detected_at)
+                       SELECT plant_id, last_watered, recording_taken
+                       FROM epsilon.plant_latest;"""
+
+ETL_BATCH_SEED = """INSERT INTO epsilon.etl_batch (name, batch_version, row_count)
+                    VALUES ('plant_metric', 0, 0), ('plants_archive', 0, 0);"""
+
+# plants_archive only holds a daily average per plant, so the backfilled totals
+# are approximations for rows archived before this migration: their extremes are
+# the min and max of the daily averages, which understates the real extremes,
+# and rows archived before reading_count was recorded count as a day of minute
+# readings. Totals added by later archive runs come from the readings and are
+# exact.
+SUMMARY_BACKFILL = """INSERT INTO epsilon.plant_archive_summary (plant_id, reading_count,
+                        temperature_sum, temperature_min, temperature_max,
+                        soil_moisture_sum, soil_moisture_min, soil_moisture_max,
+                        last_recorded)
+                    SELECT plant_id, SUM(COALESCE(reading_count, 1440)),
+                        SUM(avg_temperature * COALESCE(reading_count, 1440)),
+                        MIN(avg_temperature), MAX(avg_temperature),
+                        SUM(avg_soil_moisture * COALESCE(reading_count, 1440)),
+                        MIN(avg_soil_moisture), MAX(avg_soil_moisture),
+                        MAX(last_recorded)
+                    FROM epsilon.plants_archive
+                    GROUP BY plant_id;"""
+
+ROLLUP_STATISTICS = ", ".join(f"{metric}_{statistic} FLOAT NOT NULL"
+                              for metric in ("temperature", "soil_moisture")
+                              for statistic in ("min", "max", "mean", "stddev", "p50", "p95"))
+
+
+def rollup_table(table: str, timestamp_type: str, plant_table: str) -> str:
+    """Statement creating one rollup tier, keyed by plant and bucket start."""
+    return f"""CREATE TABLE epsilon.{table} (
+                plant_id SMALLINT NOT NULL,
+                bucket_start {timestamp_type} NOT NULL,
+                reading_count INT NOT NULL,
+                {ROLLUP_STATISTICS},
+                PRIMARY KEY (plant_id, bucket_start),
+                FOREIGN KEY (plant_id) REFERENCES {plant_table}(plant_id) ON DELETE CASCADE
+            );"""
+
+
+MIGRATIONS = [
+    Migration(1, "Covering indexes for latest-per-plant and per-plant archive reads", {
+        "mssql": [
+            """CREATE NONCLUSTERED INDEX ix_plant_metric_plant_recording
+                ON epsilon.plant_metric (plant_id, recording_taken)
+                INCLUDE (temperature, soil_moisture, last_watered);""",
+            """CREATE NONCLUSTERED INDEX ix_plants_archive_plant_recorded
+                ON epsilon.plants_archive (plant_id, last_recorded)
+                INCLUDE (avg_temperature, avg_soil_moisture, watered_count);"""
+        ],
+        "sqlite": [
+            """CREATE INDEX epsilon.ix_plant_metric_plant_recording
+                ON plant_metric (plant_id, recording_taken,
+                                 temperature, soil_moisture, last_watered);""",
+            """CREATE INDEX epsilon.ix_plants_archive_plant_recorded
+                ON plants_archive (plant_id, last_recorded,
+                                   avg_temperature, avg_soil_moisture, watered_count);"""
+        ]
+    }),
+    Migration(2, "plant_latest table holding the newest reading per plant", {
+        "mssql": [
+            """CREATE TABLE epsilon.plant_latest (
+                plant_id SMALLINT PRIMARY KEY,
+                temperature FLOAT NOT NULL,
+                soil_moisture FLOAT NOT NULL,
+                recording_taken DATETIME2 NOT NULL,
+                last_watered DATETIME2 NOT NULL,
+                botanist_id SMALLINT NOT NULL,
+                FOREIGN KEY (botanist_id) REFERENCES epsilon.botanist(botanist_id),
+                FOREIGN KEY (plant_id) REFERENCES epsilon.plant(plant_id)
+            );""",
+            LATEST_BACKFILL
+        ],
+        "sqlite": [
+            """CREATE TABLE epsilon.plant_latest (
+                plant_id SMALLINT PRIMARY KEY,
+                temperature FLOAT NOT NULL,
+                soil_moisture FLOAT NOT NULL,
+                recording_taken DATETIME NOT NULL,
+                last_watered DATETIME NOT NULL,
+                botanist_id SMALLINT NOT NULL,
+                FOREIGN KEY (botanist_id) REFERENCES botanist(botanist_id),
+                FOREIGN KEY (plant_id) REFERENCES plant(plant_id)
+            );""",
+            LATEST_BACKFILL
+        ]
+    }),
+    Migration(3, "plant_metric_staging table that the archive switches live readings into", {
+        "mssql": [
+            """CREATE TABLE epsilon.plant_metric_staging (
+                plant_metric_id BIGINT IDENTITY(1,1) PRIMARY KEY,
+                temperature FLOAT NOT NULL,
+                soil_moisture FLOAT NOT NULL,
+                recording_taken DATETIME2 NOT NULL,
+                last_watered DATETIME2 NOT NULL,
+                botanist_id SMALLINT NOT NULL,
+                plant_id SMALLINT NOT NULL,
+                FOREIGN KEY (botanist_id)
+                    REFERENCES epsilon.botanist(botanist_id) ON DELETE CASCADE,
+                FOREIGN KEY (plant_id) REFERENCES epsilon.plant(plant_id) ON DELETE CASCADE
+            );""",
+            """CREATE NONCLUSTERED INDEX ix_plant_metric_staging_plant_recording
+                ON epsilon.plant_metric_staging (plant_id, recording_taken)
+                INCLUDE (temperature, soil_moisture, last_watered);"""
+        ],
+        "sqlite": [
+            """CREATE TABLE epsilon.plant_metric_staging (
+                plant_metric_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                temperature FLOAT NOT NULL,
+                soil_moisture FLOAT NOT NULL,
+                recording_taken DATETIME NOT NULL,
+                last_watered DATETIME NOT NULL,
+                botanist_id SMALLINT NOT NULL,
+                plant_id SMALLINT NOT NULL,
+                FOREIGN KEY (botanist_id) REFERENCES botanist(botanist_id) ON DELETE CASCADE,
+                FOREIGN KEY (plant_id) REFERENCES plant(plant_id) ON DELETE CASCADE
+            );""",
+            """CREATE INDEX epsilon.ix_plant_metric_staging_plant_recording
+                ON plant_metric_staging (plant_id, recording_taken,
+                                         temperature, soil_moisture, last_watered);"""
+        ]
+    }),
+    Migration(4, "Hourly and daily rollup tiers of the plant readings", {
+        "mssql": [
+            rollup_table("plant_metric_hourly", "DATETIME2", "epsilon.plant"),
+            rollup_table("plant_metric_daily", "DATETIME2", "epsilon.plant")
+        ],
+        "sqlite": [
+            rollup_table("plant_metric_hourly", "DATETIME", "plant"),
+            rollup_table("plant_metric_daily", "DATETIME", "plant")
+        ]
+    }),
+    Migration(5, "Watermark table and mergeable daily archive rows for incremental archiving", {
+        "mssql": [
+            """CREATE TABLE epsilon.archive_watermark (
+                name VARCHAR(50) PRIMARY KEY,
+                plant_metric_id BIGINT NOT NULL,
+                recording_taken DATETIME2 NULL,
+                updated_at DATETIME2 NOT NULL DEFAULT SYSDATETIME()
+            );""",
+            """INSERT INTO epsilon.archive_watermark (name, plant_metric_id)
+                VALUES ('plant_metric', 0);""",
+            """ALTER TABLE epsilon.plants_archive
+                ADD archive_date DATE NULL, reading_count INT NULL, last_watered DATETIME2 NULL;""",
+            """CREATE UNIQUE NONCLUSTERED INDEX ux_plants_archive_plant_date
+                ON epsilon.plants_archive (plant_id, archive_date)
+                WHERE archive_date IS NOT NULL;"""
+        ],
+        "sqlite": [
+            """CREATE TABLE epsilon.archive_watermark (
+                name VARCHAR(50) PRIMARY KEY,
+                plant_metric_id BIGINT NOT NULL,
+                recording_taken DATETIME NULL,
+                updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+            );""",
+            """INSERT INTO epsilon.archive_watermark (name, plant_metric_id)
+                VALUES ('plant_metric', 0);""",
+            "ALTER TABLE epsilon.plants_archive ADD COLUMN archive_date DATE NULL;",
+            "ALTER TABLE epsilon.plants_archive ADD COLUMN reading_count INT NULL;",
+            "ALTER TABLE epsilon.plants_archive ADD COLUMN last_watered DATETIME NULL;",
+            """CREATE UNIQUE INDEX epsilon.ux_plants_archive_plant_date
+                ON plants_archive (plant_id, archive_date)
+                WHERE archive_date IS NOT NULL;"""
+        ]
+    }),
+    Migration(6, "watering_event table of detected waterings, seeded from plant_latest", {
+        "mssql": [
+            """CREATE TABLE epsilon.watering_event (
+                plant_id SMALLINT NOT NULL,
+                watered_at DATETIME2 NOT NULL,
+                detected_at DATETIME2 NOT NULL,
+                PRIMARY KEY (plant_id, watered_at),
+                FOREIGN KEY (plant_id) REFERENCES epsilon.plant(plant_id) ON DELETE CASCADE
+            );""",
+            """CREATE NONCLUSTERED INDEX ix_watering_event_plant_detected
+                ON epsilon.watering_event (plant_id, detected_at);""",
+            WATERING_BACKFILL
+        ],
+        "sqlite": [
+            """CREATE TABLE epsilon.watering_event (
+                plant_id SMALLINT NOT NULL,
+                watered_at DATETIME NOT NULL,
+                detected_at DATETIME NOT NULL,
+                PRIMARY KEY (plant_id, watered_at),
+                FOREIGN KEY (plant_id) REFERENCES plant(plant_id) ON DELETE CASCADE
+            );""",
+            """CREATE INDEX epsilon.ix_watering_event_plant_detected
+                ON watering_event (plant_id, detected_at);""",
+            WATERING_BACKFILL
+        ]
+    }),
+    Migration(7, "etl_batch table versioning each load and archive run", {
+        "mssql": [
+            """CREATE TABLE epsilon.etl_batch (
+                name VARCHAR(50) PRIMARY KEY,
+                batch_version BIGINT NOT NULL,
+                row_count INT NOT NULL,
+                loaded_at DATETIME2 NOT NULL DEFAULT SYSDATETIME()
+            );""",
+            ETL_BATCH_SEED
+        ],
+        "sqlite": [
+            """CREATE TABLE epsilon.etl_batch (
+                name VARCHAR(50) PRIMARY KEY,
+                batch_version BIGINT NOT NULL,
+                row_count INT NOT NULL,
+                loaded_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+            );""",
+            ETL_BATCH_SEED
+        ]
+    }),
+    Migration(8, "plant_archive_summary table of running totals per plant, "
+                 "backfilled from the archive", {
+        "mssql": [
+            """CREATE TABLE epsilon.plant_archive_summary (
+                plant_id SMALLINT PRIMARY KEY,
+                reading_count BIGINT NOT NULL,
+                temperature_sum FLOAT NOT NULL,
+                temperature_min FLOAT NOT NULL,
+                temperature_max FLOAT NOT NULL,
+                soil_moisture_sum FLOAT NOT NULL,
+                soil_moisture_min FLOAT NOT NULL,
+                soil_moisture_max FLOAT NOT NULL,
+                last_recorded DATETIME2 NOT NULL,
+                FOREIGN KEY (plant_id) REFERENCES epsilon.plant(plant_id) ON DELETE CASCADE
+            );""",
+            SUMMARY_BACKFILL
+        ],
+        "sqlite": [
+            """CREATE TABLE epsilon.plant_archive_summary (
+                plant_id SMALLINT PRIMARY KEY,
+                reading_count BIGINT NOT NULL,
+                temperature_sum FLOAT NOT NULL,
+                temperature_min FLOAT NOT NULL,
+                temperature_max FLOAT NOT NULL,
+                soil_moisture_sum FLOAT NOT NULL,
+                soil_moisture_min FLOAT NOT NULL,
+                soil_moisture_max FLOAT NOT NULL,
+                last_recorded DATETIME NOT NULL,
+                FOREIGN KEY (plant_id) REFERENCES plant(plant_id) ON DELETE CASCADE
+            );""",
+            SUMMARY_BACKFILL
+        ]
+    }),
+]
+
+
+def get_applied_versions(conn) -> set[int]:
+    """Returns the migration versions already applied to the database."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT version FROM epsilon.schema_version;")
+        return {row["version"] for row in cur.fetchall()}
+
+
+def get_pending_migrations(conn, backend: StorageBackend) -> list[Migration]:
+    """Creates the version table if needed and returns the migrations to apply."""
+    with conn.cursor() as cur:
+        cur.execute(VERSION_TABLE[backend.name])
+    conn.commit()
+
+    applied = get_applied_versions(conn)
+    return [migration for migration in MIGRATIONS if migration.version not in applied]
+
+
+def migrate(conn, backend: StorageBackend, target: int = None) -> list[int]:
+    """Applies every pending migration up to the target version, each in its
+    own transaction. Returns the versions applied."""
+    applied = []
+    for migration in get_pending_migrations(conn, backend):
+        if target is not None and migration.version > target:
+            break
+        logging.info("Applying migration %s: %s",
+                     migration.version, migration.description)
+        try:
+            with conn.cursor() as cur:
+                for statement in migration.statements[backend.name]:
+                    cur.execute(statement)
+                cur.execute("""INSERT INTO epsilon.schema_version (version, description)
+                               VALUES (%s, %s);""",
+                            (migration.version, migration.description))
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logging.error("Migration %s failed: %s", migration.version, e)
+            raise
+        applied.append(migration.version)
+
+    logging.info("Schema is at version %s.", max(
+        get_applied_versions(conn), default=0))
+    return applied
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--status", action="store_true",
+                        help="list pending migrations without applying them")
+    args = parser.parse_args()
+
+    load_dotenv(find_dotenv(usecwd=True))
+    storage = get_backend()
+    with storage.connect() as connection:
+        if args.status:
+            for pending in get_pending_migrations(connection, storage):
+                print(f"{pending.version}: {pending.description}")
+        else:
+            migrate(connection, storage)
@@ -0,0 +1,111 @@
+"""A bounded, thread-safe pool of database connections for long-running processes.
+
+Connections are opened on demand up to the pool size and reused afterwards.
+Each idle connection is validated with a trivial query before it is handed out,
+so connections dropped by the server are replaced instead of failing a request.
+Once every connection is checked out, callers wait for one to be returned."""
+# pylint: disable=broad-exception-caught
+
+from os import environ
+from contextlib import contextmanager
+import logging
+import queue
+import threading
+from typing import Callable, Iterator
+
+DEFAULT_POOL_SIZE = 5
+DEFAULT_CHECKOUT_TIMEOUT = 30
+VALIDATION_QUERY = "SELECT 1 AS ok;"
+
+
+class PoolExhaustedError(RuntimeError):
+    """Raised when no connection is returned to the pool before the timeout."""
+
+
+class ConnectionPool:
+    """Hands out at most `size` connections made by `connect` at a time."""
+
+    def __init__(self, connect: Callable, size: int = DEFAULT_POOL_SIZE,
+                 timeout: float = DEFAULT_CHECKOUT_TIMEOUT) -> None:
+        self._connect = connect
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    @classmethod
+    def from_environ(cls, connect: Callable) -> "ConnectionPool":
+        """Creates a pool sized by DB_POOL_SIZE and DB_POOL_TIMEOUT."""
+        return cls(connect,
+                   size=int(environ.get("DB_POOL_SIZE", DEFAULT_POOL_SIZE)),
+                   timeout=float(environ.get("DB_POOL_TIMEOUT", DEFAULT_CHECKOUT_TIMEOUT)))
+
+    @staticmethod
+    def is_usable(conn) -> bool:
+        """Checks the connection can still run a query."""
+        try:
+            with conn.cursor() as cur:
+                cur.execute(VALIDATION_QUERY)
+                cur.fetchone()
+            return True
+        except Exception as e:
+            logging.warning("Discarding a broken pooled connection: %s", e)
+            return False
+
+    @staticmethod
+    def _discard(conn) -> None:
+        """Closes a connection that is leaving the pool."""
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def acquire(self):
+        """Checks out a validated idle connection, or opens a new one if the
+        pool is not full. Waits up to the timeout for one to be released."""
+        # The slot is held until release() returns the connection, so it
+        # cannot be scoped to a with block here.
+        if not self._slots.acquire(timeout=self.timeout):  # pylint: disable=consider-using-with
+            raise PoolExhaustedError(
+                f"No database connection free after {self.timeout}s "
+                f"(pool size {self.size})")
+        try:
+            while True:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._connect()
+                if self.is_usable(conn):
+                    return conn
+                self._discard(conn)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn) -> None:
+        """Returns a connection to the pool, rolling back anything uncommitted
+        so the next caller starts clean."""
+        try:
+            conn.rollback()
+            self._idle.put(conn)
+        except Exception:
+            self._discard(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self) -> Iterator:
+        """Checks out a connection for the duration of a with block."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self) -> None:
+        """Closes every idle connection."""
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                return
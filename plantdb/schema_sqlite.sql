@@ -0,0 +1,64 @@
+-- SQLite version of pipeline/schema.sql, used by the local storage backend.
+-- Tables live in the attached database named after SCHEMA_NAME (epsilon).
+-- Seed data is loaded from the INSERT statements in pipeline/schema.sql.
+
+DROP TABLE IF EXISTS epsilon.schema_version;
+DROP TABLE IF EXISTS epsilon.plant_latest;
+DROP TABLE IF EXISTS epsilon.plant_metric_staging;
+DROP TABLE IF EXISTS epsilon.plant_metric_hourly;
+DROP TABLE IF EXISTS epsilon.plant_metric_daily;
+DROP TABLE IF EXISTS epsilon.archive_watermark;
+DROP TABLE IF EXISTS epsilon.watering_event;
+DROP TABLE IF EXISTS epsilon.etl_batch;
+DROP TABLE IF EXISTS epsilon.plant_archive_summary;
+DROP TABLE IF EXISTS epsilon.plant_metric;
+DROP TABLE IF EXISTS epsilon.botanist;
+DROP TABLE IF EXISTS epsilon.plants_archive;
+DROP TABLE IF EXISTS epsilon.plant;
+DROP TABLE IF EXISTS epsilon.location;
+
+CREATE TABLE epsilon.location (
+    location_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    longitude FLOAT NOT NULL,
+    latitude FLOAT NOT NULL,
+    closest_town VARCHAR(50) UNIQUE NOT NULL,
+    ISO_code VARCHAR(2) NOT NULL
+);
+
+CREATE TABLE epsilon.botanist (
+    botanist_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    full_name VARCHAR(100) UNIQUE NOT NULL,
+    email VARCHAR(100) UNIQUE NOT NULL,
+    phone VARCHAR(30) UNIQUE NOT NULL
+);
+
+CREATE TABLE epsilon.plant (
+    plant_id SMALLINT PRIMARY KEY,
+    plant_name VARCHAR(60) NOT NULL,
+    scientific_name VARCHAR(60),
+    image_url VARCHAR(500),
+    location_id INT NOT NULL,
+    FOREIGN KEY (location_id) REFERENCES location(location_id) ON DELETE CASCADE
+);
+
+CREATE TABLE epsilon.plant_metric (
+    plant_metric_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    temperature FLOAT NOT NULL,
+    soil_moisture FLOAT NOT NULL,
+    recording_taken DATETIME NOT NULL,
+    last_watered DATETIME NOT NULL,
+    botanist_id SMALLINT NOT NULL,
+    plant_id SMALLINT NOT NULL,
+    FOREIGN KEY (botanist_id) REFERENCES botanist(botanist_id) ON DELETE CASCADE,
+    FOREIGN KEY (plant_id) REFERENCES plant(plant_id) ON DELETE CASCADE
+);
+
+CREATE TABLE epsilon.plants_archive (
+    plant_archive_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    avg_temperature FLOAT NOT NULL,
+    avg_soil_moisture FLOAT NOT NULL,
+    watered_count SMALLINT NOT NULL,
+    last_recorded DATETIME NOT NULL,
+    plant_id SMALLINT NOT NULL,
+    FOREIGN KEY (plant_id) REFERENCES plant(plant_id) ON DELETE CASCADE
+);
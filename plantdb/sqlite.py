@@ -0,0 +1,131 @@
+"""SQLite connection that behaves like a pymssql connection opened with as_dict=True,
+so the pipeline, archive and dashboard queries run against it unchanged."""
+
+from datetime import date, datetime
+import re
+import sqlite3
+
+TOP_PATTERN = re.compile(r"\bSELECT\s+TOP\s*\(?\s*(\d+)\s*\)?\s", re.IGNORECASE)
+TRUNCATE_PATTERN = re.compile(r"\bTRUNCATE\s+TABLE\b", re.IGNORECASE)
+
+
+def translate(query: str) -> str:
+    """Rewrites the T-SQL used by the project into SQLite syntax.
+    Handles %s placeholders, SELECT TOP n and TRUNCATE TABLE."""
+    query = query.replace("%s", "?")
+    query = TRUNCATE_PATTERN.sub("DELETE FROM", query)
+
+    top = TOP_PATTERN.search(query)
+    if top:
+        query = TOP_PATTERN.sub("SELECT ", query, count=1).rstrip()
+        terminator = ";" if query.endswith(";") else ""
+        query = f"{query.rstrip(';')} LIMIT {top.group(1)}{terminator}"
+    return query
+
+
+def adapt(value):
+    """Converts pandas and numpy values into types sqlite3 can bind."""
+    # NaN and NaT are the only values not equal to themselves.
+    if value is None or value != value:  # pylint: disable=comparison-with-itself
+        return None
+    if hasattr(value, "to_pydatetime"):
+        value = value.to_pydatetime()
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    if isinstance(value, date):
+        return value.isoformat()
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+def adapt_params(params) -> tuple:
+    """Adapts a row of query parameters."""
+    if params is None:
+        return ()
+    if not isinstance(params, (list, tuple)):
+        params = (params,)
+    return tuple(adapt(value) for value in params)
+
+
+class SQLiteCursor:
+    """Cursor returning rows as dictionaries, like pymssql's as_dict cursors."""
+
+    def __init__(self, cursor: sqlite3.Cursor) -> None:
+        self._cursor = cursor
+
+    def __enter__(self) -> "SQLiteCursor":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    @property
+    def rowcount(self) -> int:
+        """Rows changed by the last statement."""
+        return self._cursor.rowcount
+
+    def execute(self, query: str, params=None) -> None:
+        """Executes a single statement."""
+        self._cursor.execute(translate(query), adapt_params(params))
+
+    def executemany(self, query: str, seq_of_params) -> None:
+        """Executes a statement once per row of parameters."""
+        self._cursor.executemany(translate(query),
+                                 [adapt_params(params) for params in seq_of_params])
+
+    def fetchone(self) -> dict:
+        """Fetches the next row, or None."""
+        row = self._cursor.fetchone()
+        return dict(row) if row is not None else None
+
+    def fetchall(self) -> list[dict]:
+        """Fetches every remaining row."""
+        return [dict(row) for row in self._cursor.fetchall()]
+
+    def close(self) -> None:
+        """Closes the cursor."""
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """Wraps a sqlite3 connection with the schema database attached, so that
+    schema-qualified names such as epsilon.plant_metric resolve."""
+
+    def __init__(self, path: str, schema: str) -> None:
+        self._conn = sqlite3.connect(":memory:", timeout=30,
+                                     check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("ATTACH DATABASE ? AS " + schema, (path,))
+        self._conn.execute(f"PRAGMA {schema}.journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self.schema = schema
+
+    def __enter__(self) -> "SQLiteConnection":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def cursor(self) -> SQLiteCursor:
+        """Creates a dictionary cursor."""
+        return SQLiteCursor(self._conn.cursor())
+
+    def executescript(self, script: str) -> None:
+        """Runs a script of SQLite statements as-is."""
+        self._conn.executescript(script)
+
+    def commit(self) -> None:
+        """Commits the current transaction."""
+        self._conn.commit()
+
+    def rollback(self) -> None:
+        """Rolls back the current transaction."""
+        self._conn.rollback()
+
+    def close(self) -> None:
+        """Closes the connection."""
+        self._conn.close()
@@ -0,0 +1,181 @@
+"""Test file for the storage backends"""
+# pylint: skip-file
+
+import os
+from datetime import datetime
+import pytest
+import numpy as np
+import pandas as pd
+from unittest.mock import patch
+
+from plantdb.backends import (get_backend, seed_statements,
+                              MSSQLBackend, SQLiteBackend)
+from plantdb.sqlite import translate, adapt
+
+
+class TestTranslate:
+    """Test class for rewriting T-SQL into SQLite."""
+
+    def test_placeholders(self):
+        """Tests pymssql placeholders become sqlite placeholders."""
+        assert translate("SELECT * FROM plant WHERE plant_id = %s AND plant_name = %s") == \
+            "SELECT * FROM plant WHERE plant_id = ? AND plant_name = ?"
+
+    def test_select_top(self):
+        """Tests SELECT TOP n becomes a LIMIT clause."""
+        query = """SELECT TOP 1 recording_taken
+                FROM plant_metric
+                WHERE plant_id = %s
+                ORDER BY recording_taken DESC;"""
+
+        result = translate(query)
+
+        assert "TOP" not in result
+        assert result.endswith("ORDER BY recording_taken DESC LIMIT 1;")
+
+    def test_truncate(self):
+        """Tests TRUNCATE TABLE becomes an unfiltered DELETE."""
+        assert translate("TRUNCATE TABLE epsilon.plant_metric;") == \
+            "DELETE FROM epsilon.plant_metric;"
+
+    def test_adapt_values(self):
+        """Tests pandas and numpy values are converted to bindable types."""
+        assert adapt(np.int64(3)) == 3
+        assert adapt(pd.Timestamp("2024-11-27 10:00:00")
+                     ) == "2024-11-27 10:00:00"
+        assert adapt(datetime(2024, 11, 27, 10)) == "2024-11-27 10:00:00"
+        assert adapt(float("nan")) is None
+        assert adapt(pd.NaT) is None
+        assert adapt("22.50") == "22.50"
+
+
+class TestGetBackend:
+    """Test class for choosing a backend from the environment."""
+
+    @patch.dict(os.environ, {}, clear=True)
+    def test_defaults_to_mssql(self):
+        """Tests SQL Server is used when DB_BACKEND is unset."""
+        assert isinstance(get_backend(), MSSQLBackend)
+
+    @patch.dict(os.environ, {"DB_BACKEND": "sqlite", "SQLITE_PATH": "local.db"})
+    def test_sqlite(self):
+        """Tests the SQLite backend reads its path from the environment."""
+        backend = get_backend()
+        assert isinstance(backend, SQLiteBackend)
+        assert backend.path == "local.db"
+
+    @patch.dict(os.environ, {"DB_BACKEND": "oracle"})
+    def test_unknown_backend(self):
+        """Tests an unknown backend name is rejected."""
+        with pytest.raises(ValueError):
+            get_backend()
+
+
+class TestSQLiteBackend:
+    """Test class for the local SQLite backend."""
+
+    def test_seed_statements(self):
+        """Tests the seed data is read from pipeline/schema.sql."""
+        statements = seed_statements()
+        assert len(statements) == 3
+        assert all(statement.startswith("INSERT") for statement in statements)
+
+    def test_schema_is_seeded(self, sqlite_conn):
+        """Tests the schema-qualified seed tables are populated."""
+        with sqlite_conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) AS plants FROM epsilon.plant;")
+            assert cur.fetchone() == {"plants": 49}
+            cur.execute(
+                "SELECT botanist_id FROM botanist WHERE full_name = %s", ("Carl Linnaeus",))
+            assert cur.fetchone() == {"botanist_id": 1}
+
+    def test_insert_and_read_back(self, sqlite_conn):
+        """Tests pymssql style inserts and TOP queries work unchanged."""
+        rows = [(np.float64(21.5), 40.0, pd.Timestamp("2024-11-27 10:00:00"),
+                 pd.Timestamp("2024-11-27 08:00:00"), 1, np.int64(1)),
+                (22.5, 41.0, pd.Timestamp("2024-11-27 10:01:00"),
+                 pd.Timestamp("2024-11-27 08:00:00"), 1, np.int64(1))]
+        with sqlite_conn.cursor() as cur:
+            cur.executemany("""INSERT INTO epsilon.plant_metric (temperature, soil_moisture,
+                recording_taken, last_watered, botanist_id, plant_id)
+                VALUES (%s, %s, %s, %s, %s, %s)""", rows)
+            sqlite_conn.commit()
+
+            cur.execute("""SELECT TOP 1 recording_taken
+                FROM plant_metric
+                WHERE plant_id = %s
+                ORDER BY recording_taken DESC;""", (1,))
+            assert cur.fetchone() == {"recording_taken": "2024-11-27 10:01:00"}
+
+    def test_upsert_only_replaces_older_rows(self, migrated_conn):
+        """Tests the upsert inserts new keys and skips stale readings."""
+        query = SQLiteBackend().upsert_query(
+            "epsilon.plant_latest", ["plant_id"],
+            ["plant_id", "temperature", "soil_moisture",
+             "recording_taken", "last_watered", "botanist_id"],
+            newer_column="recording_taken")
+
+        with migrated_conn.cursor() as cur:
+            cur.execute(query, (1, 20.0, 30.0, "2024-11-27 10:01:00", "2024-11-27 08:00:00", 1))
+            cur.execute(query, (1, 99.0, 30.0, "2024-11-27 10:00:00", "2024-11-27 08:00:00", 1))
+            cur.execute(query, (1, 21.0, 31.0, "2024-11-27 10:02:00", "2024-11-27 08:00:00", 1))
+            migrated_conn.commit()
+            cur.execute("SELECT plant_id, temperature FROM epsilon.plant_latest;")
+            assert cur.fetchall() == [{"plant_id": 1, "temperature": 21.0}]
+
+    def test_mssql_upsert_is_a_merge(self):
+        """Tests the SQL Server upsert is a guarded MERGE."""
+        query = MSSQLBackend().upsert_query(
+            "epsilon.plant_latest", ["plant_id"], ["plant_id", "recording_taken"],
+            newer_column="recording_taken")
+
+        assert query.startswith("MERGE epsilon.plant_latest WITH (HOLDLOCK)")
+        assert "WHEN MATCHED AND source.recording_taken >= target.recording_taken" in query
+        assert query.count("%s") == 2
+
+    def test_swap_moves_rows_to_staging(self, migrated_conn):
+        """Tests the rename swap moves the rows and keeps both tables."""
+        with migrated_conn.cursor() as cur:
+            cur.execute("""INSERT INTO epsilon.plant_metric (temperature, soil_moisture,
+                recording_taken, last_watered, botanist_id, plant_id)
+                VALUES (21.5, 40.0, '2024-11-27 10:00:00', '2024-11-27 08:00:00', 1, 1)""")
+            migrated_conn.commit()
+
+            for statement in SQLiteBackend().swap_statements(
+                    "epsilon.plant_metric", "epsilon.plant_metric_staging"):
+                cur.execute(statement)
+            migrated_conn.commit()
+
+            cur.execute("SELECT COUNT(*) AS live FROM epsilon.plant_metric;")
+            assert cur.fetchone() == {"live": 0}
+            cur.execute("SELECT COUNT(*) AS staged FROM epsilon.plant_metric_staging;")
+            assert cur.fetchone() == {"staged": 1}
+
+    def test_ids_keep_growing_across_swaps(self, migrated_conn):
+        """Tests plant_metric_id never restarts after the live and staging
+        tables trade names, so id watermarks stay valid."""
+        ids = []
+        with migrated_conn.cursor() as cur:
+            for _ in range(3):
+                cur.executemany("""INSERT INTO epsilon.plant_metric (temperature,
+                    soil_moisture, recording_taken, last_watered, botanist_id, plant_id)
+                    VALUES (21.5, 40.0, '2024-11-27 10:00:00', '2024-11-27 08:00:00', 1, %s)""",
+                                [(1,), (2,)])
+                migrated_conn.commit()
+                cur.execute("SELECT plant_metric_id FROM epsilon.plant_metric;")
+                ids += sorted(row["plant_metric_id"] for row in cur.fetchall())
+
+                for statement in SQLiteBackend().swap_statements(
+                        "epsilon.plant_metric", "epsilon.plant_metric_staging"):
+                    cur.execute(statement)
+                migrated_conn.commit()
+                cur.execute("DELETE FROM epsilon.plant_metric_staging;")
+                migrated_conn.commit()
+
+        assert ids == [1, 2, 3, 4, 5, 6]
+
+    def test_mssql_swap_is_a_switch(self):
+        """Tests SQL Server swaps with a metadata-only partition switch."""
+        assert MSSQLBackend().swap_statements(
+            "epsilon.plant_metric", "epsilon.plant_metric_staging") == \
+            ["ALTER TABLE epsilon.plant_metric SWITCH TO epsilon.plant_metric_staging;"]
@@ -0,0 +1,137 @@
+"""Tests for the shared database connections"""
+# pylint: skip-file
+
+import logging
+import os
+import sqlite3
+from unittest.mock import MagicMock, call, patch
+
+import pytest
+from pymssql import exceptions
+
+from plantdb import (QueryStats, get_connection, get_pool, pooled_connection,
+                     retry)
+from plantdb.connection import InstrumentedConnection
+
+MSSQL_ENVIRON = {"DB_BACKEND": "mssql", "DB_HOST": "mock_value", "DB_NAME": "mock_value",
+                 "DB_USER": "mock_value", "DB_PASSWORD": "mock_value",
+                 "DB_PORT": "mock_value"}
+
+
+class TestRetry:
+    """Test class for retrying operations while the database is unavailable."""
+
+    @patch("plantdb.connection.sleep")
+    def test_retried_with_backoff(self, mock_sleep):
+        """Tests operational errors are retried, doubling the wait each time."""
+        operation = MagicMock(side_effect=[exceptions.OperationalError("Refused"),
+                                           sqlite3.OperationalError("Locked"), "ok"])
+
+        assert retry(operation, attempts=3, backoff=0.5) == "ok"
+        assert mock_sleep.call_args_list == [call(0.5), call(1.0)]
+
+    @patch("plantdb.connection.sleep")
+    def test_gives_up_after_attempts(self, mock_sleep):
+        """Tests the last operational error is raised once attempts run out."""
+        operation = MagicMock(side_effect=exceptions.OperationalError("Refused"))
+
+        with pytest.raises(exceptions.OperationalError):
+            retry(operation, attempts=3, backoff=0.1)
+        assert operation.call_count == 3
+
+    @patch("plantdb.connection.sleep")
+    def test_other_errors_not_retried(self, mock_sleep):
+        """Tests errors that retrying cannot fix are raised straight away."""
+        operation = MagicMock(side_effect=exceptions.ProgrammingError("Bad SQL"))
+
+        with pytest.raises(exceptions.ProgrammingError):
+            retry(operation, attempts=3, backoff=0.1)
+        operation.assert_called_once()
+        mock_sleep.assert_not_called()
+
+
+class TestGetConnection:
+    """Test class for opening connections."""
+
+    @patch.dict(os.environ, MSSQL_ENVIRON)
+    @patch("plantdb.backends.connect")
+    def test_mssql_connection(self, mock_connect):
+        """Tests SQL Server is connected to with timeouts, and the connection wrapped."""
+        connection = get_connection()
+
+        mock_connect.assert_called_once_with(
+            server="mock_value", port="mock_value", user="mock_value",
+            password="mock_value", database="mock_value", as_dict=True,
+            login_timeout=15, timeout=0)
+        assert isinstance(connection, InstrumentedConnection)
+        assert connection.commit is mock_connect.return_value.commit
+
+    @patch.dict(os.environ, {"DB_BACKEND": "mssql"}, clear=True)
+    @patch("plantdb.backends.connect")
+    def test_missing_env_var(self, mock_connect, caplog):
+        """Tests a missing setting is logged and raised."""
+        with caplog.at_level(logging.ERROR), pytest.raises(KeyError):
+            get_connection()
+
+        assert "missing from environment variables" in caplog.text
+
+    @patch.dict(os.environ, {**MSSQL_ENVIRON, "DB_CONNECT_ATTEMPTS": "2",
+                             "DB_RETRY_BACKOFF_SECONDS": "0"})
+    @patch("plantdb.backends.connect")
+    def test_operational_error(self, mock_connect, caplog):
+        """Tests a database that stays unavailable is logged and raised."""
+        mock_connect.side_effect = exceptions.OperationalError("Refused")
+
+        with caplog.at_level(logging.ERROR), pytest.raises(exceptions.OperationalError):
+            get_connection()
+
+        assert mock_connect.call_count == 2
+        assert "Error connecting to database: Refused" in caplog.text
+
+
+class TestInstrumentation:
+    """Test class for timing statements and counting their rows."""
+
+    def test_statements_recorded(self, sqlite_backend):
+        """Tests each statement's calls and rows are totalled, whatever its layout."""
+        stats = QueryStats()
+        conn = InstrumentedConnection(sqlite_backend.connect(), stats)
+        with conn, conn.cursor() as cur:
+            for _ in range(2):
+                cur.execute("SELECT plant_id\n  FROM epsilon.plant;")
+                plants = cur.fetchall()
+            cur.execute("UPDATE epsilon.plant SET plant_name = plant_name;")
+
+        select, update = sorted(stats.summary(), key=lambda row: row["statement"])
+        assert select["statement"] == "SELECT plant_id FROM epsilon.plant;"
+        assert select["calls"] == 2
+        assert select["rows"] == 2 * len(plants)
+        assert update["calls"] == 1
+        assert update["rows"] == len(plants)
+
+    def test_slow_query_logged(self, sqlite_backend, caplog):
+        """Tests statements slower than the threshold are logged as warnings."""
+        conn = InstrumentedConnection(sqlite_backend.connect(), QueryStats())
+        with patch.dict(os.environ, {"DB_SLOW_QUERY_MS": "0"}), conn, \
+                conn.cursor() as cur, caplog.at_level(logging.WARNING):
+            cur.execute("SELECT COUNT(*) AS plants FROM epsilon.plant;")
+
+        assert "Slow query took" in caplog.text
+        assert "SELECT COUNT(*) AS plants FROM epsilon.plant;" in caplog.text
+
+
+class TestPooledConnection:
+    """Test class for the process-wide pool."""
+
+    def test_connection_reused(self, sqlite_backend, monkeypatch):
+        """Tests later checkouts reuse the first connection, as a warm Lambda does."""
+        monkeypatch.setattr("plantdb.connection._pool", None)
+        monkeypatch.setattr("plantdb.connection.get_backend", lambda: sqlite_backend)
+
+        with pooled_connection() as first:
+            pass
+        with pooled_connection() as second:
+            pass
+
+        assert first is second
+        get_pool().close()
@@ -0,0 +1,65 @@
+"""Test file for the schema migrations"""
+# pylint: skip-file
+
+import pytest
+from unittest.mock import MagicMock
+
+from plantdb.backends import BACKENDS
+from plantdb.migrations import MIGRATIONS, migrate, get_applied_versions
+
+
+class TestMigrations:
+    """Test class for applying versioned migrations."""
+
+    def test_every_migration_supports_every_backend(self):
+        """Tests each migration has statements for every backend."""
+        for migration in MIGRATIONS:
+            assert set(migration.statements) == set(BACKENDS)
+
+    def test_versions_are_increasing(self):
+        """Tests migration versions are unique and in order."""
+        versions = [migration.version for migration in MIGRATIONS]
+        assert versions == sorted(set(versions))
+
+    def test_migrate_applies_all_versions(self, sqlite_conn, sqlite_backend):
+        """Tests every migration is applied and recorded."""
+        applied = migrate(sqlite_conn, sqlite_backend)
+
+        assert applied == [migration.version for migration in MIGRATIONS]
+        assert get_applied_versions(sqlite_conn) == set(applied)
+
+    def test_migrate_is_idempotent(self, sqlite_conn, sqlite_backend):
+        """Tests a second run applies nothing."""
+        migrate(sqlite_conn, sqlite_backend)
+        assert migrate(sqlite_conn, sqlite_backend) == []
+
+    def test_migrate_to_target(self, sqlite_conn, sqlite_backend):
+        """Tests migrations stop at the target version."""
+        assert migrate(sqlite_conn, sqlite_backend, target=1) == [1]
+
+    def test_covering_index_is_used(self, sqlite_conn, sqlite_backend):
+        """Tests the latest-recording lookup is served from the covering index."""
+        migrate(sqlite_conn, sqlite_backend, target=1)
+
+        with sqlite_conn.cursor() as cur:
+            cur.execute("""EXPLAIN QUERY PLAN SELECT TOP 1 recording_taken
+                FROM plant_metric
+                WHERE plant_id = %s
+                ORDER BY recording_taken DESC;""", (1,))
+            plan = " ".join(row["detail"] for row in cur.fetchall())
+
+        assert "COVERING INDEX ix_plant_metric_plant_recording" in plan
+
+    def test_failed_migration_rolls_back(self):
+        """Tests a failing statement rolls back and is not recorded."""
+        mock_conn = MagicMock()
+        mock_cursor = mock_conn.cursor.return_value.__enter__.return_value
+        mock_cursor.fetchall.return_value = []
+        mock_cursor.execute.side_effect = [None, None, Exception("Index exists")]
+        mock_backend = MagicMock()
+        mock_backend.name = "mssql"
+
+        with pytest.raises(Exception):
+            migrate(mock_conn, mock_backend)
+
+        mock_conn.rollback.assert_called_once()
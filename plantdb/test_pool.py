@@ -0,0 +1,92 @@
+"""Tests for the connection pool"""
+# pylint: skip-file
+
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+from plantdb import ConnectionPool, PoolExhaustedError
+
+
+class TestConnectionPool:
+    """Test class for checking connections in and out of the pool."""
+
+    def test_connections_are_reused(self, sqlite_backend):
+        """Tests a released connection is handed out again instead of a new one."""
+        connect = MagicMock(side_effect=sqlite_backend.connect)
+        pool = ConnectionPool(connect, size=2)
+
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            with second.cursor() as cur:
+                cur.execute("SELECT COUNT(*) AS plants FROM epsilon.plant;")
+                assert cur.fetchone()["plants"] > 0
+
+        assert first is second
+        connect.assert_called_once()
+        pool.close()
+
+    def test_broken_connection_replaced(self, sqlite_backend):
+        """Tests an idle connection that fails validation is closed and replaced."""
+        pool = ConnectionPool(sqlite_backend.connect, size=1)
+        with pool.connection() as broken:
+            pass
+        broken.close()
+
+        with pool.connection() as replacement:
+            assert replacement is not broken
+            assert ConnectionPool.is_usable(replacement)
+        pool.close()
+
+    def test_size_is_bounded(self, sqlite_backend):
+        """Tests checkouts beyond the size wait, then fail after the timeout."""
+        pool = ConnectionPool(sqlite_backend.connect, size=1, timeout=0.05)
+
+        with pool.connection():
+            with pytest.raises(PoolExhaustedError):
+                pool.acquire()
+        with pool.connection():
+            pass
+        pool.close()
+
+    def test_waiting_thread_gets_released_connection(self, sqlite_backend):
+        """Tests a thread waiting on a full pool gets the next released connection."""
+        pool = ConnectionPool(sqlite_backend.connect, size=1, timeout=5)
+        held = pool.acquire()
+        received = []
+        waiter = threading.Thread(target=lambda: received.append(pool.acquire()))
+
+        waiter.start()
+        pool.release(held)
+        waiter.join(timeout=5)
+
+        assert received == [held]
+        pool.release(held)
+        pool.close()
+
+    def test_uncommitted_work_rolled_back(self, sqlite_backend):
+        """Tests a connection is returned without the previous caller's open transaction."""
+        pool = ConnectionPool(sqlite_backend.connect, size=1)
+        with pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""INSERT INTO epsilon.location
+                               (longitude, latitude, closest_town, ISO_code)
+                               VALUES (0, 0, 'Nowhere', 'NW');""")
+
+        with pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""SELECT COUNT(*) AS found FROM epsilon.location
+                               WHERE closest_town = 'Nowhere';""")
+                assert cur.fetchone()["found"] == 0
+        pool.close()
+
+    def test_failed_connect_frees_its_slot(self):
+        """Tests a connection that cannot be opened does not use up the pool."""
+        connect = MagicMock(side_effect=[Exception("login failed"), MagicMock()])
+        pool = ConnectionPool(connect, size=1, timeout=0.05)
+
+        with pytest.raises(Exception):
+            pool.acquire()
+        assert pool.acquire() is not None
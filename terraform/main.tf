@@ -205,6 +205,41 @@ resource "aws_iam_role_policy" "c14-runtime-terrors-plants-archive-lambda_execut
   })
 }
 
+# Bucket and prefix of PARQUET_ARCHIVE_PATH, when the export goes to S3
+locals {
+  parquet_on_s3  = substr(var.PARQUET_ARCHIVE_PATH, 0, 5) == "s3://"
+  parquet_bucket = split("/", trimprefix(var.PARQUET_ARCHIVE_PATH, "s3://"))[0]
+  parquet_prefix = trim(trimprefix(var.PARQUET_ARCHIVE_PATH, "s3://${local.parquet_bucket}"), "/")
+  parquet_keys   = local.parquet_prefix == "" ? "*" : "${local.parquet_prefix}/*"
+}
+
+# IAM Policy letting the archive write, replace and list its Parquet files
+resource "aws_iam_role_policy" "c14-runtime-terrors-plants-archive-parquet_policy-tf" {
+  count = local.parquet_on_s3 ? 1 : 0
+  name  = "c14-runtime-terrors-plants-archive-parquet_policy-tf"
+  role  = aws_iam_role.c14-runtime-terrors-plants-archive-lambda_execution_role-tf.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Action = [
+          "s3:GetObject",
+          "s3:PutObject",
+          "s3:DeleteObject"
+        ]
+        Effect   = "Allow"
+        Resource = "arn:aws:s3:::${local.parquet_bucket}/${local.parquet_keys}"
+      },
+      {
+        Action   = "s3:ListBucket"
+        Effect   = "Allow"
+        Resource = "arn:aws:s3:::${local.parquet_bucket}"
+      }
+    ]
+  })
+}
+
 resource "aws_lambda_function" "c14-runtime-terrors-plants-archive-lambda-function-tf" {
   role          = aws_iam_role.c14-runtime-terrors-plants-archive-lambda_execution_role-tf.arn
   function_name = "c14-runtime-terrors-plants-archive-lambda-function-new-tf"
@@ -224,7 +259,9 @@ resource "aws_lambda_function" "c14-runtime-terrors-plants-archive-lambda-functi
       DB_USER           = var.DB_USER,
       DB_PASSWORD       = var.DB_PASSWORD,
       DB_PORT           = var.DB_PORT,
-      SCHEMA_NAME       = var.SCHEMA_NAME
+      SCHEMA_NAME       = var.SCHEMA_NAME,
+      ARCHIVE_MODE      = var.ARCHIVE_MODE,
+      PARQUET_ARCHIVE_PATH = var.PARQUET_ARCHIVE_PATH
     }
   }
     logging_config {
@@ -272,10 +309,10 @@ resource "aws_iam_role_policy" "c14-runtime-terrors-plants-archive-scheduler_exe
   })
 }
 
-# AWS Scheduler Schedule: everyday 12am
+# AWS Scheduler Schedule: every 10 minutes for the incremental archive
 resource "aws_scheduler_schedule" "c14-runtime-terrors-plants-archive-schedule-tf" {
   name                         = "c14-runtime-terrors-plants-archive-schedule-tf"
-  schedule_expression          =  "cron(0 0 * * ? *)"
+  schedule_expression          =  var.ARCHIVE_SCHEDULE
   schedule_expression_timezone = "Europe/London"
 
   flexible_time_window {
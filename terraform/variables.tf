@@ -56,6 +56,21 @@ variable "ARCHIVE_ECR_URI"{
     type = string
 }
 
+variable "ARCHIVE_MODE" {
+    type    = string
+    default = "incremental"
+}
+
+variable "ARCHIVE_SCHEDULE" {
+    type    = string
+    default = "cron(0/10 * * * ? *)"
+}
+
+variable "PARQUET_ARCHIVE_PATH" {
+    type    = string
+    default = ""
+}
+
 variable "GEMINI_API_KEY" {
     type = string
 }